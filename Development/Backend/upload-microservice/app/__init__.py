@@ -9,31 +9,19 @@ def create_app():
     port = int(os.getenv('PORT', 3003))
     environment = os.getenv('FLASK_ENV', 'production')
 
-    # Run startup diagnostics
-    from app.services.virus_scanner import scanner
-    from app.client.minio_client import get_minio_client
+    # Connect to ClamAV and MinIO in the background; /ready reports progress
+    from app.services.dependencies import dependency_monitor
+    dependency_monitor.start()
 
-    print("\n🔍 Running startup checks...\n")
-
-    # ClamAV check
-    if scanner.cd is not None:
-        print("✅ Connected to ClamAV Socket")
-    else:
-        print("❌ ClamAV not available (scanner disabled)")
-
-    # MinIO check
-    try:
-        client = get_minio_client()
-        if client.bucket_exists(Config.MINIO_BUCKET):
-            print(f"✅ Connected to Minio Bucket: {Config.MINIO_BUCKET}")
-        else:
-            print(f"❌ Bucket '{Config.MINIO_BUCKET}' does not exist.")
-    except Exception as e:
-        print(f"❌ Failed to connect to MinIO: {e}")
+    # Abort abandoned resumable uploads in the background
+    from app.services.resumable_upload import resumable_upload_service
+    resumable_upload_service.start_sweeper(Config.RESUMABLE_SWEEP_INTERVAL)
 
+    print("\n⏳ Connecting to ClamAV and MinIO in the background...")
     print(f"\n🚀 Upload Microservice running on port {port}")
     print(f"📋 Environment: {environment}")
     print(f"📊 Health check: http://localhost:{port}/health")
+    print(f"🚦 Readiness: http://localhost:{port}/ready")
     print(f"📝 API Documentation: http://localhost:{port}/api-docs\n")
     print("✅ Service ready to serve!\n")
 
@@ -105,7 +93,22 @@ def create_app():
 
     @app.route('/health')
     def health_check():
-        return {'status': 'healthy', 'service': 'upload-microservice'}, 200
+        from app.services.admission import admission_controller
+        return {
+            'status': 'healthy',
+            'service': 'upload-microservice',
+            'ready': dependency_monitor.is_ready(),
+            'dependencies': dependency_monitor.status(),
+            'admission': admission_controller.stats()
+        }, 200
+
+    @app.route('/ready')
+    def readiness_check():
+        ready = dependency_monitor.is_ready()
+        return {
+            'status': 'ready' if ready else 'not ready',
+            'dependencies': dependency_monitor.status()
+        }, 200 if ready else 503
 
     @app.route('/')
     def home():
@@ -0,0 +1,225 @@
+"""
+ASGI entry point
+
+``POST /api/upload`` is served natively on the event loop: the auth call,
+the ClamAV INSTREAM session and the MinIO transfers are coroutines, and
+only PDF parsing and preview rendering run on the shared executors. Every
+other route - and asynchronous (202) uploads - is the regular Flask app,
+run on a thread through asgiref.
+
+Run with ``uvicorn asgi:app`` from the service directory.
+"""
+import asyncio
+import logging
+
+from asgiref.wsgi import WsgiToAsgi
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+from app import create_app
+from werkzeug.utils import secure_filename
+
+from app.config.config import Config
+from app.routes.controller import UploadController, _publish_preview
+from app.routes.error_handlers import UploadErrorHandler
+from app.routes.validators import UploadValidator
+from app.services.admission import AdmissionRejected, admission_controller
+from app.services.async_ingest import async_storage_service, async_streaming_ingest
+from app.services.dependencies import dependency_monitor
+from app.services.metadata_extractor import extract_pdf_info_from_file
+from app.services.preview_generator import render_preview
+from app.services.near_duplicates import match_preview
+from app.services.stage_executor import StageRun, stage_executor
+from app.services.virus_scanner import rejection_message
+from app.utils.auth import get_user_from_token_async
+
+logger = logging.getLogger(__name__)
+
+validator = UploadValidator()
+controller = UploadController()
+error_handler = UploadErrorHandler()
+
+
+def _to_response(result):
+    """Convert a Flask ``(response, status[, headers])`` tuple into a Starlette response"""
+    response, status_code, *headers = result
+    return Response(
+        response.get_data(), status_code=status_code,
+        headers=headers[0] if headers else None, media_type=response.mimetype
+    )
+
+
+async def _run_stage(run: StageRun, name: str, coro):
+    """Record a coroutine's outcome the way ``StageExecutor`` records stages"""
+    try:
+        run.results[name] = await coro
+    except Exception as e:
+        logger.warning(f"Stage '{name}' failed: {e}")
+        run.errors[name] = e
+
+
+async def _in_executor(slot, func, *args, pool='thread'):
+    async with admission_controller.stage_async(slot):
+        return await asyncio.wrap_future(stage_executor.submit(func, *args, pool=pool))
+
+
+async def process_upload_async(upload, filename, validated_data, user_id, size_hint=None):
+    """
+    Coroutine version of ``UploadController.process_streaming_upload``
+
+    Returns:
+        (success, error_message, response_data)
+    """
+    ingest_result = None
+    try:
+        async with admission_controller.admit_async(size_hint or Config.MAX_CONTENT_LENGTH):
+            async with admission_controller.stage_async('scan'):
+                ingest_result = await async_streaming_ingest.ingest(upload, secure_filename(filename))
+
+            if not ingest_result['success']:
+                logger.warning(f"Streaming ingest failed for {filename}: {ingest_result['error']}")
+                return False, ingest_result['error'], None
+
+            file_id = ingest_result['file_id']
+            scan_result = ingest_result['scan_result']
+            if not scan_result['clean']:
+                logger.warning(f"Uploaded file not clean: {scan_result['result']}")
+                await async_storage_service.discard_staged(file_id)
+                return False, rejection_message(scan_result), None
+
+            content_hash = ingest_result['sha256'] if Config.UPLOAD_DEDUP else None
+            if content_hash:
+                duplicate = await asyncio.to_thread(
+                    controller._process_duplicate, content_hash, filename, validated_data, user_id
+                )
+                if duplicate is not None:
+                    await async_storage_service.discard_staged(file_id)
+                    return duplicate
+
+            spool_path = ingest_result['spool_path']
+            run = StageRun()
+            stages = [
+                _run_stage(run, 'metadata', _in_executor(
+                    'metadata', extract_pdf_info_from_file, spool_path, pool='process'
+                )),
+                _run_stage(run, 'upload', async_storage_service.promote_file(
+                    file_id, validated_data['visibility'], secure_filename(filename),
+                    ingest_result['size_bytes'], content_hash
+                )),
+            ]
+            if not Config.PREVIEW_ON_DEMAND:
+                stages.append(_run_stage(run, 'render', _in_executor('render', render_preview, None, spool_path)))
+            await asyncio.gather(*stages)
+            if 'render' in run.results and 'upload' in run.results:
+                await asyncio.gather(
+                    _run_stage(run, 'preview', asyncio.to_thread(
+                        _publish_preview, run.results['render'], run.results['upload']
+                    )),
+                    _run_stage(run, 'similar', asyncio.to_thread(
+                        match_preview, validated_data['visibility'], user_id,
+                        run.results['render'], run.results['upload']
+                    )),
+                )
+
+            success, error_message, response_data = await asyncio.to_thread(
+                controller._collect_stage_results, run, ingest_result['size_bytes'],
+                validated_data, user_id, scan_result, content_hash
+            )
+            if not success:
+                await async_storage_service.discard_staged(file_id)
+            return success, error_message, response_data
+
+    except AdmissionRejected as e:
+        return False, str(e), None
+    except Exception as e:
+        logger.error(f"Unexpected error in async upload processing: {e}")
+        return False, f"Internal server error: {str(e)}", None
+    finally:
+        async_streaming_ingest.cleanup(ingest_result)
+
+
+class UploadEndpoint:
+    """
+    Native ``POST /api/upload``; background (202) uploads are passed to
+    the WSGI app, which owns the job store
+    """
+
+    def __init__(self, flask_app, fallback):
+        self.flask_app = flask_app
+        self.fallback = fallback
+
+    def error(self, handler, *args):
+        """Build an error response with the Flask app's ``UploadErrorHandler``"""
+        with self.flask_app.app_context():
+            return _to_response(handler(*args))
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        if Config.UPLOAD_ASYNC or request.query_params.get('async', '').lower() == 'true':
+            await self.fallback(scope, receive, send)
+            return
+
+        response = await self.handle(request)
+        await response(scope, receive, send)
+
+    async def handle(self, request: Request):
+        if not dependency_monitor.is_available('MinIO'):
+            return self.error(
+                error_handler.handle_unavailable_error,
+                'Storage temporarily unavailable, retry later', dependency_monitor.retry_after('MinIO')
+            )
+        if not dependency_monitor.is_available('ClamAV'):
+            return self.error(
+                error_handler.handle_unavailable_error,
+                'Virus scanner temporarily unavailable, retry later', dependency_monitor.retry_after('ClamAV')
+            )
+
+        try:
+            user_id = await get_user_from_token_async(request.headers.get('Authorization'))
+            if user_id is None:
+                return JSONResponse({'error': 'Invalid token'}, status_code=401)
+
+            content_length = int(request.headers.get('content-length') or 0)
+            if content_length > Config.MAX_CONTENT_LENGTH:
+                return self.error(
+                    error_handler.create_error_response,
+                    f'File too large. Maximum size is {Config.MAX_CONTENT_LENGTH // (1024 * 1024)}MB.',
+                    413, 'FILE_TOO_LARGE'
+                )
+
+            async with request.form(max_files=1) as form:
+                upload = form.get('file')
+                if upload is None or isinstance(upload, str):
+                    return self.error(error_handler.handle_validation_error, 'No file provided')
+
+                form_data = {key: value for key, value in form.items() if isinstance(value, str)}
+                is_valid, error_message, validated_data = validator.validate_upload_request(
+                    upload, form_data
+                )
+                if not is_valid:
+                    return self.error(error_handler.handle_validation_error, error_message)
+
+                await upload.seek(0)
+                success, error_message, response_data = await process_upload_async(
+                    upload, upload.filename, validated_data, user_id, content_length or None
+                )
+
+            if not success:
+                return self.error(error_handler.handle_upload_failure, error_message)
+            return JSONResponse(response_data, status_code=201)
+
+        except Exception as e:
+            logger.error(f"Unexpected error in async upload endpoint: {e}")
+            return self.error(error_handler.handle_processing_error, 'Internal server error', str(e))
+
+
+def create_asgi_app():
+    """Starlette app serving the upload hot path natively and everything else via Flask"""
+    flask_app = create_app()
+    wsgi = WsgiToAsgi(flask_app)
+    return Starlette(routes=[
+        Route('/api/upload', UploadEndpoint(flask_app, wsgi), methods=['POST']),
+        Mount('/', app=wsgi),
+    ])
@@ -3,29 +3,63 @@ MinIO client initialization and configuration
 """
 from minio import Minio
 from minio.error import S3Error
+from miniopy_async import Minio as AsyncMinio
 import logging
+import threading
+import urllib3
 from app.config.config import Config
 import json
 
 logger = logging.getLogger(__name__)
 
+_clients = {}
+_clients_lock = threading.Lock()
+
 def get_minio_client():
-    """Initialize and return MinIO client"""
-    try:
-        client = Minio(
-            Config.MINIO_ENDPOINT,
-            access_key=Config.MINIO_ACCESS_KEY,
-            secret_key=Config.MINIO_SECRET_KEY,
-            secure=Config.MINIO_SECURE
-        )
+    """
+    Return the shared MinIO client
 
-        ensure_bucket_exists(client)
-        setup_public_access(client)
+    Creating it does no network I/O; the bucket and its policy are set up
+    by the dependency monitor (``app.services.dependencies``) in the background.
+    """
+    with _clients_lock:
+        if 'default' not in _clients:
+            _clients['default'] = Minio(
+                Config.MINIO_ENDPOINT,
+                access_key=Config.MINIO_ACCESS_KEY,
+                secret_key=Config.MINIO_SECRET_KEY,
+                secure=Config.MINIO_SECURE
+            )
+        return _clients['default']
 
-        return client
-    except Exception as e:
-        logger.error(f"Failed to initialize MinIO client: {e}")
-        raise
+def get_probe_minio_client():
+    """MinIO client with short timeouts and no retries, for health checks"""
+    with _clients_lock:
+        if 'probe' not in _clients:
+            _clients['probe'] = Minio(
+                Config.MINIO_ENDPOINT,
+                access_key=Config.MINIO_ACCESS_KEY,
+                secret_key=Config.MINIO_SECRET_KEY,
+                secure=Config.MINIO_SECURE,
+                http_client=urllib3.PoolManager(
+                    timeout=urllib3.Timeout(connect=Config.DEPENDENCY_TIMEOUT, read=Config.DEPENDENCY_TIMEOUT),
+                    retries=False
+                )
+            )
+        return _clients['probe']
+
+def get_async_minio_client():
+    """
+    MinIO client for asyncio code (ASGI entry point)
+
+    Bucket creation and policy are handled by the dependency monitor.
+    """
+    return AsyncMinio(
+        Config.MINIO_ENDPOINT,
+        access_key=Config.MINIO_ACCESS_KEY,
+        secret_key=Config.MINIO_SECRET_KEY,
+        secure=Config.MINIO_SECURE
+    )
 
 def ensure_bucket_exists(client):
     """Ensure the required bucket exists"""
@@ -57,7 +91,8 @@ def setup_public_access(client):
                     "Action": ["s3:GetObject"],
                     "Resource": [
                         f"arn:aws:s3:::{bucket_name}/public/*",
-                        f"arn:aws:s3:::{bucket_name}/previews/*" 
+                        f"arn:aws:s3:::{bucket_name}/previews/*",
+                        f"arn:aws:s3:::{bucket_name}/{Config.PAGE_IMAGE_FOLDER}/public/*"
                     ]
                 }
             ]
@@ -0,0 +1,82 @@
+"""
+S3 calls that minio-py only exposes as private methods
+
+Client-driven multipart uploads (resumable sessions) and conditional PUTs
+(single-winner claims) have no public API in minio-py. Every use of the
+private methods goes through ``MinioLowLevel`` so an upgrade only has to be
+checked here.
+
+Written against minio==7.2.15 (pinned in requirements.txt). Before bumping
+the pin, compare the signatures of ``_create_multipart_upload``,
+``_upload_part``, ``_list_parts``, ``_complete_multipart_upload``,
+``_abort_multipart_upload``, ``_list_multipart_uploads`` and
+``_put_object``.
+"""
+from typing import Dict, Iterator, List
+
+from minio.datatypes import Part
+from minio.error import S3Error
+
+
+class MinioLowLevel:
+    """Thin wrapper around the private S3 calls of a ``Minio`` client"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def create_multipart_upload(self, bucket_name: str, object_name: str, headers: Dict) -> str:
+        """Start a multipart upload; returns its upload id"""
+        return self.client._create_multipart_upload(bucket_name, object_name, headers)
+
+    def upload_part(self, bucket_name: str, object_name: str, upload_id: str,
+                    part_number: int, data: bytes) -> str:
+        """Store one part; returns its ETag"""
+        return self.client._upload_part(bucket_name, object_name, data, None, upload_id, part_number)
+
+    def list_parts(self, bucket_name: str, object_name: str, upload_id: str) -> List:
+        """Every part stored for a multipart upload (follows pagination)"""
+        parts = []
+        marker = None
+        while True:
+            result = self.client._list_parts(
+                bucket_name, object_name, upload_id, part_number_marker=marker
+            )
+            parts.extend(result.parts)
+            if not result.is_truncated:
+                return parts
+            marker = result.next_part_number_marker
+
+    def complete_multipart_upload(self, bucket_name: str, object_name: str, upload_id: str,
+                                  parts: List[Part]):
+        return self.client._complete_multipart_upload(bucket_name, object_name, upload_id, parts)
+
+    def abort_multipart_upload(self, bucket_name: str, object_name: str, upload_id: str):
+        self.client._abort_multipart_upload(bucket_name, object_name, upload_id)
+
+    def list_multipart_uploads(self, bucket_name: str, prefix: str) -> Iterator:
+        """Unfinished multipart uploads under ``prefix`` (``object_name``, ``upload_id``, ``initiated_time``)"""
+        key_marker = upload_id_marker = None
+        while True:
+            result = self.client._list_multipart_uploads(
+                bucket_name, prefix=prefix, key_marker=key_marker, upload_id_marker=upload_id_marker
+            )
+            yield from result.uploads
+            if not result.is_truncated:
+                return
+            key_marker, upload_id_marker = result.next_key_marker, result.next_upload_id_marker
+
+    def put_if_absent(self, bucket_name: str, object_name: str, data: bytes = b'') -> bool:
+        """
+        Create an object only if it does not exist yet (``If-None-Match: *``)
+
+        Returns:
+            bool: False when the object already existed, so exactly one of
+            several concurrent callers gets True
+        """
+        try:
+            self.client._put_object(bucket_name, object_name, data, {'If-None-Match': '*'})
+            return True
+        except S3Error as e:
+            if e.code in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                return False
+            raise
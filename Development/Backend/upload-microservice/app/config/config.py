@@ -7,16 +7,177 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+def _parse_endpoints(value, default_host, default_port):
+    """``host1:3310,host2`` -> [(host, port), ...]; falls back to the default endpoint, if any"""
+    endpoints = []
+    for entry in value.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        host, _, port = entry.partition(':')
+        endpoints.append((host, int(port) if port else default_port))
+    if not endpoints and default_host:
+        endpoints.append((default_host, default_port))
+    return endpoints
+
 class Config:
     """Application configuration class"""
 
     # Flask settings
     SECRET_KEY = os.getenv('JWT_SECRET', 'dev-secret-key')
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+    MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', '/tmp/uploads')
     PREVIEW_FOLDER = os.getenv('PREVIEW_FOLDER', 'previews')
     PREVIEW_FORMAT = os.getenv('PREVIEW_FORMAT', 'JPEG')
     PREVIEW_DPI = int(os.getenv('PREVIEW_DPI', 150))
+    # Previews are rendered at PREVIEW_DPI unless the page is too large: the
+    # DPI is lowered so that the long edge stays within PREVIEW_MAX_SIZE
+    # pixels and the image within PREVIEW_MAX_PIXELS (A0 posters, CAD sheets).
+    # A render is abandoned (its process killed) after PREVIEW_TIMEOUT seconds.
+    PREVIEW_MAX_SIZE = int(os.getenv('PREVIEW_MAX_SIZE', 1754))
+    PREVIEW_MAX_PIXELS = int(os.getenv('PREVIEW_MAX_PIXELS', 4_000_000))
+    PREVIEW_TIMEOUT = float(os.getenv('PREVIEW_TIMEOUT', 30))
+    # Page rendering engines tried in order: 'pdfium' (pypdfium2 in
+    # RENDER_WORKERS warm worker processes) and 'poppler' (a pdftoppm
+    # process per render). A first-page /Thumb whose long edge is at least
+    # PREVIEW_THUMB_MIN_SIZE pixels is used without rendering (0 disables).
+    RENDER_ENGINES = [name.strip() for name in os.getenv('RENDER_ENGINES', 'pdfium,poppler').split(',') if name.strip()]
+    RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', 2))
+    PREVIEW_THUMB_MIN_SIZE = int(os.getenv('PREVIEW_THUMB_MIN_SIZE', 800))
+    # The preview shows the first informative page among the first
+    # PREVIEW_PAGE_SCAN pages (1 disables), judged on PREVIEW_SCAN_SIZE pixel
+    # renders: blank pages and scanner separator sheets are skipped
+    PREVIEW_PAGE_SCAN = int(os.getenv('PREVIEW_PAGE_SCAN', 3))
+    PREVIEW_SCAN_SIZE = int(os.getenv('PREVIEW_SCAN_SIZE', 128))
+    # The same render is also stored as PREVIEW_WIDTHS pixel-wide variants in
+    # every PREVIEW_VARIANT_FORMATS format (progressive for JPEG), served as
+    # srcset strings by the preview endpoint
+    PREVIEW_WIDTHS = [int(width) for width in os.getenv('PREVIEW_WIDTHS', '160,320,800').split(',') if width.strip()]
+    PREVIEW_VARIANT_FORMATS = [fmt.strip().upper() for fmt in os.getenv('PREVIEW_VARIANT_FORMATS', 'WEBP,JPEG').split(',') if fmt.strip()]
+    PREVIEW_QUALITY = int(os.getenv('PREVIEW_QUALITY', 80))
+    # On-demand previews: uploads skip rendering and the preview endpoint
+    # renders a missing preview from the stored PDF on first request
+    # (concurrent requests for one file share the render). image_url in the
+    # upload response points at where the preview will be stored.
+    PREVIEW_ON_DEMAND = os.getenv('PREVIEW_ON_DEMAND', 'false').lower() == 'true'
+
+    # Metadata: PDF parsing backends tried in order until one reads the file -
+    # 'structure' (trailer/xref/Info read directly), 'pdfium' (pypdfium2) and
+    # 'pypdf2' (full parse). Compare them with benchmarks/pdf_backends.py.
+    # Without a /Title the first text line of page 1 is used; the structure
+    # backend looks for it within these budgets.
+    PDF_BACKENDS = [name.strip() for name in os.getenv('PDF_BACKENDS', 'structure,pypdf2').split(',') if name.strip()]
+    METADATA_TITLE_TIME_BUDGET = float(os.getenv('METADATA_TITLE_TIME_BUDGET', 0.25))
+    METADATA_TITLE_BYTE_BUDGET = int(os.getenv('METADATA_TITLE_BYTE_BUDGET', 2 * 1024 * 1024))
+
+    # Near-duplicate detection: a perceptual hash ('phash' or 'dhash') of each
+    # preview is matched within NEAR_DUPLICATE_RADIUS bits against earlier
+    # uploads (public ones, and the uploader's own private ones) and reported
+    # in the upload response metadata. The index is an append-only file that
+    # all workers on a host share; keep it on a persistent volume.
+    NEAR_DUPLICATES = os.getenv('NEAR_DUPLICATES', 'false').lower() == 'true'
+    NEAR_DUPLICATE_HASH = os.getenv('NEAR_DUPLICATE_HASH', 'phash')
+    NEAR_DUPLICATE_RADIUS = int(os.getenv('NEAR_DUPLICATE_RADIUS', 8))
+    NEAR_DUPLICATE_MAX_MATCHES = int(os.getenv('NEAR_DUPLICATE_MAX_MATCHES', 5))
+    NEAR_DUPLICATE_INDEX_PATH = os.getenv('NEAR_DUPLICATE_INDEX_PATH', '/uploads/near-duplicates.idx')
+
+    # Page images for the viewer: every page rendered in the background at
+    # PAGE_IMAGE_LEVELS (long edge in pixels) under pages/<visibility>/<file_id>/.
+    # The first PAGE_IMAGES_FIRST_PAGES pages go first; the rest is backfilled
+    # in batches and manifest.json next to them lists the pages that are ready.
+    # Page images of private files are served as presigned URLs valid for
+    # PAGE_IMAGE_URL_EXPIRY seconds.
+    PAGE_IMAGES = os.getenv('PAGE_IMAGES', 'false').lower() == 'true'
+    PAGE_IMAGE_FOLDER = os.getenv('PAGE_IMAGE_FOLDER', 'pages')
+    PAGE_IMAGE_LEVELS = [int(level) for level in os.getenv('PAGE_IMAGE_LEVELS', '512,1024,2048').split(',') if level.strip()]
+    PAGE_IMAGE_FORMAT = os.getenv('PAGE_IMAGE_FORMAT', 'WEBP').upper()
+    PAGE_IMAGES_FIRST_PAGES = int(os.getenv('PAGE_IMAGES_FIRST_PAGES', 5))
+    PAGE_IMAGES_BATCH_PAGES = int(os.getenv('PAGE_IMAGES_BATCH_PAGES', 10))
+    PAGE_IMAGE_WORKERS = int(os.getenv('PAGE_IMAGE_WORKERS', 2))
+    PAGE_IMAGE_URL_EXPIRY = int(os.getenv('PAGE_IMAGE_URL_EXPIRY', 3600))
+
+    # Full-text extraction in the background after the upload response: one
+    # {"page", "text"} NDJSON line per page, stored next to the PDF as
+    # <name>.text.ndjson. Documents are split into TEXT_PAGES_PER_TASK page
+    # ranges that run on TEXT_WORKERS isolated worker processes.
+    TEXT_EXTRACTION = os.getenv('TEXT_EXTRACTION', 'false').lower() == 'true'
+    TEXT_WORKERS = int(os.getenv('TEXT_WORKERS', 2))
+    TEXT_PAGES_PER_TASK = int(os.getenv('TEXT_PAGES_PER_TASK', 50))
+    TEXT_TASK_TIMEOUT = float(os.getenv('TEXT_TASK_TIMEOUT', 120))
+
+    # Streaming ingest (single pass: ClamAV + MinIO + SHA-256, spooled to UPLOAD_FOLDER)
+    # Keep MAX_CONTENT_LENGTH below clamd's StreamMaxLength when raising it.
+    UPLOAD_STREAMING = os.getenv('UPLOAD_STREAMING', 'false').lower() == 'true'
+    STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 64 * 1024))
+    STREAM_QUEUE_DEPTH = int(os.getenv('STREAM_QUEUE_DEPTH', 16))
+    QUARANTINE_FOLDER = os.getenv('QUARANTINE_FOLDER', 'quarantine')
+
+    # Upload stage execution: 'sequential', 'concurrent' (independent stages
+    # run in parallel once the scan passes) or 'speculative' (they start
+    # while the scan is still running and are discarded if it fails)
+    UPLOAD_STAGE_MODE = os.getenv('UPLOAD_STAGE_MODE', 'concurrent').lower()
+    STAGE_THREAD_WORKERS = int(os.getenv('STAGE_THREAD_WORKERS', 8))
+    STAGE_PROCESS_WORKERS = int(os.getenv('STAGE_PROCESS_WORKERS', 2))
+    STAGE_PROCESS_START_METHOD = os.getenv('STAGE_PROCESS_START_METHOD', 'forkserver')
+    # Process stages (metadata) are killed after STAGE_PROCESS_TIMEOUT seconds and
+    # each worker is capped at STAGE_PROCESS_MEMORY_LIMIT_MB of address space
+    # (RLIMIT_AS, 0 disables); the upload then gets the fallback metadata.
+    # Workers are recycled after STAGE_PROCESS_MAX_TASKS tasks (0 = never).
+    STAGE_PROCESS_TIMEOUT = float(os.getenv('STAGE_PROCESS_TIMEOUT', 20))
+    STAGE_PROCESS_MEMORY_LIMIT_MB = int(os.getenv('STAGE_PROCESS_MEMORY_LIMIT_MB', 1024))
+    STAGE_PROCESS_MAX_TASKS = int(os.getenv('STAGE_PROCESS_MAX_TASKS', 500))
+
+    # Asynchronous ingest (202 Accepted + job status endpoint)
+    UPLOAD_ASYNC = os.getenv('UPLOAD_ASYNC', 'false').lower() == 'true'
+    UPLOAD_JOB_WORKERS = int(os.getenv('UPLOAD_JOB_WORKERS', 4))
+    JOBS_FOLDER = os.getenv('JOBS_FOLDER', 'jobs')
+
+    # Content-addressed deduplication (blobs under <visibility>/blobs/<sha256>.pdf)
+    UPLOAD_DEDUP = os.getenv('UPLOAD_DEDUP', 'false').lower() == 'true'
+    CONTENT_FOLDER = os.getenv('CONTENT_FOLDER', 'content')
+    FILES_FOLDER = os.getenv('FILES_FOLDER', 'files')
+
+    # Resumable chunked uploads (one chunk = one MinIO multipart part, so
+    # every chunk but the last must be at least 5MB and below MAX_CONTENT_LENGTH).
+    # Raise StreamMaxLength, MaxScanSize and MaxFileSize in both clamd configs
+    # together with RESUMABLE_MAX_SIZE and DIRECT_UPLOAD_MAX_SIZE.
+    RESUMABLE_CHUNK_SIZE = max(int(os.getenv('RESUMABLE_CHUNK_SIZE', 8 * 1024 * 1024)), 5 * 1024 * 1024)
+    RESUMABLE_MAX_SIZE = int(os.getenv('RESUMABLE_MAX_SIZE', 512 * 1024 * 1024))
+    RESUMABLE_SESSION_TTL = int(os.getenv('RESUMABLE_SESSION_TTL', 24 * 3600))
+    SESSIONS_FOLDER = os.getenv('SESSIONS_FOLDER', 'sessions')
+    # Seconds between sweeps that abort expired sessions' multipart uploads (0 disables)
+    RESUMABLE_SWEEP_INTERVAL = float(os.getenv('RESUMABLE_SWEEP_INTERVAL', 3600))
+
+    # Direct uploads: clients PUT to a presigned quarantine URL, then finalize
+    DIRECT_UPLOAD_TTL = int(os.getenv('DIRECT_UPLOAD_TTL', 900))
+    DIRECT_UPLOAD_MAX_SIZE = int(os.getenv('DIRECT_UPLOAD_MAX_SIZE', 512 * 1024 * 1024))
+    DIRECT_UPLOADS_FOLDER = os.getenv('DIRECT_UPLOADS_FOLDER', 'direct-uploads')
+
+    # Admission control (per worker process; 0 disables a limit). Uploads
+    # wait up to ADMISSION_MAX_WAIT seconds for capacity, then get a 503.
+    ADMISSION_BYTE_BUDGET = int(os.getenv('ADMISSION_BYTE_BUDGET', 128 * 1024 * 1024))
+    ADMISSION_SCAN_LIMIT = int(os.getenv('ADMISSION_SCAN_LIMIT', 4))
+    ADMISSION_METADATA_LIMIT = int(os.getenv('ADMISSION_METADATA_LIMIT', 2))
+    ADMISSION_RENDER_LIMIT = int(os.getenv('ADMISSION_RENDER_LIMIT', 2))
+    ADMISSION_MAX_WAIT = float(os.getenv('ADMISSION_MAX_WAIT', 10))
+    ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 5))
+
+    # Batch uploads (POST /api/upload/batch); the request size limit applies
+    # to the whole batch instead of MAX_CONTENT_LENGTH
+    UPLOAD_BATCH_WORKERS = int(os.getenv('UPLOAD_BATCH_WORKERS', 4))
+    UPLOAD_BATCH_MAX_FILES = int(os.getenv('UPLOAD_BATCH_MAX_FILES', 20))
+    UPLOAD_BATCH_MAX_SIZE = int(os.getenv('UPLOAD_BATCH_MAX_SIZE', 256 * 1024 * 1024))
+
+    # Dependency monitor: ClamAV and MinIO are connected in the background and
+    # /ready returns 503 until both respond. A circuit opens after
+    # DEPENDENCY_FAILURE_THRESHOLD failed checks in a row (CLAMAV_RETRIES for
+    # ClamAV, which keeps the old startup grace period) and is probed again
+    # every DEPENDENCY_RESET_TIMEOUT seconds.
+    DEPENDENCY_CHECK_INTERVAL = float(os.getenv('DEPENDENCY_CHECK_INTERVAL', 15))
+    DEPENDENCY_RETRY_DELAY = float(os.getenv('DEPENDENCY_RETRY_DELAY', 2))
+    DEPENDENCY_FAILURE_THRESHOLD = int(os.getenv('DEPENDENCY_FAILURE_THRESHOLD', 5))
+    DEPENDENCY_RESET_TIMEOUT = float(os.getenv('DEPENDENCY_RESET_TIMEOUT', 30))
+    DEPENDENCY_TIMEOUT = float(os.getenv('DEPENDENCY_TIMEOUT', 5))
 
     # Auth microservice
     AUTH_SERVICE_URL = os.getenv('AUTH_SERVICE_URL', 'http://localhost:3001')
@@ -27,6 +188,33 @@ class Config:
     CLAMAV_PORT = int(os.getenv('CLAMAV_PORT', 3310))
     CLAMAV_RETRIES = int(os.getenv('CLAMAV_RETRIES', 30))
     CLAMAV_RETRY_DELAY = int(os.getenv('CLAMAV_RETRY_DELAY', 2))
+    # Several clamd daemons: CLAMAV_HOSTS=clamav-1:3310,clamav-2:3310 (defaults
+    # to CLAMAV_HOST:CLAMAV_PORT). Scans go to the node with the fewest
+    # outstanding requests; a node is ejected after CLAMAV_EJECT_THRESHOLD
+    # failed pings/scans in a row, and a failed scan is retried on up to
+    # CLAMAV_SCAN_ATTEMPTS nodes in total.
+    CLAMAV_ENDPOINTS = _parse_endpoints(os.getenv('CLAMAV_HOSTS', ''), CLAMAV_HOST, CLAMAV_PORT)
+    CLAMAV_EJECT_THRESHOLD = int(os.getenv('CLAMAV_EJECT_THRESHOLD', 3))
+    CLAMAV_SCAN_ATTEMPTS = max(int(os.getenv('CLAMAV_SCAN_ATTEMPTS', 2)), 1)
+    # Tiered scanning: PDFs whose structural pre-scan finds active content
+    # (/JavaScript, /Launch, /OpenAction, embedded files, unusual filters...)
+    # are scanned on CLAMAV_DEEP_HOSTS - clamd with all heuristics enabled
+    # (clamav-config/clamd-deep.conf) - and everything else on CLAMAV_HOSTS.
+    # Without deep hosts every file is scanned on CLAMAV_HOSTS.
+    CLAMAV_DEEP_ENDPOINTS = _parse_endpoints(os.getenv('CLAMAV_DEEP_HOSTS', ''), None, CLAMAV_PORT)
+    SCAN_TIERING = os.getenv('SCAN_TIERING', 'true').lower() == 'true'
+    PRESCAN_MAX_INFLATE = int(os.getenv('PRESCAN_MAX_INFLATE', 64 * 1024 * 1024))
+    # Persistent IDSESSION connections per node and worker; up to CLAMAV_PIPELINE_DEPTH
+    # scans are pipelined on one connection once all of them are busy
+    CLAMAV_POOL_SIZE = int(os.getenv('CLAMAV_POOL_SIZE', 4))
+    CLAMAV_PIPELINE_DEPTH = int(os.getenv('CLAMAV_PIPELINE_DEPTH', 4))
+    CLAMAV_TIMEOUT = float(os.getenv('CLAMAV_TIMEOUT', 60))
+    CLAMAV_HEALTH_INTERVAL = float(os.getenv('CLAMAV_HEALTH_INTERVAL', 15))
+    # Verdict cache keyed by SHA-256 + signature version (0 entries disables);
+    # cached verdicts are dropped as soon as VERSION reports new signatures.
+    # VERSION is polled with every health check (DEPENDENCY_CHECK_INTERVAL).
+    SCAN_CACHE_MAX_ENTRIES = int(os.getenv('SCAN_CACHE_MAX_ENTRIES', 10000))
+    SCAN_CACHE_TTL = int(os.getenv('SCAN_CACHE_TTL', 3600))
 
     # MinIO configuration
     PUBLIC_MINIO_HOST = os.getenv('PUBLIC_MINIO_HOST', 'host.docker.internal:9000')
@@ -35,6 +223,7 @@ class Config:
     MINIO_SECRET_KEY = os.getenv('MINIO_SECRET_KEY', 'minioadmin')
     MINIO_BUCKET = os.getenv('MINIO_BUCKET', 'pdf-upload-service')
     MINIO_SECURE = os.getenv('MINIO_SECURE', 'false').lower() == 'true'
+    MINIO_PART_SIZE = int(os.getenv('MINIO_PART_SIZE', 5 * 1024 * 1024))
 
     # File validation
     ALLOWED_EXTENSIONS = {'pdf'}
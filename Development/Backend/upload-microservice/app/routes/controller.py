@@ -1,92 +1,650 @@
 """
 Upload controller handling business logic
 """
+import hashlib
 import logging
-from typing import Dict, Tuple, Optional
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Tuple, Optional
 from werkzeug.utils import secure_filename
 
-from app.services.virus_scanner import scan_uploaded_file
-from app.services.metadata_extractor import extract_pdf_info
+from app.services.virus_scanner import rejection_message, scan_uploaded_file, scanner
+from app.services.metadata_extractor import (
+    MetadataExtractor, extract_pdf_info, extract_pdf_info_from_file
+)
 from app.services.storage import upload_file_to_storage, storage_service
 from app.config.config import Config
-from app.services.preview_generator import generate_and_upload_preview
+from app.services.preview_generator import (
+    render_preview, upload_preview, copy_preview, preview_object_name, preview_public_url,
+    list_preview_variants, build_srcset, render_preview_on_demand
+)
+from app.services.content_index import content_index
+from app.services.stage_executor import Stage, StageRun, stage_executor
+from app.services.admission import AdmissionRejected, admission_controller
+from app.services.stream_ingest import streaming_ingest, spool_upload
+from app.services.upload_jobs import upload_job_manager
+from app.services.resumable_upload import resumable_upload_service
+from app.services.direct_upload import direct_upload_service
+from app.services.text_extractor import schedule_text_extraction
+from app.services.page_images import page_image_service, schedule_page_images
+from app.services.near_duplicates import forget_file, index_preview, match_preview
+from app.routes.validators import FileValidator
 from app.client.minio_client import minio_client
 from minio.error import S3Error
 
 logger = logging.getLogger(__name__)
 
 
+def _publish_preview(images: Dict, upload_result: Dict) -> Optional[Dict]:
+    """Pipeline stage: upload the rendered preview set once the PDF is stored"""
+    if not upload_result['success']:
+        return None
+    return upload_preview(images, upload_result['file_id'])
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
 class UploadController:
     """Handle upload business logic"""
     
     def __init__(self):
-        pass
+        self._batch_pool = None
+        self._batch_lock = threading.Lock()
     
     def process_upload(self, file_buffer: bytes, filename: str, 
-                      validated_data: Dict, user_id: str) -> Tuple[bool, Optional[str], Optional[Dict]]:
+                      validated_data: Dict, user_id: str,
+                      on_stage: Optional[Callable] = None) -> Tuple[bool, Optional[str], Optional[Dict]]:
         """
         Process the complete upload workflow
         
+        The virus scan gates everything else. Metadata extraction and preview
+        rendering do not depend on each other and run concurrently, either
+        after the scan or speculatively alongside it (UPLOAD_STAGE_MODE).
+        
         Args:
             file_buffer: File content as bytes
             filename: Original filename
             validated_data: Validated form data
             user_id: User ID from authentication
+            on_stage: Optional progress callback ``on_stage(name, status)``
+            
+        Returns:
+            (success, error_message, response_data)
+        """
+        try:
+            with admission_controller.admit(len(file_buffer)):
+                content_hash = None
+                if Config.UPLOAD_DEDUP:
+                    content_hash = hashlib.sha256(file_buffer).hexdigest()
+                    duplicate = self._process_duplicate(
+                        content_hash, filename, validated_data, user_id, on_stage
+                    )
+                    if duplicate is not None:
+                        return duplicate
+            
+                logger.info(f"Processing {filename}: scan, metadata, storage, preview ({Config.UPLOAD_STAGE_MODE})")
+                pre_scan = () if Config.UPLOAD_STAGE_MODE == 'speculative' else ('scan',)
+            
+                stages = [
+                    Stage('scan', scan_uploaded_file, (file_buffer,), slot='scan'),
+                    Stage('metadata', extract_pdf_info, (file_buffer,), after=pre_scan, pool='process',
+                          slot='metadata'),
+                    Stage('upload', upload_file_to_storage,
+                          (file_buffer, validated_data['visibility'], secure_filename(filename), content_hash),
+                          after=('scan',)),
+                ]
+                if not Config.PREVIEW_ON_DEMAND:
+                    stages += [
+                        Stage('render', render_preview, (file_buffer,), after=pre_scan, slot='render'),
+                        Stage('preview', _publish_preview, requires=('render', 'upload')),
+                        Stage('similar', match_preview, (validated_data['visibility'], user_id),
+                              requires=('render', 'upload')),
+                    ]
+                run = stage_executor.run(
+                    stages, gate='scan', gate_check=lambda scan_result: scan_result['clean'], on_stage=on_stage
+                )
+            
+                return self._collect_stage_results(
+                    run, len(file_buffer), validated_data, user_id,
+                    scan_result=run.results.get('scan'), content_hash=content_hash
+                )
+            
+        except AdmissionRejected as e:
+            return False, str(e), None
+        except Exception as e:
+            logger.error(f"Unexpected error in upload processing: {e}")
+            return False, f"Internal server error: {str(e)}", None
+    
+    def process_streaming_upload(self, file_stream, filename: str,
+                                 validated_data: Dict, user_id: str,
+                                 on_stage: Optional[Callable] = None,
+                                 size_hint: Optional[int] = None) -> Tuple[bool, Optional[str], Optional[Dict]]:
+        """
+        Process an upload without materialising it in memory
+        
+        The stream is read once: ClamAV, the MinIO staging upload and SHA-256
+        are fed chunk by chunk, and the parsers then work from the spool file.
+        
+        Args:
+            file_stream: Readable binary stream of the uploaded file
+            filename: Original filename
+            validated_data: Validated form data
+            user_id: User ID from authentication
+            on_stage: Optional progress callback ``on_stage(name, status)``
+            size_hint: Expected size (e.g. Content-Length) charged to the
+                in-flight byte budget, MAX_CONTENT_LENGTH when unknown
             
         Returns:
             (success, error_message, response_data)
         """
+        notify = on_stage or (lambda name, status: None)
+        ingest_result = None
         try:
-            # Step 1: Virus scanning
-            logger.info(f"Scanning file {filename} for viruses")
-            scan_result = scan_uploaded_file(file_buffer)
+            with admission_controller.admit(size_hint or Config.MAX_CONTENT_LENGTH):
+                # Single pass - virus scan, staging upload and hashing
+                logger.info(f"Streaming {filename} through scan and storage")
+                notify('ingest', 'running')
+                with admission_controller.stage('scan'):
+                    ingest_result = streaming_ingest.ingest(file_stream, secure_filename(filename))
+                return self._process_ingested(ingest_result, filename, validated_data, user_id, on_stage)
             
-            if not scan_result['clean']:
-                logger.warning(f"Virus detected in uploaded file: {scan_result['result']}")
-                return False, f"File rejected - virus detected: {scan_result['result']}", None
+        except AdmissionRejected as e:
+            return False, str(e), None
+        except Exception as e:
+            logger.error(f"Unexpected error in streaming upload processing: {e}")
+            return False, f"Internal server error: {str(e)}", None
+        finally:
+            streaming_ingest.cleanup(ingest_result)
+    
+    def process_staged_upload(self, file_id: str, filename: str, validated_data: Dict,
+                              user_id: str, max_size: Optional[int] = None,
+                              on_stage: Optional[Callable] = None,
+                              size_bytes: Optional[int] = None) -> Tuple[bool, Optional[str], Optional[Dict]]:
+        """
+        Process a file that already sits in the quarantine prefix
+        
+        The object is streamed back from MinIO once through the scanner and
+        hash into a spool file, then handled like a streaming upload.
+        
+        Args:
+            file_id: File ID of ``quarantine/<file_id>.pdf``
+            filename: Original filename
+            validated_data: Validated form data
+            user_id: User ID from authentication
+            max_size: Size limit, defaults to MAX_CONTENT_LENGTH
+            on_stage: Optional progress callback ``on_stage(name, status)``
+            size_bytes: Object size, if known, charged to the byte budget
             
-            # Step 2: Extract PDF metadata
-            logger.info(f"Extracting metadata from {filename}")
-            pdf_metadata = extract_pdf_info(file_buffer)
+        Returns:
+            (success, error_message, response_data)
+        """
+        notify = on_stage or (lambda name, status: None)
+        ingest_result = None
+        response = None
+        try:
+            with admission_controller.admit(size_bytes or max_size or Config.MAX_CONTENT_LENGTH):
+                logger.info(f"Scanning staged file {file_id} ({filename})")
+                notify('ingest', 'running')
+                with admission_controller.stage('scan'):
+                    response = storage_service.open_staged(file_id)
+                    ingest_result = streaming_ingest.ingest(
+                        response, secure_filename(filename), file_id=file_id, staged=True, max_size=max_size
+                    )
+                if not ingest_result['success']:
+                    storage_service.discard_staged(file_id)
+                # Promote exactly the object version that was scanned
+                scanned_etag = response.headers.get('ETag', '').strip('"') or None
+                return self._process_ingested(
+                    ingest_result, filename, validated_data, user_id, on_stage, scanned_etag
+                )
             
-            # Step 3: Upload to storage
-            logger.info(f"Uploading {filename} to storage ({validated_data['visibility']})")
-            upload_result = upload_file_to_storage(
-                file_buffer,
-                visibility=validated_data['visibility'],
-                filename=secure_filename(filename)
+        except AdmissionRejected as e:
+            return False, str(e), None
+        except Exception as e:
+            logger.error(f"Unexpected error processing staged file {file_id}: {e}")
+            return False, f"Internal server error: {str(e)}", None
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+            streaming_ingest.cleanup(ingest_result)
+    
+    def _process_ingested(self, ingest_result: Dict, filename: str, validated_data: Dict,
+                          user_id: str, on_stage: Optional[Callable] = None,
+                          scanned_etag: Optional[str] = None
+                          ) -> Tuple[bool, Optional[str], Optional[Dict]]:
+        """
+        Finish an upload whose bytes are scanned, hashed, spooled and quarantined
+        
+        ``scanned_etag`` pins the promotion to the scanned object version
+        when clients can write to quarantine (staged uploads).
+        """
+        notify = on_stage or (lambda name, status: None)
+        notify('ingest', 'done' if ingest_result['success'] and ingest_result['scan_result']['clean'] else 'failed')
+        
+        if not ingest_result['success']:
+            logger.warning(f"Streaming ingest failed for {filename}: {ingest_result['error']}")
+            return False, ingest_result['error'], None
+        
+        file_id = ingest_result['file_id']
+        scan_result = ingest_result['scan_result']
+        if not scan_result['clean']:
+            logger.warning(f"Uploaded file not clean: {scan_result['result']}")
+            storage_service.discard_staged(file_id)
+            return False, rejection_message(scan_result), None
+        
+        content_hash = ingest_result['sha256'] if Config.UPLOAD_DEDUP else None
+        if content_hash:
+            duplicate = self._process_duplicate(
+                content_hash, filename, validated_data, user_id, on_stage
+            )
+            if duplicate is not None:
+                storage_service.discard_staged(file_id)
+                return duplicate
+        
+        # Metadata, promotion out of quarantine and preview from the spool file
+        spool_path = ingest_result['spool_path']
+        stages = [
+            Stage('metadata', extract_pdf_info_from_file, (spool_path,), pool='process', slot='metadata'),
+            Stage('upload', storage_service.promote_file,
+                  (file_id, validated_data['visibility'], secure_filename(filename),
+                   ingest_result['size_bytes'], content_hash, scanned_etag)),
+        ]
+        if not Config.PREVIEW_ON_DEMAND:
+            stages += [
+                Stage('render', render_preview, (None, spool_path), slot='render'),
+                Stage('preview', _publish_preview, requires=('render', 'upload')),
+                Stage('similar', match_preview, (validated_data['visibility'], user_id),
+                      requires=('render', 'upload')),
+            ]
+        run = stage_executor.run(stages, on_stage=on_stage)
+        
+        success, error_message, response_data = self._collect_stage_results(
+            run, ingest_result['size_bytes'], validated_data, user_id,
+            scan_result=scan_result, content_hash=content_hash
+        )
+        if not success:
+            storage_service.discard_staged(file_id)
+        return success, error_message, response_data
+    
+    def create_upload_session(self, filename: str, size: int, validated_data: Dict,
+                              user_id: str) -> Tuple[bool, Optional[str], Dict]:
+        """
+        Open a resumable upload session
+        
+        Returns:
+            (success, error_message, result) - ``result`` carries the session,
+            or the ``error_code`` on failure
+        """
+        try:
+            result = resumable_upload_service.create_session(
+                user_id, secure_filename(filename), size, validated_data
             )
+            return result['success'], result['error'], result
+        except Exception as e:
+            logger.error(f"Error opening upload session for {filename}: {e}")
+            return False, f"Internal server error: {str(e)}", {'error_code': 'PROCESSING_ERROR'}
+    
+    def get_upload_session(self, session_id: str, user_id: str) -> Tuple[bool, Optional[str], Dict]:
+        """Return a resumable upload session and its current offset"""
+        try:
+            result = resumable_upload_service.get_session(session_id, user_id)
+            return result['success'], result['error'], result
+        except Exception as e:
+            logger.error(f"Error reading upload session {session_id}: {e}")
+            return False, f"Internal server error: {str(e)}", {'error_code': 'PROCESSING_ERROR'}
+    
+    def upload_session_chunk(self, session_id: str, user_id: str, offset: int,
+                             data: bytes) -> Tuple[bool, Optional[str], Dict]:
+        """Store one chunk of a resumable upload"""
+        try:
+            result = resumable_upload_service.upload_chunk(session_id, user_id, offset, data)
+            return result['success'], result['error'], result
+        except Exception as e:
+            logger.error(f"Error storing chunk for upload session {session_id}: {e}")
+            return False, f"Internal server error: {str(e)}", {'error_code': 'PROCESSING_ERROR'}
+    
+    def abort_upload_session(self, session_id: str, user_id: str) -> Tuple[bool, Optional[str], Dict]:
+        """Cancel a resumable upload session"""
+        try:
+            result = resumable_upload_service.abort(session_id, user_id)
+            return result['success'], result['error'], result
+        except Exception as e:
+            logger.error(f"Error aborting upload session {session_id}: {e}")
+            return False, f"Internal server error: {str(e)}", {'error_code': 'PROCESSING_ERROR'}
+    
+    def finalize_upload_session(self, session_id: str, user_id: str,
+                                run_async: bool = False) -> Tuple[bool, Optional[str], Dict]:
+        """
+        Assemble a resumable upload and run it through scan, metadata and preview
+        
+        Args:
+            session_id: Upload session ID
+            user_id: User ID from authentication
+            run_async: Process in the background and return the job instead
             
-            if not upload_result['success']:
-                logger.error(f"Failed to upload file: {upload_result.get('error')}")
-                return False, f"Failed to upload file: {upload_result.get('error')}", None
+        Returns:
+            (success, error_message, result) - ``result['data']`` is the upload
+            response (or the job when ``run_async``); session failures carry
+            ``error_code``, pipeline failures only the message
+        """
+        try:
+            completed = resumable_upload_service.complete(session_id, user_id)
+            if not completed['success']:
+                return False, completed['error'], completed
             
-            preview_url = None
-
+            return self._finalize_staged(
+                completed['record'], user_id, Config.RESUMABLE_MAX_SIZE, run_async,
+                partial(resumable_upload_service.discard, session_id)
+            )
+            
+        except Exception as e:
+            logger.error(f"Error finalizing upload session {session_id}: {e}")
+            return False, f"Internal server error: {str(e)}", {'error_code': 'PROCESSING_ERROR'}
+    
+    def create_direct_upload(self, filename: str, validated_data: Dict,
+                             user_id: str) -> Tuple[bool, Optional[str], Dict]:
+        """
+        Issue a presigned PUT URL into the quarantine prefix
+        
+        Returns:
+            (success, error_message, result) - ``result['upload']`` holds the
+            URL and file id, failures carry ``error_code``
+        """
+        try:
+            result = direct_upload_service.create(user_id, secure_filename(filename), validated_data)
+            return result['success'], result['error'], result
+        except Exception as e:
+            logger.error(f"Error issuing direct upload for {filename}: {e}")
+            return False, f"Internal server error: {str(e)}", {'error_code': 'PROCESSING_ERROR'}
+    
+    def finalize_direct_upload(self, file_id: str, user_id: str,
+                               run_async: bool = False) -> Tuple[bool, Optional[str], Dict]:
+        """
+        Process a PDF the client uploaded straight to MinIO
+        
+        Returns:
+            Same contract as ``finalize_upload_session``
+        """
+        try:
+            claimed = direct_upload_service.claim(file_id, user_id)
+            if not claimed['success']:
+                return False, claimed['error'], claimed
+            
+            return self._finalize_staged(
+                claimed['record'], user_id, Config.DIRECT_UPLOAD_MAX_SIZE, run_async,
+                partial(direct_upload_service.discard, file_id)
+            )
+            
+        except Exception as e:
+            logger.error(f"Error finalizing direct upload {file_id}: {e}")
+            return False, f"Internal server error: {str(e)}", {'error_code': 'PROCESSING_ERROR'}
+    
+    def _finalize_staged(self, record: Dict, user_id: str, max_size: int, run_async: bool,
+                         on_finish: Callable) -> Tuple[bool, Optional[str], Dict]:
+        """Run ``process_staged_upload`` for a quarantined file, inline or as a job"""
+        process = partial(
+            self.process_staged_upload, record['file_id'], record['filename'],
+            record['validated_data'], user_id, max_size,
+            size_bytes=record.get('size_bytes') or record.get('size')
+        )
+        
+        if run_async:
+            job = upload_job_manager.submit(
+                lambda on_stage: process(on_stage=on_stage),
+                user_id, record['filename'], on_finish=on_finish
+            )
+            return True, None, {'data': job}
+        
+        try:
+            success, error_message, response_data = process()
+        finally:
+            on_finish()
+        if not success:
+            return False, error_message, {}
+        return True, None, {'data': response_data}
+    
+    def process_batch_upload(self, items: List[Dict], user_id: str) -> List[Dict]:
+        """
+        Run several validated uploads in parallel on the bounded batch pool
+        
+        Each file goes through the same pipeline as a single upload; a
+        failure only affects its own entry.
+        
+        Args:
+            items: Dicts with ``file_stream``, ``filename`` and ``validated_data``
+            user_id: User ID from authentication, shared by the whole batch
+            
+        Returns:
+            One dict per item, in order: ``success``, ``error`` and ``data``
+        """
+        pool = self._get_batch_pool()
+        futures = [
+            pool.submit(self._process_batch_item, item['file_stream'], item['filename'],
+                        item['validated_data'], user_id)
+            for item in items
+        ]
+        
+        results = []
+        for item, future in zip(items, futures):
             try:
-                logger.info(f"Generating preview for file_id {upload_result['file_id']}")
-                preview_result = generate_and_upload_preview(
-                    file_buffer=file_buffer,
-                    file_id=upload_result['file_id']
-                )
-                preview_url = preview_result.get("preview_url")
+                success, error_message, response_data = future.result()
             except Exception as e:
-                logger.warning(f"Failed to generate preview image: {e}")
+                logger.error(f"Unexpected error processing batch file {item['filename']}: {e}")
+                success, error_message, response_data = False, f"Internal server error: {str(e)}", None
+            results.append({'success': success, 'error': error_message, 'data': response_data})
+        
+        logger.info(f"Batch of {len(items)} files processed for user {user_id}: "
+                    f"{sum(r['success'] for r in results)} succeeded")
+        return results
+    
+    def _process_batch_item(self, file_stream, filename: str, validated_data: Dict,
+                            user_id: str) -> Tuple[bool, Optional[str], Optional[Dict]]:
+        if Config.UPLOAD_STREAMING:
+            return self.process_streaming_upload(file_stream, filename, validated_data, user_id)
+        
+        file_buffer = file_stream.read()
+        if not FileValidator.validate_file_not_empty(file_buffer):
+            return False, "Empty file uploaded", None
+        if not FileValidator.validate_file_size(file_buffer):
+            return False, f"File too large. Maximum size is {FileValidator.MAX_FILE_SIZE // (1024*1024)}MB", None
+        return self.process_upload(file_buffer, filename, validated_data, user_id)
+    
+    def _get_batch_pool(self) -> ThreadPoolExecutor:
+        with self._batch_lock:
+            if self._batch_pool is None:
+                self._batch_pool = ThreadPoolExecutor(
+                    max_workers=Config.UPLOAD_BATCH_WORKERS, thread_name_prefix='upload-batch'
+                )
+            return self._batch_pool
+    
+    def submit_upload_job(self, file_stream, filename: str, validated_data: Dict,
+                          user_id: str) -> Tuple[bool, Optional[str], Optional[Dict]]:
+        """
+        Persist the raw upload and process it in the background
+        
+        Args:
+            file_stream: Readable binary stream of the uploaded file
+            filename: Original filename
+            validated_data: Validated form data
+            user_id: User ID from authentication
             
-            # Step 4: Prepare response data
-            response_data = self._build_response_data(
-                upload_result, pdf_metadata, validated_data, user_id, preview_url
-            )
+        Returns:
+            (success, error_message, job)
+        """
+        try:
+            spool = spool_upload(file_stream)
+            if not spool['success']:
+                return False, spool['error'], None
             
-            logger.info(f"File uploaded successfully: {upload_result['file_id']} by user {user_id}")
-            return True, None, response_data
+            spool_path = spool['spool_path']
+            job = upload_job_manager.submit(
+                partial(self._process_spooled_upload, spool_path, filename, validated_data, user_id),
+                user_id,
+                secure_filename(filename),
+                on_finish=partial(_remove_quietly, spool_path)
+            )
+            return True, None, job
             
         except Exception as e:
-            logger.error(f"Unexpected error in upload processing: {e}")
+            logger.error(f"Error queueing upload job for {filename}: {e}")
             return False, f"Internal server error: {str(e)}", None
     
+    def get_upload_job(self, job_id: str, user_id: str) -> Tuple[bool, Optional[str], Optional[Dict]]:
+        """
+        Look up a background upload job owned by ``user_id``
+        
+        Returns:
+            (success, error_message, job)
+        """
+        try:
+            job = upload_job_manager.get(job_id, user_id)
+            if job is None:
+                return False, "Upload job not found", None
+            return True, None, job
+        except Exception as e:
+            logger.error(f"Error reading upload job {job_id}: {e}")
+            return False, str(e), None
+    
+    def _process_spooled_upload(self, spool_path: str, filename: str, validated_data: Dict,
+                                user_id: str, on_stage: Callable) -> Tuple[bool, Optional[str], Optional[Dict]]:
+        """Run the regular pipeline over an upload persisted by ``submit_upload_job``"""
+        with open(spool_path, 'rb') as spool:
+            if Config.UPLOAD_STREAMING:
+                return self.process_streaming_upload(
+                    spool, filename, validated_data, user_id, on_stage=on_stage,
+                    size_hint=os.path.getsize(spool_path)
+                )
+            return self.process_upload(
+                spool.read(), filename, validated_data, user_id, on_stage=on_stage
+            )
+    
+    def _process_duplicate(self, content_hash: str, filename: str, validated_data: Dict,
+                           user_id: str, on_stage: Optional[Callable] = None
+                           ) -> Optional[Tuple[bool, Optional[str], Optional[Dict]]]:
+        """
+        Serve a byte-identical re-upload from the content index
+        
+        Skips scanning, parsing, rendering and the PDF upload; only a new file
+        id referencing the shared blob is created.
+        
+        Returns:
+            (success, error_message, response_data), or None when the content
+            is unknown, or was scanned with signatures that have since been
+            updated, and the full pipeline has to run
+        """
+        entry = content_index.lookup(content_hash)
+        if entry is None:
+            return None
+        if not scanner.signature_is_current(entry['scan_result'].get('signature')):
+            logger.info(f"Content {content_hash[:12]}… was scanned with older signatures, rescanning")
+            return None
+        
+        notify = on_stage or (lambda name, status: None)
+        notify('dedup', 'running')
+        upload_result = storage_service.link_blob(
+            content_hash, validated_data['visibility'], secure_filename(filename), entry['size_bytes']
+        )
+        if not upload_result['success']:
+            logger.warning(f"Content index entry {content_hash[:12]}… is stale: {upload_result['error']}")
+            notify('dedup', 'failed')
+            return None
+        notify('dedup', 'done')
+        
+        preview_url = None
+        if entry.get('preview_file_id'):
+            try:
+                preview_url = copy_preview(entry['preview_file_id'], upload_result['file_id'])['preview_url']
+            except Exception as e:
+                logger.warning(f"Failed to reuse preview image: {e}")
+        
+        response_data = self._build_response_data(
+            upload_result, entry['metadata'], validated_data, user_id, preview_url
+        )
+        
+        logger.info(f"Duplicate upload {upload_result['file_id']} by user {user_id} "
+                    f"linked to {content_hash[:12]}…")
+        return True, None, response_data
+    
+    def _collect_stage_results(self, run: StageRun, size_bytes: int, validated_data: Dict,
+                               user_id: str, scan_result: Optional[Dict] = None,
+                               content_hash: Optional[str] = None) -> Tuple[bool, Optional[str], Optional[Dict]]:
+        """Turn a pipeline run into the (success, error_message, response_data) contract"""
+        # Only an overloaded scan fails the request. By the time metadata or
+        # rendering are turned away the PDF is stored, so those degrade to the
+        # fallback metadata / no preview below instead of orphaning it.
+        overloaded = run.errors.get('scan')
+        if isinstance(overloaded, AdmissionRejected):
+            return False, str(overloaded), None
+        
+        if run.rejected:
+            scan_result = run.results.get('scan') or {
+                'clean': False, 'result': f"Scan error: {run.errors.get('scan')}"
+            }
+            logger.warning(f"Uploaded file not clean: {scan_result['result']}")
+            return False, rejection_message(scan_result), None
+        
+        upload_result = run.results.get('upload') or {
+            'success': False, 'error': str(run.errors.get('upload'))
+        }
+        if not upload_result['success']:
+            logger.error(f"Failed to upload file: {upload_result.get('error')}")
+            return False, f"Failed to upload file: {upload_result.get('error')}", None
+        
+        pdf_metadata = run.results.get('metadata')
+        if pdf_metadata is None:
+            logger.warning(f"Metadata extraction failed: {run.errors.get('metadata')}")
+            pdf_metadata = MetadataExtractor.fallback_metadata(size_bytes // 1024)
+        
+        preview_url = None
+        if Config.PREVIEW_ON_DEMAND:
+            # Rendered by the preview endpoint on first request
+            preview_url = preview_public_url(preview_object_name(upload_result['file_id']))
+        elif run.succeeded('preview'):
+            preview_url = run.results['preview'].get('preview_url')
+        else:
+            preview_error = run.errors.get('preview') or run.errors.get('render')
+            logger.warning(f"Failed to generate preview image: {preview_error}")
+        
+        # Results degraded by overload are not reused for later duplicates
+        degraded = any(isinstance(e, AdmissionRejected) for e in run.errors.values())
+        if content_hash and not degraded:
+            try:
+                content_index.register(
+                    content_hash, scan_result, pdf_metadata,
+                    upload_result['file_id'] if run.succeeded('preview') else None, size_bytes
+                )
+            except Exception as e:
+                logger.warning(f"Could not index content {content_hash[:12]}…: {e}")
+        
+        if run.errors.get('similar'):
+            logger.warning(f"Near-duplicate lookup failed: {run.errors['similar']}")
+        
+        response_data = self._build_response_data(
+            upload_result, pdf_metadata, validated_data, user_id, preview_url,
+            near_duplicates=run.results.get('similar')
+        )
+        
+        schedule_text_extraction(upload_result['object_path'])
+        schedule_page_images(upload_result['file_id'], upload_result['object_path'], validated_data['visibility'])
+        try:
+            index_preview(run.results.get('similar'), upload_result['file_id'], user_id, validated_data['visibility'])
+        except Exception as e:
+            logger.warning(f"Could not index preview of {upload_result['file_id']}: {e}")
+        
+        logger.info(f"File uploaded successfully: {upload_result['file_id']} by user {user_id}")
+        return True, None, response_data
+    
     def _build_response_data(self, upload_result: Dict, pdf_metadata: Dict, 
-                           validated_data: Dict, user_id: str, preview_url: Optional[str]) -> Dict:
+                           validated_data: Dict, user_id: str, preview_url: Optional[str],
+                           near_duplicates: Optional[Dict] = None) -> Dict:
         """Build response data structure"""
         response_metadata = {
             'title': pdf_metadata['title'],
@@ -101,6 +659,8 @@ class UploadController:
             'subject': pdf_metadata.get('subject', ''),
             'creator': pdf_metadata.get('creator', '')
         }
+        if near_duplicates:
+            response_metadata['near_duplicates'] = near_duplicates
         
         return {
             'message': 'Upload successful',
@@ -129,6 +689,8 @@ class UploadController:
                     break
             
             if deleted:
+                forget_file(file_id)
+                page_image_service.delete(file_id)
                 logger.info(f"File {file_id} deleted successfully by user {user_id}")
                 return True, None
             else:
@@ -142,10 +704,13 @@ class UploadController:
         try:
             url = None
             if visibility == 'public':
+                object_path = storage_service.resolve_object_path(file_id, 'public')
+                if object_path is None:
+                    return False, 'File not found', None
                 protocol = 'https' if Config.MINIO_SECURE else 'http'
-                url = f"{protocol}://{Config.PUBLIC_MINIO_HOST}/{Config.MINIO_BUCKET}/public/{file_id}.pdf"
+                url = f"{protocol}://{Config.PUBLIC_MINIO_HOST}/{Config.MINIO_BUCKET}/{object_path}"
                 try:
-                    storage_service.client.stat_object(Config.MINIO_BUCKET, f"public/{file_id}.pdf")
+                    storage_service.client.stat_object(Config.MINIO_BUCKET, object_path)
                 except S3Error:
                     return False, 'File not found', None
 
@@ -171,27 +736,59 @@ class UploadController:
             return False, str(e), None
         
 
-    def get_preview_url(self, file_id: str) -> Tuple[bool, Optional[str], Optional[str]]:
+    def get_preview_url(self, file_id: str) -> Tuple[bool, Optional[str], Optional[Dict]]:
         """
-        Generate public URL for preview image if it exists.
+        Generate public URLs for the preview image and its size variants if it exists.
+        With PREVIEW_ON_DEMAND a missing preview is rendered from the stored PDF first.
 
         Args:
             file_id: The ID of the PDF file
 
         Returns:
-            Tuple: (success, error_message, preview_url)
+            Tuple: (success, error_message, {'preview_url', 'srcset'}) where
+            srcset maps MIME types to srcset strings
         """
         try:
-            preview_key = f"{Config.PREVIEW_FOLDER}/{file_id}.jpg"
-            protocol = 'https' if Config.MINIO_SECURE else 'http'
-            url = f"{protocol}://{Config.PUBLIC_MINIO_HOST}/{Config.MINIO_BUCKET}/{preview_key}"
+            preview_key = preview_object_name(file_id)
 
             # ✅ Use the same client that uploaded the preview
-            minio_client.stat_object(Config.MINIO_BUCKET, preview_key)
+            try:
+                minio_client.stat_object(Config.MINIO_BUCKET, preview_key)
+            except S3Error:
+                if not Config.PREVIEW_ON_DEMAND:
+                    raise
+                preview = render_preview_on_demand(file_id)
+                if preview is None:
+                    return False, "Preview image not found", None
+                return True, None, {'preview_url': preview['preview_url'], 'srcset': preview['preview_srcset']}
 
-            return True, None, url
+            return True, None, {
+                'preview_url': preview_public_url(preview_key),
+                'srcset': build_srcset(list_preview_variants(file_id))
+            }
         except S3Error:
             return False, "Preview image not found", None
+        except AdmissionRejected as e:
+            return False, str(e), None
         except Exception as e:
             logger.error(f"Error getting preview URL for {file_id}: {e}")
-            return False, "Internal server error", None
\ No newline at end of file
+            return False, "Internal server error", None
+
+    def get_page_manifest(self, file_id: str) -> Tuple[bool, Optional[str], Optional[Dict]]:
+        """
+        Manifest of the per-page images of a PDF (see app.services.page_images)
+
+        Args:
+            file_id: The ID of the PDF file
+
+        Returns:
+            Tuple: (success, error_message, manifest)
+        """
+        try:
+            manifest = page_image_service.get_manifest(file_id)
+            if manifest is None:
+                return False, "Page images not found", None
+            return True, None, manifest
+        except Exception as e:
+            logger.error(f"Error getting page manifest for {file_id}: {e}")
+            return False, "Internal server error", None
@@ -1,8 +1,9 @@
 """
 Error handlers for upload routes
 """
-from flask import jsonify, Blueprint
+from flask import jsonify, Blueprint, request
 import logging
+from app.config.config import Config
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +20,7 @@ class UploadErrorHandler:
             """Handle file too large error"""
             logger.warning("File upload rejected: File too large")
             return jsonify({
-                'error': 'File too large. Maximum size is 16MB.',
+                'error': f'File too large. Maximum size is {(request.max_content_length or Config.MAX_CONTENT_LENGTH) // (1024 * 1024)}MB.',
                 'error_code': 'FILE_TOO_LARGE'
             }), 413
         
@@ -77,6 +78,40 @@ class UploadErrorHandler:
         
         return jsonify(error_response), status_code
     
+    @staticmethod
+    def classify_upload_error(error_message: str) -> str:
+        """Map an upload pipeline error message to its error code"""
+        message = (error_message or '').lower()
+        if message.startswith(("empty file", "file too large")):
+            return 'FILE_ERROR'
+        if "virus scanner unavailable" in message:
+            return 'SERVICE_UNAVAILABLE'
+        if "virus detected" in message:
+            return 'VIRUS_DETECTED'
+        if "failed to upload" in message:
+            return 'STORAGE_ERROR'
+        if message.startswith("server busy"):
+            return 'SERVICE_OVERLOADED'
+        return 'PROCESSING_ERROR'
+    
+    @staticmethod
+    def handle_upload_failure(error_message: str) -> tuple:
+        """Build the response for a failed upload pipeline run"""
+        error_code = UploadErrorHandler.classify_upload_error(error_message)
+        if error_code == 'FILE_ERROR':
+            return UploadErrorHandler.handle_file_error(error_message)
+        if error_code == 'VIRUS_DETECTED':
+            return UploadErrorHandler.handle_virus_detection_error(error_message)
+        if error_code == 'STORAGE_ERROR':
+            return UploadErrorHandler.handle_storage_error(error_message)
+        if error_code == 'SERVICE_OVERLOADED':
+            return UploadErrorHandler.handle_overload_error(error_message)
+        if error_code == 'SERVICE_UNAVAILABLE':
+            return UploadErrorHandler.handle_unavailable_error(
+                'Virus scanner temporarily unavailable, retry later', int(Config.DEPENDENCY_RESET_TIMEOUT)
+            )
+        return UploadErrorHandler.handle_processing_error(error_message)
+    
     @staticmethod
     def handle_validation_error(error_message: str) -> tuple:
         """Handle validation errors"""
@@ -115,6 +150,48 @@ class UploadErrorHandler:
             scan_result
         )
     
+    @staticmethod
+    def handle_overload_error(error_message: str, retry_after: int = None) -> tuple:
+        """Handle uploads turned away by admission control"""
+        response, status_code = UploadErrorHandler.create_error_response(
+            error_message, 503, 'SERVICE_OVERLOADED'
+        )
+        return response, status_code, {'Retry-After': str(retry_after or Config.ADMISSION_RETRY_AFTER)}
+    
+    @staticmethod
+    def handle_unavailable_error(error_message: str, retry_after: int) -> tuple:
+        """Handle requests refused while a dependency's circuit is open"""
+        response, status_code = UploadErrorHandler.create_error_response(
+            error_message, 503, 'SERVICE_UNAVAILABLE'
+        )
+        return response, status_code, {'Retry-After': str(retry_after)}
+    
+    @staticmethod
+    def handle_conflict_error(error_message: str, offset: int = None,
+                              error_code: str = 'OFFSET_MISMATCH') -> tuple:
+        """Handle uploads that are not in the state the request expects"""
+        response, status_code = UploadErrorHandler.create_error_response(
+            error_message, 409, error_code
+        )
+        if offset is None:
+            return response, status_code
+        return response, status_code, {'Upload-Offset': str(offset)}
+    
+    @staticmethod
+    def handle_session_error(error_message: str, result: dict = None,
+                             resource: str = "Upload session") -> tuple:
+        """Build the response for a failed resumable or direct upload call"""
+        error_code = (result or {}).get('error_code')
+        if error_code == 'NOT_FOUND':
+            return UploadErrorHandler.handle_not_found_error(resource)
+        if error_code in ('OFFSET_MISMATCH', 'CONFLICT'):
+            return UploadErrorHandler.handle_conflict_error(
+                error_message, result.get('offset'), error_code
+            )
+        if error_code == 'VALIDATION_ERROR':
+            return UploadErrorHandler.handle_validation_error(error_message)
+        return UploadErrorHandler.handle_upload_failure(error_message)
+    
     @staticmethod
     def handle_auth_error(error_message: str = "Authentication required") -> tuple:
         """Handle authentication errors"""
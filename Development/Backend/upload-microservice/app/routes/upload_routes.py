@@ -1,13 +1,16 @@
 """
 Upload routes for PDF file handling - Refactored and modularized
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, url_for
+import json
 import logging
 
 from app.utils.auth import require_auth
 from app.routes.validators import UploadValidator
 from app.routes.controller import UploadController
 from app.routes.error_handlers import UploadErrorHandler
+from app.services.dependencies import dependency_monitor
+from app.config.config import Config
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +26,47 @@ error_handler = UploadErrorHandler()
 error_handler.register_error_handlers(upload_bp)
 
 
+# Endpoints that run the virus scan; refused while ClamAV is down
+SCANNING_ENDPOINTS = {
+    'upload.upload_pdf', 'upload.upload_batch',
+    'upload.finalize_upload_session', 'upload.finalize_direct_upload'
+}
+
+
+@upload_bp.before_request
+def require_storage():
+    """Fail fast while the MinIO (or, for uploads, ClamAV) circuit is open instead of waiting on timeouts"""
+    if request.endpoint == 'upload.get_categories':
+        return None
+    if not dependency_monitor.is_available('MinIO'):
+        return error_handler.handle_unavailable_error(
+            'Storage temporarily unavailable, retry later', dependency_monitor.retry_after('MinIO')
+        )
+    if request.endpoint in SCANNING_ENDPOINTS and not dependency_monitor.is_available('ClamAV'):
+        return error_handler.handle_unavailable_error(
+            'Virus scanner temporarily unavailable, retry later', dependency_monitor.retry_after('ClamAV')
+        )
+    return None
+
+
+def _accepted_response(job):
+    """202 pointing at the background job processing an upload"""
+    status_url = url_for('upload.get_upload_job', job_id=job['job_id'])
+    return jsonify({
+        'message': 'Upload accepted',
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'status_url': status_url
+    }), 202, {'Location': status_url}
+
+
+def _finalized_response(data, run_async):
+    """201 with the upload result, or 202 pointing at the background job"""
+    if not run_async:
+        return jsonify(data), 201
+    return _accepted_response(data)
+
+
 @upload_bp.route('/upload/categories', methods=['GET'])
 def get_categories():
     """
@@ -83,9 +127,17 @@ def upload_pdf(user_id):
               visibility:
                 type: string
                 enum: [public, private]
+    parameters:
+      - name: async
+        in: query
+        type: boolean
+        required: false
+        description: Accept the file and process it in the background (202 + job id)
     responses:
       201:
         description: Upload successful
+      202:
+        description: Upload accepted for background processing
       400:
         description: Validation error
       401:
@@ -106,27 +158,40 @@ def upload_pdf(user_id):
         if not is_valid:
             return error_handler.handle_validation_error(error_message)
         
-        # Read file content
         file.seek(0)  # Reset file pointer
-        file_buffer = file.read()
         
-        # Validate file content
-        is_valid, error_message = validator.validate_file_content(file_buffer)
-        if not is_valid:
-            return error_handler.handle_file_error(error_message)
+        if Config.UPLOAD_ASYNC or request.args.get('async', '').lower() == 'true':
+            # Persist the raw upload and process it on the background pool
+            success, error_message, job = controller.submit_upload_job(
+                file.stream, file.filename, validated_data, user_id
+            )
+            if not success:
+                return error_handler.handle_upload_failure(error_message)
+            
+            return _accepted_response(job)
         
-        # Process upload
-        success, error_message, response_data = controller.process_upload(
-            file_buffer, file.filename, validated_data, user_id
-        )
+        if Config.UPLOAD_STREAMING:
+            # Single pass over the stream; size limits are enforced while reading
+            success, error_message, response_data = controller.process_streaming_upload(
+                file.stream, file.filename, validated_data, user_id,
+                size_hint=request.content_length
+            )
+        else:
+            # Read file content
+            file_buffer = file.read()
+            
+            # Validate file content
+            is_valid, error_message = validator.validate_file_content(file_buffer)
+            if not is_valid:
+                return error_handler.handle_file_error(error_message)
+            
+            # Process upload
+            success, error_message, response_data = controller.process_upload(
+                file_buffer, file.filename, validated_data, user_id
+            )
         
         if not success:
-            if "virus detected" in error_message.lower():
-                return error_handler.handle_virus_detection_error(error_message)
-            elif "failed to upload" in error_message.lower():
-                return error_handler.handle_storage_error(error_message)
-            else:
-                return error_handler.handle_processing_error(error_message)
+            return error_handler.handle_upload_failure(error_message)
         
         return jsonify(response_data), 201
         
@@ -137,6 +202,578 @@ def upload_pdf(user_id):
         )
 
 
+@upload_bp.route('/upload/batch', methods=['POST'])
+@require_auth
+def upload_batch(user_id):
+    """
+    Upload Several PDFs
+    ---
+    tags:
+      - Upload
+    security:
+      - bearerAuth: []
+    requestBody:
+      required: true
+      content:
+        multipart/form-data:
+          schema:
+            type: object
+            required:
+              - files
+            properties:
+              files:
+                type: array
+                items:
+                  type: string
+                  format: binary
+              metadata:
+                type: string
+                description: >
+                  JSON array aligned with files; each entry may set category,
+                  subcategory, tags and visibility
+              category:
+                type: string
+                description: Default for entries without their own category
+              subcategory:
+                type: string
+              tags:
+                type: string
+              visibility:
+                type: string
+                enum: [public, private]
+    responses:
+      201:
+        description: Every file uploaded
+      207:
+        description: Some files failed; see the per-file results
+        examples:
+          application/json:
+            succeeded: 1
+            failed: 1
+            results:
+              - {index: 0, filename: "a.pdf", status: 201, data: {pdf_id: "uuid"}}
+              - {index: 1, filename: "b.pdf", status: 400, error: "Only PDF files are allowed", error_code: "VALIDATION_ERROR"}
+      400:
+        description: Validation error
+      401:
+        description: Unauthorized
+    """
+    try:
+        # The whole batch is bounded instead of every file by MAX_CONTENT_LENGTH
+        request.max_content_length = Config.UPLOAD_BATCH_MAX_SIZE
+        
+        files = request.files.getlist('files')
+        if not files:
+            return error_handler.handle_validation_error('No files provided')
+        if len(files) > Config.UPLOAD_BATCH_MAX_FILES:
+            return error_handler.handle_validation_error(
+                f'Too many files. Maximum is {Config.UPLOAD_BATCH_MAX_FILES} per batch'
+            )
+        
+        defaults = request.form.to_dict()
+        try:
+            per_file = json.loads(defaults.pop('metadata', '[]'))
+        except json.JSONDecodeError:
+            return error_handler.handle_validation_error('Invalid metadata JSON format')
+        if not isinstance(per_file, list) or len(per_file) > len(files):
+            return error_handler.handle_validation_error(
+                'Metadata must be a JSON array with at most one entry per file'
+            )
+        
+        results = [None] * len(files)
+        items = []
+        for index, file in enumerate(files):
+            overrides = per_file[index] if index < len(per_file) else {}
+            if not isinstance(overrides, dict):
+                overrides = {}
+            is_valid, error_message, validated_data = validator.validate_upload_request(
+                file, {**defaults, **overrides}
+            )
+            if not is_valid:
+                results[index] = {
+                    'index': index,
+                    'filename': file.filename,
+                    'status': 400,
+                    'error': error_message,
+                    'error_code': 'VALIDATION_ERROR'
+                }
+                continue
+            items.append({
+                'index': index,
+                'file_stream': file.stream,
+                'filename': file.filename,
+                'validated_data': validated_data
+            })
+        
+        for item, outcome in zip(items, controller.process_batch_upload(items, user_id)):
+            entry = {'index': item['index'], 'filename': item['filename']}
+            if outcome['success']:
+                entry.update(status=201, data=outcome['data'])
+            else:
+                response, status_code = error_handler.handle_upload_failure(outcome['error'])[:2]
+                entry.update(status=status_code, error=outcome['error'],
+                             error_code=response.get_json()['error_code'])
+            results[item['index']] = entry
+        
+        failed = sum(1 for entry in results if entry['status'] != 201)
+        return jsonify({
+            'succeeded': len(results) - failed,
+            'failed': failed,
+            'results': results
+        }), 201 if failed == 0 else 207
+        
+    except Exception as e:
+        logger.error(f"Unexpected error in batch upload endpoint: {e}")
+        return error_handler.handle_processing_error(
+            "Internal server error", str(e)
+        )
+
+
+@upload_bp.route('/upload/jobs/<job_id>', methods=['GET'])
+@require_auth
+def get_upload_job(user_id, job_id):
+    """
+    Get Upload Job Status
+    ---
+    tags:
+      - Upload
+    security:
+      - bearerAuth: []
+    parameters:
+      - name: job_id
+        in: path
+        type: string
+        required: true
+        description: Job ID returned by an asynchronous upload
+    responses:
+      200:
+        description: Job status, stage progress and, once finished, the upload result
+        examples:
+          application/json:
+            job_id: "job-uuid"
+            status: "processing"
+            stages: {"scan": "done", "metadata": "running", "upload": "running"}
+            result: null
+            error: null
+      404:
+        description: Job not found
+    """
+    try:
+        success, error_message, job = controller.get_upload_job(job_id, user_id)
+        
+        if not success:
+            return error_handler.handle_not_found_error("Upload job")
+        
+        error = None
+        if job.get('error'):
+            error = {
+                'message': job['error'],
+                'error_code': error_handler.classify_upload_error(job['error'])
+            }
+        
+        return jsonify({
+            'job_id': job['job_id'],
+            'status': job['status'],
+            'filename': job.get('filename'),
+            'stages': job.get('stages', {}),
+            'result': job.get('result'),
+            'error': error,
+            'created_at': job.get('created_at'),
+            'updated_at': job.get('updated_at')
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error in upload job endpoint for {job_id}: {e}")
+        return error_handler.handle_processing_error(
+            "Failed to get upload job", str(e)
+        )
+
+
+@upload_bp.route('/upload/sessions', methods=['POST'])
+@require_auth
+def create_upload_session(user_id):
+    """
+    Open Resumable Upload Session
+    ---
+    tags:
+      - Upload
+    security:
+      - bearerAuth: []
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            required:
+              - filename
+              - size
+              - category
+              - subcategory
+              - visibility
+            properties:
+              filename:
+                type: string
+              size:
+                type: integer
+                description: Total file size in bytes
+              category:
+                type: string
+              subcategory:
+                type: string
+              tags:
+                type: array
+                items:
+                  type: string
+              visibility:
+                type: string
+                enum: [public, private]
+    responses:
+      201:
+        description: Session created; send chunks of chunk_size bytes with PUT
+        examples:
+          application/json:
+            session_id: "session-uuid"
+            offset: 0
+            chunk_size: 8388608
+            size: 73400320
+      400:
+        description: Validation error
+      401:
+        description: Unauthorized
+    """
+    try:
+        form_data = request.get_json(silent=True) or request.form.to_dict()
+        
+        is_valid, error_message, validated_data = validator.validate_upload_metadata(
+            form_data.get('filename', ''), form_data
+        )
+        if not is_valid:
+            return error_handler.handle_validation_error(error_message)
+        
+        is_valid, error_message, size = validator.validate_declared_size(form_data.get('size'))
+        if not is_valid:
+            return error_handler.handle_validation_error(error_message)
+        
+        success, error_message, result = controller.create_upload_session(
+            form_data['filename'], size, validated_data, user_id
+        )
+        if not success:
+            return error_handler.handle_session_error(error_message, result)
+        
+        session = result['session']
+        session_url = url_for('upload.upload_session_chunk', session_id=session['session_id'])
+        return jsonify(session), 201, {'Location': session_url, 'Upload-Offset': '0'}
+        
+    except Exception as e:
+        logger.error(f"Error in create upload session endpoint: {e}")
+        return error_handler.handle_processing_error(
+            "Failed to create upload session", str(e)
+        )
+
+
+@upload_bp.route('/upload/sessions/<session_id>', methods=['GET'])
+@require_auth
+def get_upload_session(user_id, session_id):
+    """
+    Get Resumable Upload Offset
+    ---
+    tags:
+      - Upload
+    security:
+      - bearerAuth: []
+    parameters:
+      - name: session_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: Session state; resume uploading at offset
+      404:
+        description: Session not found or expired
+    """
+    try:
+        success, error_message, result = controller.get_upload_session(session_id, user_id)
+        if not success:
+            return error_handler.handle_session_error(error_message, result)
+        
+        session = result['session']
+        return jsonify(session), 200, {'Upload-Offset': str(session['offset'])}
+        
+    except Exception as e:
+        logger.error(f"Error in upload session endpoint for {session_id}: {e}")
+        return error_handler.handle_processing_error(
+            "Failed to get upload session", str(e)
+        )
+
+
+@upload_bp.route('/upload/sessions/<session_id>', methods=['PUT'])
+@require_auth
+def upload_session_chunk(user_id, session_id):
+    """
+    Upload Chunk
+    ---
+    tags:
+      - Upload
+    security:
+      - bearerAuth: []
+    parameters:
+      - name: session_id
+        in: path
+        type: string
+        required: true
+      - name: Upload-Offset
+        in: header
+        type: integer
+        required: true
+        description: Byte offset of this chunk; a multiple of chunk_size
+    requestBody:
+      required: true
+      content:
+        application/octet-stream:
+          schema:
+            type: string
+            format: binary
+    responses:
+      200:
+        description: Chunk stored; the new offset is returned
+      409:
+        description: Offset mismatch; Upload-Offset holds the offset to resume from
+      404:
+        description: Session not found or expired
+    """
+    try:
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return error_handler.handle_validation_error('Upload-Offset header is required')
+        
+        success, error_message, result = controller.upload_session_chunk(
+            session_id, user_id, offset, request.get_data(cache=False)
+        )
+        if not success:
+            return error_handler.handle_session_error(error_message, result)
+        
+        session = result['session']
+        return jsonify(session), 200, {'Upload-Offset': str(session['offset'])}
+        
+    except Exception as e:
+        logger.error(f"Error in upload chunk endpoint for {session_id}: {e}")
+        return error_handler.handle_processing_error(
+            "Failed to store chunk", str(e)
+        )
+
+
+@upload_bp.route('/upload/sessions/<session_id>/finalize', methods=['POST'])
+@require_auth
+def finalize_upload_session(user_id, session_id):
+    """
+    Finalize Resumable Upload
+    ---
+    tags:
+      - Upload
+    security:
+      - bearerAuth: []
+    parameters:
+      - name: session_id
+        in: path
+        type: string
+        required: true
+      - name: async
+        in: query
+        type: boolean
+        required: false
+        description: Process in the background (202 + job id)
+    responses:
+      201:
+        description: Upload successful
+      202:
+        description: Upload accepted for background processing
+      400:
+        description: Virus detected or invalid file
+      409:
+        description: Not all chunks have been received
+      404:
+        description: Session not found or expired
+    """
+    try:
+        run_async = Config.UPLOAD_ASYNC or request.args.get('async', '').lower() == 'true'
+        success, error_message, result = controller.finalize_upload_session(
+            session_id, user_id, run_async
+        )
+        if not success:
+            return error_handler.handle_session_error(error_message, result)
+        
+        return _finalized_response(result['data'], run_async)
+        
+    except Exception as e:
+        logger.error(f"Error in finalize upload session endpoint for {session_id}: {e}")
+        return error_handler.handle_processing_error(
+            "Internal server error", str(e)
+        )
+
+
+@upload_bp.route('/upload/sessions/<session_id>', methods=['DELETE'])
+@require_auth
+def abort_upload_session(user_id, session_id):
+    """
+    Abort Resumable Upload
+    ---
+    tags:
+      - Upload
+    security:
+      - bearerAuth: []
+    parameters:
+      - name: session_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: Session aborted and uploaded chunks discarded
+      404:
+        description: Session not found or expired
+    """
+    try:
+        success, error_message, result = controller.abort_upload_session(session_id, user_id)
+        if not success:
+            return error_handler.handle_session_error(error_message, result)
+        
+        return jsonify({'message': 'Upload session aborted'}), 200
+        
+    except Exception as e:
+        logger.error(f"Error in abort upload session endpoint for {session_id}: {e}")
+        return error_handler.handle_processing_error(
+            "Failed to abort upload session", str(e)
+        )
+
+
+@upload_bp.route('/upload/direct', methods=['POST'])
+@require_auth
+def create_direct_upload(user_id):
+    """
+    Request Direct Upload URL
+    ---
+    tags:
+      - Upload
+    security:
+      - bearerAuth: []
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            required:
+              - filename
+              - category
+              - subcategory
+              - visibility
+            properties:
+              filename:
+                type: string
+              category:
+                type: string
+              subcategory:
+                type: string
+              tags:
+                type: array
+                items:
+                  type: string
+              visibility:
+                type: string
+                enum: [public, private]
+    responses:
+      201:
+        description: PUT the PDF to upload_url, then call finalize_url
+        examples:
+          application/json:
+            file_id: "uuid"
+            upload_url: "http://minio/pdf-upload-service/quarantine/uuid.pdf?X-Amz-..."
+            method: "PUT"
+            headers: {"Content-Type": "application/pdf"}
+            finalize_url: "/api/upload/direct/uuid/finalize"
+      400:
+        description: Validation error
+      401:
+        description: Unauthorized
+    """
+    try:
+        form_data = request.get_json(silent=True) or request.form.to_dict()
+        
+        is_valid, error_message, validated_data = validator.validate_upload_metadata(
+            form_data.get('filename', ''), form_data
+        )
+        if not is_valid:
+            return error_handler.handle_validation_error(error_message)
+        
+        success, error_message, result = controller.create_direct_upload(
+            form_data['filename'], validated_data, user_id
+        )
+        if not success:
+            return error_handler.handle_session_error(error_message, result, "Direct upload")
+        
+        upload = dict(result['upload'])
+        upload['finalize_url'] = url_for('upload.finalize_direct_upload', file_id=upload['file_id'])
+        return jsonify(upload), 201
+        
+    except Exception as e:
+        logger.error(f"Error in direct upload endpoint: {e}")
+        return error_handler.handle_processing_error(
+            "Failed to create direct upload", str(e)
+        )
+
+
+@upload_bp.route('/upload/direct/<file_id>/finalize', methods=['POST'])
+@require_auth
+def finalize_direct_upload(user_id, file_id):
+    """
+    Finalize Direct Upload
+    ---
+    tags:
+      - Upload
+    security:
+      - bearerAuth: []
+    parameters:
+      - name: file_id
+        in: path
+        type: string
+        required: true
+      - name: async
+        in: query
+        type: boolean
+        required: false
+        description: Process in the background (202 + job id)
+    responses:
+      201:
+        description: Upload successful
+      202:
+        description: Upload accepted for background processing
+      400:
+        description: Virus detected or invalid file
+      409:
+        description: The file has not been uploaded yet
+      404:
+        description: Direct upload not found or expired
+    """
+    try:
+        run_async = Config.UPLOAD_ASYNC or request.args.get('async', '').lower() == 'true'
+        success, error_message, result = controller.finalize_direct_upload(
+            file_id, user_id, run_async
+        )
+        if not success:
+            return error_handler.handle_session_error(error_message, result, "Direct upload")
+        
+        return _finalized_response(result['data'], run_async)
+        
+    except Exception as e:
+        logger.error(f"Error in finalize direct upload endpoint for {file_id}: {e}")
+        return error_handler.handle_processing_error(
+            "Internal server error", str(e)
+        )
+
+
 @upload_bp.route('/upload/files/<file_id>', methods=['DELETE'])
 @require_auth
 def delete_pdf(user_id, file_id):
@@ -273,21 +910,85 @@ def get_preview_image(file_id):
         description: The file ID of the uploaded PDF
     responses:
       200:
-        description: Preview image URL generated
+        description: Preview image URL and srcset strings per image type
         examples:
           application/json:
-            preview_url: "http://localhost:9000/pdf-upload-service/preview/<file_id>.jpg"
+            preview_url: "http://localhost:9000/pdf-upload-service/previews/<file_id>.jpg"
+            srcset:
+              image/webp: "http://localhost:9000/pdf-upload-service/previews/<file_id>/160.webp 160w, ..."
+              image/jpeg: "http://localhost:9000/pdf-upload-service/previews/<file_id>/160.jpg 160w, ..."
       404:
         description: Preview not found
+      503:
+        description: Too many previews being rendered on demand (PREVIEW_ON_DEMAND)
     """
     try:
-        success, error_message, url = controller.get_preview_url(file_id)
+        success, error_message, preview = controller.get_preview_url(file_id)
 
         if success:
-            return jsonify({'preview_url': url}), 200
+            return jsonify(preview), 200
+        elif error_handler.classify_upload_error(error_message) == 'SERVICE_OVERLOADED':
+            return error_handler.handle_overload_error(error_message)
         else:
             return error_handler.handle_preview_error(error_message)
 
     except Exception as e:
         logger.error(f"Exception in preview route for {file_id}: {e}")
-        return error_handler.handle_generic_error("Error retrieving preview")
\ No newline at end of file
+        return error_handler.handle_generic_error("Error retrieving preview")
+
+
+@upload_bp.route('/upload/pages/<file_id>/manifest', methods=['GET'])
+@require_auth
+def get_page_manifest(user_id, file_id):
+    """
+    Get the Manifest of Per-Page Images of a PDF
+    ---
+    tags:
+      - Preview
+    security:
+      - bearerAuth: []
+    parameters:
+      - name: file_id
+        in: path
+        type: string
+        required: true
+        description: The file ID of the uploaded PDF
+    responses:
+      200:
+        description: >
+          Pages rendered so far; incomplete documents keep rendering in the background.
+          Private files have no url_template; each ready page carries presigned
+          urls per level instead, valid for expires_in seconds
+        examples:
+          application/json:
+            file_id: "<file_id>"
+            status: "rendering"
+            complete: false
+            page_count: 120
+            levels: [512, 1024, 2048]
+            format: "WEBP"
+            pages:
+              "1":
+                sizes:
+                  "512": [362, 512]
+                  "1024": [724, 1024]
+                  "2048": [1448, 2048]
+            url_template: "http://localhost:9000/pdf-upload-service/pages/public/<file_id>/{level}/{page}.webp"
+      401:
+        description: Unauthorized
+      404:
+        description: File not found or page images disabled
+    """
+    try:
+        success, error_message, manifest = controller.get_page_manifest(file_id)
+
+        if success:
+            return jsonify(manifest), 200
+        else:
+            return error_handler.handle_preview_error(error_message)
+
+    except Exception as e:
+        logger.error(f"Exception in page manifest route for {file_id}: {e}")
+        return error_handler.handle_processing_error(
+            "Error retrieving page images", str(e)
+        )
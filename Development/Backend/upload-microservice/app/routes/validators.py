@@ -5,6 +5,7 @@ import json
 import os
 import logging
 from typing import Dict, List, Tuple, Optional
+from app.config.config import Config
 
 logger = logging.getLogger(__name__)
 
@@ -46,7 +47,7 @@ class FileValidator:
     """Handle file validation"""
     
     ALLOWED_EXTENSIONS = {'pdf'}
-    MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB in bytes
+    MAX_FILE_SIZE = Config.MAX_CONTENT_LENGTH  # 16MB in bytes by default
     
     @staticmethod
     def allowed_file(filename: str) -> bool:
@@ -88,7 +89,7 @@ class FormValidator:
     def validate_and_parse_tags(tags_str: str) -> Tuple[bool, Optional[str], Optional[List[str]]]:
         """Parse and validate tags JSON"""
         try:
-            tags = json.loads(tags_str)
+            tags = json.loads(tags_str) if isinstance(tags_str, str) else tags_str
             if not isinstance(tags, list):
                 return False, "Tags must be a JSON array", None
             
@@ -96,7 +97,7 @@ class FormValidator:
             cleaned_tags = [str(tag).strip() for tag in tags if str(tag).strip()]
             return True, None, cleaned_tags
             
-        except json.JSONDecodeError:
+        except (json.JSONDecodeError, TypeError):
             return False, "Invalid tags JSON format", None
 
 
@@ -119,15 +120,27 @@ class UploadValidator:
         if not file or file.filename == '':
             return False, "No file selected", None
         
+        return self.validate_upload_metadata(file.filename, form_data)
+    
+    def validate_upload_metadata(self, filename: str, form_data: Dict) -> Tuple[bool, Optional[str], Optional[Dict]]:
+        """
+        Validate the filename and form fields of an upload, without the file itself
+        
+        Returns:
+            (is_valid, error_message, validated_data)
+        """
+        if not filename:
+            return False, "No file selected", None
+        
         # Validate file type
-        if not self.file_validator.allowed_file(file.filename):
+        if not self.file_validator.allowed_file(filename):
             return False, "Only PDF files are allowed", None
         
         # Get and validate form data
-        category = form_data.get('category', '').strip()
-        subcategory = form_data.get('subcategory', '').strip()
+        category = str(form_data.get('category', '')).strip()
+        subcategory = str(form_data.get('subcategory', '')).strip()
         tags_str = form_data.get('tags', '[]')
-        visibility = form_data.get('visibility', 'public').strip().lower()
+        visibility = str(form_data.get('visibility', 'public')).strip().lower()
         
         # Validate required fields
         is_valid, error = self.form_validator.validate_required_fields(category, subcategory)
@@ -165,4 +178,19 @@ class UploadValidator:
         if not self.file_validator.validate_file_size(file_buffer):
             return False, f"File too large. Maximum size is {self.file_validator.MAX_FILE_SIZE // (1024*1024)}MB"
         
-        return True, None
\ No newline at end of file
+        return True, None
+    
+    def validate_declared_size(self, size) -> Tuple[bool, Optional[str], Optional[int]]:
+        """Validate the total size announced when a resumable upload is opened"""
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            return False, "File size must be an integer number of bytes", None
+        
+        if size <= 0:
+            return False, "Empty file uploaded", None
+        
+        if size > Config.RESUMABLE_MAX_SIZE:
+            return False, f"File too large. Maximum size is {Config.RESUMABLE_MAX_SIZE // (1024*1024)}MB", None
+        
+        return True, None, size
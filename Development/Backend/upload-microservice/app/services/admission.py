@@ -0,0 +1,207 @@
+"""
+Admission control for the upload pipeline
+
+Two kinds of limits protect the worker from bursts:
+  - an in-flight byte budget, charged with the size of every upload being
+    processed, since parsers and poppler hold roughly that much in memory
+  - per-stage concurrency limits for the expensive stages (ClamAV scans,
+    PDF parsing, preview rendering)
+
+Callers wait up to ``ADMISSION_MAX_WAIT`` seconds for capacity and are then
+rejected with ``AdmissionRejected``, which the routes turn into a 503 with
+``Retry-After``. Limits are per gunicorn worker process.
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+from app.config.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when capacity did not free up within the allowed wait"""
+
+    def __init__(self, message: str, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+class CapacityGate:
+    """
+    Counting gate with a bounded wait and queue statistics
+
+    Args:
+        name: Name used in logs and stats
+        capacity: Units available at once; 0 disables the gate
+    """
+
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = capacity
+        self.in_use = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, amount: int, timeout: float) -> Optional[int]:
+        """
+        Take ``amount`` units, waiting up to ``timeout`` seconds
+
+        Requests larger than the whole capacity are clamped to it, so a
+        single oversize upload can still run on an otherwise idle worker.
+
+        Returns:
+            The units taken (pass them to ``release``), or None on timeout
+        """
+        if self.capacity <= 0:
+            return 0
+        amount = min(max(amount, 1), self.capacity)
+
+        started = time.monotonic()
+        deadline = started + timeout
+        with self._cond:
+            self.waiting += 1
+            try:
+                while self.in_use + amount > self.capacity:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        return None
+                    self._cond.wait(remaining)
+                self.in_use += amount
+            finally:
+                self.waiting -= 1
+
+            waited = time.monotonic() - started
+            self.admitted += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        return amount
+
+    def release(self, amount: int):
+        if not amount:
+            return
+        with self._cond:
+            self.in_use -= amount
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'capacity': self.capacity,
+                'in_use': self.in_use,
+                'queue_depth': self.waiting,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'avg_wait_ms': round(self.total_wait / self.admitted * 1000, 1) if self.admitted else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 1)
+            }
+
+
+async def _enter_on_thread(cm):
+    """
+    Enter a blocking context manager on a worker thread
+
+    The thread cannot be interrupted, so if the awaiting task is cancelled
+    it may still get in afterwards; the capacity is then given back as soon
+    as it does instead of leaking.
+    """
+    entering = asyncio.ensure_future(asyncio.to_thread(cm.__enter__))
+    try:
+        await asyncio.shield(entering)
+    except asyncio.CancelledError:
+        def exit_if_entered(future):
+            if not future.cancelled() and future.exception() is None:
+                cm.__exit__(None, None, None)
+
+        entering.add_done_callback(exit_if_entered)
+        raise
+
+
+class AdmissionController:
+    """Byte budget plus per-stage concurrency limits"""
+
+    def __init__(self, byte_budget: int, stage_limits: Dict[str, int],
+                 max_wait: float = 10.0, retry_after: int = 5):
+        self.budget = CapacityGate('bytes', byte_budget)
+        self.stages = {name: CapacityGate(name, limit) for name, limit in stage_limits.items()}
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+
+    @contextmanager
+    def admit(self, size_bytes: int):
+        """Hold ``size_bytes`` of the in-flight budget for the duration of the block"""
+        taken = self.budget.acquire(size_bytes, self.max_wait)
+        if taken is None:
+            logger.warning(f"Upload of {size_bytes} bytes rejected: in-flight byte budget exhausted")
+            raise AdmissionRejected(
+                "Server busy: too many uploads in progress, retry later", self.retry_after
+            )
+        try:
+            yield
+        finally:
+            self.budget.release(taken)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Hold one slot of stage ``name``; stages without a limit pass through"""
+        gate = self.stages.get(name)
+        taken = gate.acquire(1, self.max_wait) if gate else 0
+        if taken is None:
+            logger.warning(f"Stage '{name}' rejected: concurrency limit {gate.capacity} reached")
+            raise AdmissionRejected(
+                f"Server busy: too many concurrent {name} operations, retry later", self.retry_after
+            )
+        try:
+            yield
+        finally:
+            if gate:
+                gate.release(taken)
+
+    @asynccontextmanager
+    async def admit_async(self, size_bytes: int):
+        """``admit`` for coroutines; the wait happens on a worker thread"""
+        cm = self.admit(size_bytes)
+        await _enter_on_thread(cm)
+        try:
+            yield
+        finally:
+            cm.__exit__(None, None, None)
+
+    @asynccontextmanager
+    async def stage_async(self, name: str):
+        """``stage`` for coroutines; the wait happens on a worker thread"""
+        cm = self.stage(name)
+        await _enter_on_thread(cm)
+        try:
+            yield
+        finally:
+            cm.__exit__(None, None, None)
+
+    def stats(self) -> Dict:
+        """Capacity, queue depth and wait times of every gate"""
+        return {
+            'bytes': self.budget.stats(),
+            'stages': {name: gate.stats() for name, gate in self.stages.items()}
+        }
+
+
+# Global instance
+admission_controller = AdmissionController(
+    byte_budget=Config.ADMISSION_BYTE_BUDGET,
+    stage_limits={
+        'scan': Config.ADMISSION_SCAN_LIMIT,
+        'metadata': Config.ADMISSION_METADATA_LIMIT,
+        'render': Config.ADMISSION_RENDER_LIMIT
+    },
+    max_wait=Config.ADMISSION_MAX_WAIT,
+    retry_after=Config.ADMISSION_RETRY_AFTER
+)
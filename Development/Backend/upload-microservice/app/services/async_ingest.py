@@ -0,0 +1,303 @@
+"""
+asyncio streaming ingest for the ASGI entry point
+
+Same single pass as ``StreamingIngest`` - every chunk goes to a ClamAV
+INSTREAM session, a MinIO multipart upload into quarantine, a running
+SHA-256 and the spool file - but the network legs are coroutines, so a
+slow client only costs an idle task instead of a blocked worker.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import uuid
+
+from minio.commonconfig import CopySource, REPLACE
+from minio.error import S3Error
+
+from app.client.minio_client import get_async_minio_client
+from app.config.config import Config
+from app.services.storage import storage_service
+from app.services.stream_ingest import PipeAbortedError, streaming_ingest
+from app.services.virus_scanner import scanner
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncChunkPipe:
+    """Bounded bridge between the request task and the MinIO upload task"""
+
+    _EOF = object()
+
+    def __init__(self, max_chunks=16):
+        self._queue = asyncio.Queue(maxsize=max_chunks)
+        self._pending = b''
+        self._eof = False
+        self._aborted = False
+
+    async def write(self, chunk):
+        if self._aborted:
+            raise PipeAbortedError("Reader side of the pipe was aborted")
+        await self._queue.put(chunk)
+
+    async def close(self):
+        await self._queue.put(self._EOF)
+
+    def abort(self):
+        """Unblock both sides; further reads and writes raise PipeAbortedError"""
+        self._aborted = True
+        # Free a writer blocked on a full queue, then wake a reader on an empty one
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(self._EOF)
+
+    async def read(self, size=-1):
+        chunks = [self._pending] if self._pending else []
+        available = len(self._pending)
+        self._pending = b''
+
+        while not self._eof and (size < 0 or available < size):
+            item = await self._queue.get()
+            if self._aborted:
+                raise PipeAbortedError("Writer side of the pipe was aborted")
+            if item is self._EOF:
+                self._eof = True
+                break
+            chunks.append(item)
+            available += len(item)
+
+        data = b''.join(chunks)
+        if 0 <= size < len(data):
+            data, self._pending = data[:size], data[size:]
+        return data
+
+
+class AsyncStorageService:
+    """The MinIO calls of the upload hot path, as coroutines"""
+
+    def __init__(self):
+        self._client = None
+        self.bucket_name = Config.MINIO_BUCKET
+
+    @property
+    def client(self):
+        # Created on first use so its HTTP session belongs to the serving loop
+        if self._client is None:
+            self._client = get_async_minio_client()
+        return self._client
+
+    async def upload_stream(self, stream, file_id, filename=None):
+        """Async ``StorageService.upload_stream``"""
+        object_path = storage_service._get_quarantine_path(file_id)
+        await self.client.put_object(
+            self.bucket_name,
+            object_path,
+            stream,
+            length=-1,
+            part_size=Config.MINIO_PART_SIZE,
+            content_type='application/pdf',
+            metadata={
+                'original_filename': filename or 'unknown.pdf',
+                'file_id': file_id
+            }
+        )
+        return object_path
+
+    async def promote_file(self, file_id, visibility='public', filename=None, size_bytes=None,
+                           content_hash=None):
+        """Async ``StorageService.promote_file``"""
+        try:
+            staged_path = storage_service._get_quarantine_path(file_id)
+            if content_hash:
+                object_path = storage_service._get_blob_path(content_hash, visibility)
+            else:
+                object_path = storage_service._get_object_path(file_id, visibility)
+
+            async def copy(path):
+                await self.client.copy_object(
+                    self.bucket_name,
+                    path,
+                    CopySource(self.bucket_name, staged_path),
+                    metadata={
+                        'Content-Type': 'application/pdf',
+                        'original_filename': filename or 'unknown.pdf',
+                        'visibility': visibility,
+                        'file_id': file_id
+                    },
+                    metadata_directive=REPLACE
+                )
+
+            await copy(object_path)
+            if content_hash and not await asyncio.to_thread(
+                storage_service.claim_blob, content_hash, file_id, visibility, object_path, filename
+            ):
+                # The shared blob is being deleted right now: keep a copy of its own
+                object_path = storage_service._get_object_path(file_id, visibility)
+                await copy(object_path)
+            await self.discard_staged(file_id)
+
+            logger.info(f"File promoted from quarantine: {file_id} ({visibility})")
+            return {
+                'success': True,
+                'file_id': file_id,
+                'file_url': storage_service._build_file_url(object_path, visibility),
+                'object_path': object_path,
+                'size_bytes': size_bytes
+            }
+
+        except S3Error as e:
+            logger.error(f"MinIO error promoting file {file_id}: {e}")
+            return {'success': False, 'error': f'Storage error: {str(e)}'}
+        except Exception as e:
+            logger.error(f"Unexpected error promoting file {file_id}: {e}")
+            return {'success': False, 'error': f'Upload error: {str(e)}'}
+
+    async def discard_staged(self, file_id):
+        try:
+            await self.client.remove_object(self.bucket_name, storage_service._get_quarantine_path(file_id))
+            return True
+        except Exception as e:
+            logger.warning(f"Could not remove quarantined file {file_id}: {e}")
+            return False
+
+
+class AsyncStreamingIngest:
+    """Single-pass upload ingest on the event loop"""
+
+    def __init__(self, chunk_size=None, max_size=None):
+        self.chunk_size = chunk_size or Config.STREAM_CHUNK_SIZE
+        self.max_size = max_size or Config.MAX_CONTENT_LENGTH
+
+    async def ingest(self, stream, filename=None):
+        """
+        Consume ``stream`` (an object with ``async read(size)``)
+
+        Returns:
+            Same dict as ``StreamingIngest.ingest``; the caller must ``cleanup()``
+        """
+        file_id = str(uuid.uuid4())
+        os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+        spool = tempfile.NamedTemporaryFile(
+            dir=Config.UPLOAD_FOLDER, prefix=f"{file_id}-", suffix='.pdf', delete=False
+        )
+        result = {
+            'success': False,
+            'error': None,
+            'file_id': file_id,
+            'sha256': None,
+            'size_bytes': 0,
+            'scan_result': None,
+            'spool_path': spool.name
+        }
+
+        pipe = AsyncChunkPipe(Config.STREAM_QUEUE_DEPTH)
+        uploader = asyncio.create_task(self._upload_worker(pipe, file_id, filename))
+        clam_stream, scan_result = await self._open_scan()
+        sha256 = hashlib.sha256()
+        size = 0
+
+        async def abandon():
+            pipe.abort()
+            await asyncio.gather(uploader, return_exceptions=True)
+            await async_storage_service.discard_staged(file_id)
+            if clam_stream is not None:
+                clam_stream.close()
+            self.cleanup(result)
+
+        try:
+            with spool:
+                while True:
+                    chunk = await stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+
+                    size += len(chunk)
+                    if size > self.max_size:
+                        result['error'] = (
+                            f"File too large. Maximum size is {self.max_size // (1024 * 1024)}MB"
+                        )
+                        break
+
+                    sha256.update(chunk)
+                    # Disk writes can stall; keep them off the event loop
+                    await asyncio.to_thread(spool.write, chunk)
+
+                    if clam_stream is not None:
+                        try:
+                            await clam_stream.write(chunk)
+                        except OSError as e:
+                            logger.error(f"❌ Error streaming to ClamAV: {e}")
+                            clam_stream.close()
+                            clam_stream = None
+                            scan_result = {'clean': False, 'result': f'Scan error: {str(e)}'}
+
+                    await pipe.write(chunk)
+
+            if result['error'] is None and size == 0:
+                result['error'] = "Empty file uploaded"
+
+            if result['error'] is None:
+                await pipe.close()
+        except PipeAbortedError:
+            pass
+        except BaseException:
+            await abandon()
+            raise
+
+        if result['error'] is None:
+            try:
+                await uploader
+            except Exception as e:
+                logger.error(f"MinIO error streaming file {file_id}: {e}")
+                result['error'] = f"Failed to upload file: {str(e)}"
+
+        if result['error'] is not None:
+            await abandon()
+            return result
+
+        if clam_stream is not None:
+            try:
+                scan_result = await clam_stream.finish()
+            except Exception as e:
+                logger.error(f"❌ Error reading ClamAV verdict: {e}")
+                scan_result = {'clean': False, 'result': f'Scan error: {str(e)}'}
+            else:
+                scan_result['signature'] = clam_stream.signature
+                scan_result = await asyncio.to_thread(scanner.escalate, result['spool_path'], scan_result)
+
+        result.update({
+            'success': True,
+            'sha256': sha256.hexdigest(),
+            'size_bytes': size,
+            'scan_result': scan_result
+        })
+        logger.info(f"Streamed {size} bytes for {file_id} (sha256 {result['sha256'][:12]}…)")
+        return result
+
+    def cleanup(self, result):
+        streaming_ingest.cleanup(result)
+
+    @staticmethod
+    async def _upload_worker(pipe, file_id, filename):
+        try:
+            await async_storage_service.upload_stream(pipe, file_id, filename)
+        except PipeAbortedError:
+            raise
+        except Exception:
+            pipe.abort()
+            raise
+
+    @staticmethod
+    async def _open_scan():
+        try:
+            clam_stream = await scanner.open_async_stream()
+        except Exception as e:
+            logger.error(f"❌ Error opening ClamAV stream: {e}")
+            return None, {'clean': False, 'result': f'Scan error: {str(e)}'}
+        return clam_stream, None
+
+
+# Global instances
+async_storage_service = AsyncStorageService()
+async_streaming_ingest = AsyncStreamingIngest()
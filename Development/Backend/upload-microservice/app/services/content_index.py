@@ -0,0 +1,188 @@
+"""
+Content-addressed index of uploaded PDFs
+
+Maps the SHA-256 of a PDF to the results of processing it once (scan
+verdict, extracted metadata, preview) so that byte-identical re-uploads can
+skip the whole pipeline. The verdict is only reused while ClamAV still runs
+the signature version it was obtained under. Layout in the bucket:
+
+    content/<sha256>/index.json               processing results
+    content/<sha256>/refs/<visibility>/<id>   one marker per logical file
+    content/<sha256>/removing/<visibility>    tombstone while a blob is deleted
+    files/<file_id>.json                      logical file -> shared blob
+
+The blob itself lives at ``<visibility>/blobs/<sha256>.pdf`` (see
+``StorageService``). Reference markers are separate objects rather than a
+counter so that concurrent uploads and deletes never overwrite each other.
+
+Deleting a blob and referencing it race across workers. Both sides write
+their marker first and then read the other's: ``release`` writes the
+tombstone and re-checks the references, ``claim_reference`` writes the
+reference and checks for a tombstone. At least one side sees the other, so
+a new reference never ends up pointing at a removed blob.
+"""
+import datetime
+import logging
+from io import BytesIO
+from typing import Dict, Optional
+
+from minio.error import S3Error
+
+from app.client.minio_client import get_minio_client
+from app.config.config import Config
+from app.services.document_store import JsonDocumentStore
+
+logger = logging.getLogger(__name__)
+
+# Tombstones older than this are left over from a crashed delete and ignored
+TOMBSTONE_TTL = datetime.timedelta(minutes=5)
+
+
+class ContentIndex:
+    """SHA-256 -> processed blob index with per-file reference markers"""
+
+    def __init__(self):
+        self.client = get_minio_client()
+        self.bucket_name = Config.MINIO_BUCKET
+        self.entries = JsonDocumentStore(Config.CONTENT_FOLDER, self.client)
+        self.aliases = JsonDocumentStore(Config.FILES_FOLDER, self.client)
+
+    @staticmethod
+    def _index_key(sha256: str) -> str:
+        return f"{sha256}/index"
+
+    def _refs_prefix(self, sha256: str, visibility: Optional[str] = None) -> str:
+        prefix = f"{Config.CONTENT_FOLDER}/{sha256}/refs/"
+        return f"{prefix}{visibility}/" if visibility else prefix
+
+    def _tombstone_path(self, sha256: str, visibility: str) -> str:
+        return f"{Config.CONTENT_FOLDER}/{sha256}/removing/{visibility}"
+
+    def lookup(self, sha256: str) -> Optional[Dict]:
+        """Return the index entry for ``sha256`` or None if never processed"""
+        return self.entries.load(self._index_key(sha256))
+
+    def register(self, sha256: str, scan_result: Dict, metadata: Dict,
+                 preview_file_id: Optional[str], size_bytes: int):
+        """
+        Record the processing results of a newly stored blob
+
+        Only a clean verdict that names the signature version it was
+        obtained under is recorded; anything else (scan errors, unknown
+        version) leaves the next upload of these bytes to the full pipeline.
+        """
+        if not self._is_definitive(scan_result):
+            logger.info(f"Content {sha256[:12]}… not indexed: no definitive scan verdict")
+            return
+        self.entries.save(self._index_key(sha256), {
+            'sha256': sha256,
+            'scan_result': scan_result,
+            'metadata': metadata,
+            'preview_file_id': preview_file_id,
+            'size_bytes': size_bytes
+        })
+        logger.info(f"Content index entry created for {sha256[:12]}…")
+
+    def add_reference(self, sha256: str, file_id: str, visibility: str,
+                      object_path: str, filename: Optional[str] = None):
+        """Point a logical file id at the shared blob"""
+        self.aliases.save(file_id, {
+            'file_id': file_id,
+            'sha256': sha256,
+            'visibility': visibility,
+            'object_path': object_path,
+            'original_filename': filename or 'unknown.pdf'
+        })
+        self.client.put_object(
+            bucket_name=self.bucket_name,
+            object_name=f"{self._refs_prefix(sha256, visibility)}{file_id}",
+            data=BytesIO(b''),
+            length=0
+        )
+
+    def claim_reference(self, sha256: str, file_id: str, visibility: str,
+                        object_path: str, filename: Optional[str] = None) -> bool:
+        """
+        ``add_reference`` unless the blob is being deleted
+
+        Returns:
+            bool: False when a tombstone was found; the reference is then
+            withdrawn again and the caller must not use the blob
+        """
+        self.add_reference(sha256, file_id, visibility, object_path, filename)
+        if self._is_removing(sha256, visibility):
+            self.withdraw_reference(sha256, file_id, visibility)
+            return False
+        return True
+
+    def withdraw_reference(self, sha256: str, file_id: str, visibility: str):
+        """Undo ``add_reference`` without touching the blob"""
+        self.client.remove_object(self.bucket_name, f"{self._refs_prefix(sha256, visibility)}{file_id}")
+        self.aliases.delete(file_id)
+
+    def get_alias(self, file_id: str) -> Optional[Dict]:
+        """Return the blob reference for a deduplicated file id"""
+        return self.aliases.load(file_id)
+
+    def release(self, alias: Dict) -> Dict:
+        """
+        Drop one logical file's reference to its blob
+
+        When the blob is orphaned it is tombstoned; the caller removes it
+        and then calls ``finish_removal``.
+
+        Returns:
+            dict: ``blob_orphaned`` when no file of that visibility uses the
+            blob any more, ``content_orphaned`` when no file uses it at all
+        """
+        sha256 = alias['sha256']
+        visibility = alias['visibility']
+        self.withdraw_reference(sha256, alias['file_id'], visibility)
+
+        blob_orphaned = not self._has_objects(self._refs_prefix(sha256, visibility))
+        if blob_orphaned:
+            self.client.put_object(
+                bucket_name=self.bucket_name,
+                object_name=self._tombstone_path(sha256, visibility),
+                data=BytesIO(b''),
+                length=0
+            )
+            if self._has_objects(self._refs_prefix(sha256, visibility)):
+                # A concurrent upload claimed the blob before seeing the tombstone
+                self.finish_removal(sha256, visibility)
+                blob_orphaned = False
+        content_orphaned = blob_orphaned and not self._has_objects(self._refs_prefix(sha256))
+        if content_orphaned:
+            # Next upload of these bytes goes through the full pipeline again
+            self.entries.delete(self._index_key(sha256))
+        return {'blob_orphaned': blob_orphaned, 'content_orphaned': content_orphaned}
+
+    def finish_removal(self, sha256: str, visibility: str):
+        """Drop the tombstone written by ``release`` once the blob is gone"""
+        self.client.remove_object(self.bucket_name, self._tombstone_path(sha256, visibility))
+
+    def _is_removing(self, sha256: str, visibility: str) -> bool:
+        try:
+            stat = self.client.stat_object(self.bucket_name, self._tombstone_path(sha256, visibility))
+        except S3Error:
+            return False
+        modified = stat.last_modified
+        if modified is None:
+            return True
+        return datetime.datetime.now(datetime.timezone.utc) - modified < TOMBSTONE_TTL
+
+    @staticmethod
+    def _is_definitive(scan_result: Optional[Dict]) -> bool:
+        return bool(
+            scan_result and scan_result.get('clean') and
+            scan_result.get('result') == 'File is clean' and scan_result.get('signature')
+        )
+
+    def _has_objects(self, prefix: str) -> bool:
+        for _ in self.client.list_objects(self.bucket_name, prefix=prefix, recursive=True):
+            return True
+        return False
+
+
+# Global instance
+content_index = ContentIndex()
@@ -0,0 +1,156 @@
+"""
+Background connection monitor for ClamAV and MinIO
+
+Nothing connects at import time. ``dependency_monitor.start()`` (called
+from ``create_app``) starts one daemon thread per dependency that keeps
+checking it: every ``DEPENDENCY_CHECK_INTERVAL`` seconds while it is up,
+every retry delay while it is failing, and once per breaker reset timeout
+while its circuit is open. ``/ready`` reports 503 until every dependency
+has answered, and recovers on its own when they come back.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from app.client.minio_client import get_probe_minio_client, ensure_bucket_exists, setup_public_access
+from app.config.config import Config
+from app.services.virus_scanner import scanner
+from app.utils.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+
+class Dependency:
+    """
+    One external service and its health state
+
+    Args:
+        name: Name used in logs and readiness output
+        check: Raises (or returns False) when the service is unusable
+        breaker: Circuit breaker fed by the checks
+        retry_delay: Seconds between checks while failing with the circuit closed
+        on_connect: Called once every time the service (re)becomes reachable
+        details: Extra status reported with the dependency (e.g. per-node state)
+    """
+
+    def __init__(self, name: str, check: Callable, breaker: CircuitBreaker,
+                 retry_delay: float, on_connect: Optional[Callable] = None,
+                 details: Optional[Callable[[], Dict]] = None):
+        self.name = name
+        self.check = check
+        self.breaker = breaker
+        self.retry_delay = retry_delay
+        self.on_connect = on_connect
+        self.details = details
+        self.ready = False
+        self.last_error = None
+        self.last_checked = None
+
+    def probe(self) -> float:
+        """
+        Run one check and update the state
+
+        Returns:
+            Seconds until the next check is due
+        """
+        if not self.breaker.allow():
+            return self.breaker.retry_in()
+
+        try:
+            if self.check() is False:
+                raise ConnectionError(f"{self.name} check failed")
+            if not self.ready and self.on_connect:
+                self.on_connect()
+        except Exception as e:
+            self.breaker.record_failure()
+            if self.ready:
+                logger.warning(f"❌ Lost connection to {self.name}: {e}")
+            elif self.last_error is None:
+                logger.warning(f"⏳ {self.name} not reachable yet: {e}")
+            self.ready = False
+            self.last_error = str(e)
+            self.last_checked = time.time()
+            return self.breaker.retry_in() if self.breaker.is_open else self.retry_delay
+
+        if not self.ready:
+            logger.info(f"✅ Connected to {self.name}")
+        self.breaker.record_success()
+        self.ready = True
+        self.last_error = None
+        self.last_checked = time.time()
+        return Config.DEPENDENCY_CHECK_INTERVAL
+
+    def status(self) -> Dict:
+        status = {
+            'ready': self.ready,
+            'circuit': self.breaker.stats(),
+            'last_error': self.last_error,
+            'last_checked': self.last_checked
+        }
+        if self.details:
+            status['nodes'] = self.details()
+        return status
+
+
+class DependencyMonitor:
+    """Keeps every registered dependency checked from background threads"""
+
+    def __init__(self):
+        self.dependencies: Dict[str, Dependency] = {}
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def register(self, dependency: Dependency):
+        self.dependencies[dependency.name] = dependency
+
+    def start(self):
+        """Start the monitor threads; safe to call more than once"""
+        with self._lock:
+            if self._threads:
+                return
+            for dependency in self.dependencies.values():
+                thread = threading.Thread(
+                    target=self._watch, args=(dependency,), name=f"dependency-{dependency.name}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def is_ready(self) -> bool:
+        return all(d.ready for d in self.dependencies.values())
+
+    def is_available(self, name: str) -> bool:
+        """False only while the dependency's circuit is open"""
+        return not self.dependencies[name].breaker.is_open
+
+    def retry_after(self, name: str) -> int:
+        return max(int(self.dependencies[name].breaker.retry_in()), 1)
+
+    def status(self) -> Dict:
+        return {name: d.status() for name, d in self.dependencies.items()}
+
+    @staticmethod
+    def _watch(dependency: Dependency):
+        while True:
+            time.sleep(dependency.probe())
+
+
+def _check_minio():
+    ensure_bucket_exists(get_probe_minio_client())
+
+
+def _setup_minio():
+    setup_public_access(get_probe_minio_client())
+
+
+# Global instance
+dependency_monitor = DependencyMonitor()
+dependency_monitor.register(Dependency(
+    'ClamAV', scanner.ping, scanner.breaker, retry_delay=Config.CLAMAV_RETRY_DELAY,
+    details=scanner.nodes_status
+))
+dependency_monitor.register(Dependency(
+    'MinIO', _check_minio,
+    CircuitBreaker('MinIO', Config.DEPENDENCY_FAILURE_THRESHOLD, Config.DEPENDENCY_RESET_TIMEOUT),
+    retry_delay=Config.DEPENDENCY_RETRY_DELAY, on_connect=_setup_minio
+))
@@ -0,0 +1,132 @@
+"""
+Direct-to-MinIO uploads
+
+The service hands out a presigned PUT URL for ``quarantine/<file_id>.pdf``
+and the client uploads the PDF straight to MinIO. Nothing is trusted until
+the finalize call streams the object back through the regular scan,
+metadata and preview stages.
+
+A presigned PUT cannot bound the request size, so the size is checked with
+a HEAD request at finalize time before anything is read. Nor can it be
+revoked: the client may PUT again while the upload is being finalized.
+Finalizing therefore takes an exclusive claim (only one finalize runs), and
+the promotion out of quarantine is pinned to the ETag of the scanned bytes.
+"""
+import datetime
+import logging
+import uuid
+from typing import Dict, Optional
+
+from app.config.config import Config
+from app.services.document_store import JsonDocumentStore
+from app.services.storage import storage_service
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_PENDING = 'pending'
+UPLOAD_FINALIZING = 'finalizing'
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _failure(error: str, error_code: str) -> Dict:
+    return {'success': False, 'error': error, 'error_code': error_code}
+
+
+class DirectUploadService:
+    """Issue presigned quarantine uploads and hand them over for processing"""
+
+    def __init__(self, ttl: int = None, max_size: int = None,
+                 store: Optional[JsonDocumentStore] = None):
+        self.ttl = ttl or Config.DIRECT_UPLOAD_TTL
+        self.max_size = max_size or Config.DIRECT_UPLOAD_MAX_SIZE
+        self.store = store or JsonDocumentStore(Config.DIRECT_UPLOADS_FOLDER)
+
+    def create(self, user_id: str, filename: str, validated_data: Dict) -> Dict:
+        """
+        Reserve a file id and sign a PUT URL for it
+
+        Returns:
+            dict: ``success``, ``error``, ``error_code`` and ``upload``
+            (``file_id``, ``upload_url``, ``method``, ``headers``, ``expires_at``)
+        """
+        file_id = str(uuid.uuid4())
+        try:
+            upload_url = storage_service.get_staged_upload_url(file_id, self.ttl)
+        except Exception as e:
+            logger.error(f"Error signing direct upload URL for {filename}: {e}")
+            return _failure(f"Failed to upload file: {str(e)}", 'STORAGE_ERROR')
+
+        created_at = _now()
+        record = {
+            'file_id': file_id,
+            'user_id': user_id,
+            'filename': filename,
+            'validated_data': validated_data,
+            'status': UPLOAD_PENDING,
+            'created_at': created_at.isoformat(),
+            'expires_at': (created_at + datetime.timedelta(seconds=self.ttl)).isoformat()
+        }
+        self.store.save(file_id, record)
+        logger.info(f"Direct upload {file_id} issued for {filename}")
+        return {
+            'success': True, 'error': None, 'error_code': None,
+            'upload': {
+                'file_id': file_id,
+                'upload_url': upload_url,
+                'method': 'PUT',
+                'headers': {'Content-Type': 'application/pdf'},
+                'max_size': self.max_size,
+                'expires_at': record['expires_at']
+            }
+        }
+
+    def claim(self, file_id: str, user_id: str) -> Dict:
+        """
+        Check that the client's PUT arrived and lock the upload for finalizing
+
+        Returns:
+            dict: ``success``, ``error``, ``error_code`` and the ``record``
+            (filename, validated form data and ``size_bytes``)
+        """
+        record = self.store.load(file_id)
+        if record is None or record.get('user_id') != user_id:
+            return _failure("Direct upload not found", 'NOT_FOUND')
+        if record['status'] != UPLOAD_PENDING or not self.store.claim(file_id):
+            return _failure("Direct upload is already being finalized", 'CONFLICT')
+
+        size = storage_service.stat_staged(file_id)
+        if size is None:
+            if datetime.datetime.fromisoformat(record['expires_at']) < _now():
+                self.discard(file_id)
+                return _failure("Direct upload not found", 'NOT_FOUND')
+            self.store.release_claim(file_id)
+            return _failure("File has not been uploaded yet", 'CONFLICT')
+
+        if size == 0 or size > self.max_size:
+            storage_service.discard_staged(file_id)
+            self.discard(file_id)
+            if size == 0:
+                return _failure("Empty file uploaded", 'FILE_ERROR')
+            return _failure(
+                f"File too large. Maximum size is {self.max_size // (1024 * 1024)}MB", 'FILE_ERROR'
+            )
+
+        record.update(status=UPLOAD_FINALIZING, size_bytes=size)
+        self.store.save(file_id, record)
+        return {'success': True, 'error': None, 'error_code': None, 'record': record}
+
+    def discard(self, file_id: str):
+        """Forget a finalized or abandoned upload and drop whatever is still quarantined"""
+        storage_service.discard_staged(file_id)
+        try:
+            self.store.delete(file_id)
+            self.store.release_claim(file_id)
+        except Exception as e:
+            logger.warning(f"Could not remove direct upload {file_id}: {e}")
+
+
+# Global instance
+direct_upload_service = DirectUploadService()
@@ -0,0 +1,80 @@
+"""
+Small JSON documents stored in MinIO
+
+Used for state that every gunicorn worker must see (upload jobs, content
+index entries, resumable upload sessions) without adding a database.
+"""
+import json
+import logging
+from io import BytesIO
+from typing import Dict, Optional
+
+from minio.error import S3Error
+
+from app.client.minio_client import get_minio_client
+from app.client.minio_lowlevel import MinioLowLevel
+from app.config.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class JsonDocumentStore:
+    """Read and write JSON documents under a bucket prefix"""
+
+    def __init__(self, prefix: str, client=None):
+        self.prefix = prefix
+        self.client = client or get_minio_client()
+        self.bucket_name = Config.MINIO_BUCKET
+
+    def path(self, key: str) -> str:
+        return f"{self.prefix}/{key}.json"
+
+    def claim_path(self, key: str) -> str:
+        return f"{self.prefix}/{key}.claim"
+
+    def save(self, key: str, document: Dict):
+        body = json.dumps(document).encode('utf-8')
+        self.client.put_object(
+            bucket_name=self.bucket_name,
+            object_name=self.path(key),
+            data=BytesIO(body),
+            length=len(body),
+            content_type='application/json'
+        )
+
+    def load(self, key: str) -> Optional[Dict]:
+        """Return the document, or None if it does not exist"""
+        response = None
+        try:
+            response = self.client.get_object(self.bucket_name, self.path(key))
+            return json.loads(response.read())
+        except S3Error as e:
+            if e.code != 'NoSuchKey':
+                logger.warning(f"Error reading {self.path(key)}: {e}")
+            return None
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+
+    def delete(self, key: str):
+        self.client.remove_object(self.bucket_name, self.path(key))
+
+    def claim(self, key: str) -> bool:
+        """
+        Take the exclusive claim on a document (conditional PUT of a marker)
+
+        Returns:
+            bool: True for exactly one caller across all workers until
+            ``release_claim``
+        """
+        return MinioLowLevel(self.client).put_if_absent(self.bucket_name, self.claim_path(key))
+
+    def release_claim(self, key: str):
+        self.client.remove_object(self.bucket_name, self.claim_path(key))
+
+    def keys(self):
+        """Keys of every document under the prefix"""
+        for item in self.client.list_objects(self.bucket_name, prefix=f"{self.prefix}/"):
+            if item.object_name.endswith('.json'):
+                yield item.object_name[len(self.prefix) + 1:-len('.json')]
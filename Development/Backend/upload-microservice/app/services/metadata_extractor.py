@@ -1,10 +1,17 @@
 """
 PDF metadata extraction service
+
+Metadata is read with the backends listed in ``PDF_BACKENDS``
+(``app.services.pdf_backends``), trying each in turn until one can read
+the file - by default the trailer/xref reader first and a full PyPDF2
+parse for damaged or encrypted files.
 """
-import PyPDF2
-from io import BytesIO
+import mmap
+from contextlib import contextmanager
 import logging
 
+from app.services.pdf_backends import configured_backends
+
 logger = logging.getLogger(__name__)
 
 class MetadataExtractor:
@@ -16,86 +23,133 @@ class MetadataExtractor:
         Extract metadata from PDF file buffer
         
         Args:
-            file_buffer (bytes): PDF file content as bytes
+            file_buffer (bytes | file object): PDF content as bytes, or a
+                seekable binary file (e.g. the streaming ingest spool file)
             
         Returns:
             dict: Extracted metadata including title, pages, size_kb
         """
-        try:
-            # Create BytesIO object from buffer
-            pdf_stream = BytesIO(file_buffer)
-            
-            # Read PDF
-            pdf_reader = PyPDF2.PdfReader(pdf_stream)
-            
-            # Extract basic info
-            num_pages = len(pdf_reader.pages)
-            size_kb = len(file_buffer) // 1024
-            
-            # Extract title from metadata
-            title = "Untitled Document"
-            if pdf_reader.metadata:
-                # Try different title fields
-                title_candidates = [
-                    pdf_reader.metadata.get('/Title'),
-                    pdf_reader.metadata.get('/Subject'),
-                    pdf_reader.metadata.get('/Author')
-                ]
-                
-                for candidate in title_candidates:
-                    if candidate and candidate.strip():
-                        title = candidate.strip()
-                        break
-            
-            # If no title found, try to extract from first page text
+        size_kb = MetadataExtractor._buffer_size(file_buffer) // 1024
+        error = None
+        with MetadataExtractor._mapped(file_buffer) as data:
+            for backend in configured_backends():
+                try:
+                    metadata = MetadataExtractor._read_with(backend, data, size_kb)
+                except Exception as e:
+                    logger.info(f"PDF backend '{backend.name}' could not read the file: {e}")
+                    error = e
+                    continue
+                logger.info(f"Extracted metadata ({backend.name}): {metadata['pages']} pages, "
+                            f"{size_kb}KB, title: '{metadata['title']}'")
+                return metadata
+
+        logger.error(f"Error extracting PDF metadata: {error}")
+        # Return basic metadata with file size
+        return MetadataExtractor.fallback_metadata(size_kb)
+
+    @staticmethod
+    def _read_with(backend, data, size_kb):
+        """
+        Metadata through one backend
+
+        Without a /Title, /Subject or /Author, the first text line of page 1
+        (up to 100 characters) is used as the title.
+
+        Raises:
+            Exception: when the backend cannot read the file
+        """
+        with backend.open(data) as document:
+            num_pages = document.page_count()
+            info = document.info()
+
+            title = MetadataExtractor._title_from_info(info)
             if title == "Untitled Document" and num_pages > 0:
                 try:
-                    first_page = pdf_reader.pages[0]
-                    text = first_page.extract_text()
-                    
-                    # Get first non-empty line as potential title
-                    lines = [line.strip() for line in text.split('\n') if line.strip()]
-                    if lines:
-                        # Use first line if it's not too long
-                        potential_title = lines[0]
-                        if len(potential_title) <= 100:
-                            title = potential_title
+                    title = document.first_line() or title
                 except Exception as e:
                     logger.warning(f"Could not extract text for title: {e}")
-            
-            metadata = {
+
+            return {
                 'title': title,
                 'pages': num_pages,
                 'size_kb': size_kb,
-                'author': pdf_reader.metadata.get('/Author', '') if pdf_reader.metadata else '',
-                'subject': pdf_reader.metadata.get('/Subject', '') if pdf_reader.metadata else '',
-                'creator': pdf_reader.metadata.get('/Creator', '') if pdf_reader.metadata else ''
-            }
-            
-            logger.info(f"Extracted metadata: {num_pages} pages, {size_kb}KB, title: '{title}'")
-            return metadata
-            
-        except Exception as e:
-            logger.error(f"Error extracting PDF metadata: {e}")
-            # Return basic metadata with file size
-            return {
-                'title': 'Untitled Document',
-                'pages': 0,
-                'size_kb': len(file_buffer) // 1024,
-                'author': '',
-                'subject': '',
-                'creator': ''
+                'author': info.get('Author', ''),
+                'subject': info.get('Subject', ''),
+                'creator': info.get('Creator', '')
             }
 
+    @staticmethod
+    def _title_from_info(info):
+        """First non-blank of /Title, /Subject and /Author"""
+        for key in ('Title', 'Subject', 'Author'):
+            candidate = info.get(key)
+            if candidate and candidate.strip():
+                return candidate.strip()
+        return "Untitled Document"
+
+    @staticmethod
+    @contextmanager
+    def _mapped(file_buffer):
+        """The whole PDF as bytes, memory-mapping files instead of reading them"""
+        if isinstance(file_buffer, (bytes, bytearray)):
+            yield file_buffer
+            return
+        try:
+            data = mmap.mmap(file_buffer.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError):
+            file_buffer.seek(0)
+            yield file_buffer.read()
+            return
+        with data:
+            yield data
+
+    @staticmethod
+    def fallback_metadata(size_kb):
+        """Basic metadata used when the PDF cannot be parsed"""
+        return {
+            'title': 'Untitled Document',
+            'pages': 0,
+            'size_kb': size_kb,
+            'author': '',
+            'subject': '',
+            'creator': ''
+        }
+
+    @staticmethod
+    def _buffer_size(file_buffer):
+        """Size in bytes of a bytes buffer or seekable file object"""
+        if isinstance(file_buffer, (bytes, bytearray)):
+            return len(file_buffer)
+        position = file_buffer.tell()
+        size = file_buffer.seek(0, 2)
+        file_buffer.seek(position)
+        return size
+
 def extract_pdf_info(file_buffer):
     """
     Convenience function to extract PDF metadata
     
     Args:
-        file_buffer (bytes): PDF file content as bytes
+        file_buffer (bytes | file object): PDF file content
         
     Returns:
         dict: Extracted metadata
     """
     extractor = MetadataExtractor()
-    return extractor.extract_pdf_metadata(file_buffer)
\ No newline at end of file
+    return extractor.extract_pdf_metadata(file_buffer)
+
+def extract_pdf_info_from_file(file_path):
+    """
+    Extract PDF metadata from a file on local disk
+
+    Takes a path rather than a file object so it can be shipped to a
+    worker process cheaply.
+
+    Args:
+        file_path (str): Path to the PDF file
+
+    Returns:
+        dict: Extracted metadata
+    """
+    with open(file_path, 'rb') as pdf_file:
+        return extract_pdf_info(pdf_file)
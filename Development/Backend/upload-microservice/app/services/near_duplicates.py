@@ -0,0 +1,262 @@
+"""
+Perceptual-hash index of uploaded documents
+
+Byte hashes (the content index) miss re-exports and re-scans of the same
+document. Here every preview render gets a 64-bit perceptual hash (pHash
+or dHash, computed with NumPy) which is looked up among all earlier
+uploads within a Hamming radius, and added to the index once the upload
+has succeeded. Blank and near-uniform previews are skipped: their hash is
+DCT noise, and every blank document would match every other one.
+
+The index is a multi-index hash table: the 64 bits are split into four
+16-bit chunks, each kept as a sorted array. Two hashes within distance r
+agree within r // 4 bits on at least one chunk, so a query only probes the
+chunk values near its own and checks the few candidates exactly - a few
+milliseconds for millions of entries. Recent entries live in an unsorted
+tail that is scanned with vectorised XOR/popcount and merged in batches.
+
+Entries are appended to a binary file (``NEAR_DUPLICATE_INDEX_PATH``) under
+an exclusive lock. Every process reads the records other workers appended
+before each query, so all gunicorn workers on a host share one index.
+Deleting a file appends a tombstone.
+"""
+import logging
+import os
+import threading
+from io import BytesIO
+from functools import lru_cache
+from itertools import combinations
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from app.config.config import Config
+from app.services.page_selector import is_informative, page_scores
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CHUNKS = 4
+CHUNK_BITS = 64 // CHUNKS
+# Tail entries scanned by brute force before they are merged into the tables
+MERGE_THRESHOLD = 65536
+
+FLAG_PRIVATE = 0
+FLAG_PUBLIC = 1
+FLAG_DELETED = 2
+
+# hash, file id, owner id, flag
+RECORD = np.dtype([('hash', '<u8'), ('file_id', 'S36'), ('owner', 'S36'), ('flag', 'u1')])
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    """Orthonormal DCT-II basis"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def dhash(image: Image.Image) -> int:
+    """64-bit difference hash: is each of 8x8 pixels brighter than its left neighbour"""
+    pixels = np.asarray(image.convert('L').resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(image: Image.Image) -> int:
+    """64-bit DCT hash: the 8x8 lowest frequencies of a 32x32 image against their median"""
+    pixels = np.asarray(image.convert('L').resize((32, 32), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT32 @ pixels @ _DCT32.T)[:8, :8]
+    return _bits_to_int(low > np.median(low))
+
+
+HASHES = {'phash': phash, 'dhash': dhash}
+
+
+@lru_cache(maxsize=8)
+def _flip_masks(bits: int, max_flips: int) -> np.ndarray:
+    """All ``bits``-wide masks with at most ``max_flips`` bits set"""
+    masks = [0]
+    for flips in range(1, max_flips + 1):
+        for positions in combinations(range(bits), flips):
+            masks.append(sum(1 << p for p in positions))
+    return np.array(masks, dtype=np.uint64)
+
+
+class NearDuplicateIndex:
+    """Multi-index hash table of perceptual hashes, persisted as an append-only file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.deleted = set()
+        self._base = np.zeros(0, dtype=RECORD)
+        self._tail: List[np.ndarray] = []
+        self._tail_size = 0
+        self._tables = []
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._base) + self._tail_size
+
+    def add(self, value: int, file_id: str, owner: str, public: bool):
+        self._append(value, file_id, owner, FLAG_PUBLIC if public else FLAG_PRIVATE)
+
+    def remove(self, file_id: str):
+        """Record a tombstone so ``file_id`` is never matched again"""
+        self._append(0, file_id, '', FLAG_DELETED)
+
+    def search(self, value: int, radius: int, owner: Optional[str] = None, limit: int = 5) -> List[Dict]:
+        """
+        Indexed files within ``radius`` bits of ``value``, closest first
+
+        Private files only match their own owner's uploads.
+
+        Returns:
+            list: ``{'pdf_id', 'distance'}`` dicts
+        """
+        with self._lock:
+            self._refresh()
+            query = np.uint64(value)
+
+            rows = []
+            masks = _flip_masks(CHUNK_BITS, radius // CHUNKS)
+            for chunk, (values, order) in enumerate(self._tables):
+                probes = (((query >> np.uint64(chunk * CHUNK_BITS)) & np.uint64(0xFFFF)) ^ masks).astype(np.uint16)
+                starts = np.searchsorted(values, probes, 'left')
+                ends = np.searchsorted(values, probes, 'right')
+                rows.extend(order[start:end] for start, end in zip(starts, ends) if end > start)
+            base = self._base[np.unique(np.concatenate(rows))] if rows else self._base[:0]
+            candidates = np.concatenate([base] + self._tail)
+
+            distances = np.bitwise_count(candidates['hash'] ^ query)
+            close = distances <= radius
+            candidates, distances = candidates[close], distances[close]
+
+            matches = []
+            for index in np.argsort(distances, kind='stable'):
+                record = candidates[index]
+                file_id = record['file_id'].decode()
+                if file_id in self.deleted:
+                    continue
+                if record['flag'] != FLAG_PUBLIC and record['owner'].decode() != owner:
+                    continue
+                matches.append({'pdf_id': file_id, 'distance': int(distances[index])})
+                if len(matches) >= limit:
+                    break
+            return matches
+
+    def _append(self, value: int, file_id: str, owner: str, flag: int):
+        record = np.array([(value, file_id.encode(), owner.encode(), flag)], dtype=RECORD).tobytes()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            os.write(fd, record)
+        finally:
+            os.close(fd)
+
+    def _refresh(self):
+        """Load records appended since the last refresh (by any process)"""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        # Ignore a partially written last record
+        size -= (size - self._offset) % RECORD.itemsize
+        if size <= self._offset:
+            return
+
+        with open(self.path, 'rb') as index_file:
+            index_file.seek(self._offset)
+            new = np.frombuffer(index_file.read(size - self._offset), dtype=RECORD)
+        self._offset = size
+        tombstones = new['flag'] == FLAG_DELETED
+        self.deleted.update(file_id.decode() for file_id in new['file_id'][tombstones])
+        self._tail.append(new[~tombstones])
+        self._tail_size += len(self._tail[-1])
+
+        if self._tail_size >= MERGE_THRESHOLD or not self._tables:
+            self._rebuild()
+
+    def _rebuild(self):
+        """Merge the tail into the base and re-sort the chunk tables"""
+        self._base = np.concatenate([self._base] + self._tail)
+        self._tail, self._tail_size = [], 0
+        hashes = self._base['hash']
+        self._tables = []
+        for chunk in range(CHUNKS):
+            values = ((hashes >> np.uint64(chunk * CHUNK_BITS)) & np.uint64(0xFFFF)).astype(np.uint16)
+            order = np.argsort(values, kind='stable')
+            self._tables.append((values[order], order))
+        logger.info(f"Near-duplicate index rebuilt with {len(self._base)} entries")
+
+
+# Global instance
+near_duplicate_index = NearDuplicateIndex(Config.NEAR_DUPLICATE_INDEX_PATH)
+
+
+def match_preview(visibility: str, owner: str, images: Dict, upload_result: Dict) -> Optional[Dict]:
+    """
+    Pipeline stage: hash the rendered preview and find near-duplicates
+
+    The hash is taken from the smallest preview variant (the hashes work on
+    32x32 or 9x8 pixels anyway). The upload itself is not indexed here; see
+    ``index_preview``.
+
+    Returns:
+        dict: ``hash`` (hex), ``algorithm`` and ``matches``, or None when off
+        or when the preview is blank (app.services.page_selector)
+    """
+    if not Config.NEAR_DUPLICATES or not upload_result['success']:
+        return None
+
+    width, fmt = min(images, key=lambda key: (key[0] is None, key[0] or 0))
+    with Image.open(BytesIO(images[(width, fmt)])) as image:
+        if not is_informative(page_scores(image)):
+            logger.info(f"Preview of {upload_result['file_id']} is blank, not matching near-duplicates")
+            return None
+        value = HASHES[Config.NEAR_DUPLICATE_HASH](image)
+
+    matches = near_duplicate_index.search(
+        value, Config.NEAR_DUPLICATE_RADIUS, owner, Config.NEAR_DUPLICATE_MAX_MATCHES
+    )
+    if matches:
+        logger.info(f"Upload {upload_result['file_id']} is a near-duplicate of {matches[0]['pdf_id']} "
+                    f"(distance {matches[0]['distance']})")
+    return {
+        'hash': f"{value:016x}",
+        'algorithm': Config.NEAR_DUPLICATE_HASH,
+        'matches': matches
+    }
+
+
+def index_preview(similar: Optional[Dict], file_id: str, owner: str, visibility: str):
+    """
+    Add an upload's preview hash (the result of ``match_preview``) to the index
+
+    Called once the upload has succeeded, so a request that fails after
+    the lookup never leaves an entry behind.
+    """
+    if similar:
+        near_duplicate_index.add(int(similar['hash'], 16), file_id, owner, visibility == 'public')
+
+
+def forget_file(file_id: str):
+    """Convenience wrapper: drop a deleted file from near-duplicate results"""
+    if Config.NEAR_DUPLICATES:
+        near_duplicate_index.remove(file_id)
@@ -0,0 +1,323 @@
+"""
+Per-page image pyramid for the viewer
+
+Every page of a stored PDF is rendered once at the largest zoom level (by
+``app.services.render_engines``) and downscaled to the smaller ones. The
+images are stored as
+``pages/<visibility>/<file_id>/<level>/<page>.<ext>``, where a level is the
+long edge in pixels. ``pages/<visibility>/<file_id>/manifest.json`` lists
+the pages that are ready, so the viewer can show page 1 while the rest is
+still being rendered.
+
+Only ``pages/public/`` is readable anonymously (see
+``setup_public_access``): manifests of public files carry a URL template,
+those of private files a presigned URL per page image.
+
+The first ``PAGE_IMAGES_FIRST_PAGES`` pages are rendered right after the
+upload. The remaining pages are backfilled in batches on a single
+low-priority thread, and the manifest is saved after every batch. An
+interrupted job (restart, crash) resumes from the manifest the next time
+the manifest is requested.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from minio.deleteobjects import DeleteObject
+from minio.error import S3Error
+from PIL import Image
+
+from app.client.minio_client import get_minio_client
+from app.config.config import Config
+from app.services.metadata_extractor import extract_pdf_info_from_file
+from app.services.preview_generator import encode_image, image_content_type
+from app.services.render_engines import render_page
+from app.services.storage import storage_service
+from app.services.worker_pool import IsolatedProcessPool
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def render_page_levels(pdf_path: str, page: int, levels: List[int], fmt: str) -> Dict[int, tuple]:
+    """
+    Render one page at the largest level and downscale it to the others
+
+    Returns:
+        dict: level -> (encoded image, width, height)
+    """
+    levels = sorted(levels, reverse=True)
+    image = render_page(pdf_path, page, scale_to=levels[0])
+
+    rendered = {}
+    for level in levels:
+        if level < max(image.size):
+            scale = level / max(image.size)
+            size = (max(round(image.width * scale), 1), max(round(image.height * scale), 1))
+            image = image.resize(size, Image.LANCZOS, reducing_gap=2.0)
+        rendered[level] = (encode_image(image, fmt), image.width, image.height)
+    return rendered
+
+
+class PageImageService:
+    """Background rendering of page images into MinIO"""
+
+    def __init__(self, workers: int = 2, first_pages: int = 5, batch_pages: int = 10):
+        self.client = get_minio_client()
+        self.bucket_name = Config.MINIO_BUCKET
+        self.first_pages = max(first_pages, 1)
+        self.batch_pages = max(batch_pages, 1)
+        self.pool = IsolatedProcessPool(
+            'pages',
+            size=1,
+            timeout=Config.STAGE_PROCESS_TIMEOUT,
+            memory_limit=Config.STAGE_PROCESS_MEMORY_LIMIT_MB * 1024 * 1024,
+            max_tasks=Config.STAGE_PROCESS_MAX_TASKS,
+            start_method=Config.STAGE_PROCESS_START_METHOD
+        )
+        self._jobs = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='pages-first')
+        self._backfill = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pages-backfill')
+        self._active = set()
+        # Files deleted while their job was running; the job stops and cleans up
+        self._deleted = set()
+        self._lock = threading.Lock()
+
+    def prefix(self, file_id: str, visibility: str) -> str:
+        return f"{Config.PAGE_IMAGE_FOLDER}/{visibility}/{file_id}/"
+
+    def object_name(self, file_id: str, visibility: str, level, page, fmt: str) -> str:
+        extension = 'jpg' if fmt == 'JPEG' else fmt.lower()
+        return f"{self.prefix(file_id, visibility)}{level}/{page}.{extension}"
+
+    def url_template(self, file_id: str, fmt: str) -> str:
+        """Public URL of a public file's page image with ``{level}`` and ``{page}`` placeholders"""
+        protocol = 'https' if Config.MINIO_SECURE else 'http'
+        object_name = self.object_name(file_id, 'public', '{level}', '{page}', fmt)
+        return f"{protocol}://{Config.PUBLIC_MINIO_HOST}/{self.bucket_name}/{object_name}"
+
+    def manifest_name(self, file_id: str, visibility: str) -> str:
+        return f"{self.prefix(file_id, visibility)}{MANIFEST_NAME}"
+
+    def schedule(self, file_id: str, object_path: str, visibility: str) -> Optional[Future]:
+        """
+        Queue page rendering for a stored PDF; returns immediately
+
+        Returns:
+            Future of the first-pages job, or None when PAGE_IMAGES is off or
+            a job for ``file_id`` is already running
+        """
+        if not Config.PAGE_IMAGES:
+            return None
+        with self._lock:
+            if file_id in self._active:
+                return None
+            self._active.add(file_id)
+        return self._jobs.submit(self._render_logged, file_id, object_path, visibility)
+
+    def get_manifest(self, file_id: str) -> Optional[Dict]:
+        """
+        Manifest of the page images of ``file_id``
+
+        Missing or incomplete pyramids are (re)scheduled, which resumes
+        interrupted jobs and renders duplicates on first view.
+
+        Returns:
+            dict: The manifest with ``status`` 'complete', 'rendering' or
+            'pending' (nothing ready yet) and either ``url_template`` (public
+            files) or per-page ``urls`` (private files), or None when the
+            PDF does not exist or there is no manifest with PAGE_IMAGES off
+        """
+        located = self._find_pdf(file_id)
+        if located is None:
+            return None
+        object_path, visibility = located
+
+        manifest = self.load_manifest(file_id, visibility)
+        if manifest is not None and manifest['complete']:
+            return self._published(file_id, visibility, manifest, 'complete')
+        if not Config.PAGE_IMAGES:
+            return None if manifest is None else self._published(file_id, visibility, manifest, 'incomplete')
+
+        self.schedule(file_id, object_path, visibility)
+        if manifest is None:
+            manifest = {'file_id': file_id, 'complete': False, 'pages': {}}
+            return self._published(file_id, visibility, manifest, 'pending')
+        return self._published(file_id, visibility, manifest, 'rendering')
+
+    def delete(self, file_id: str):
+        """Remove every page image and manifest of a deleted file, stopping its job"""
+        with self._lock:
+            if file_id in self._active:
+                self._deleted.add(file_id)
+        for visibility in ['public', 'private']:
+            self._remove_prefix(self.prefix(file_id, visibility))
+
+    def load_manifest(self, file_id: str, visibility: str) -> Optional[Dict]:
+        try:
+            response = self.client.get_object(self.bucket_name, self.manifest_name(file_id, visibility))
+            try:
+                return json.loads(response.read())
+            finally:
+                response.close()
+                response.release_conn()
+        except S3Error:
+            return None
+
+    def shutdown(self):
+        self._jobs.shutdown(wait=False, cancel_futures=True)
+        self._backfill.shutdown(wait=False, cancel_futures=True)
+        self.pool.shutdown()
+
+    def _published(self, file_id: str, visibility: str, manifest: Dict, status: str) -> Dict:
+        """The manifest as served, with the URLs its page images are reachable on"""
+        fmt = manifest.get('format', Config.PAGE_IMAGE_FORMAT)
+        if visibility == 'public':
+            return dict(manifest, status=status, url_template=self.url_template(file_id, fmt))
+
+        pages = {}
+        for page, entry in manifest['pages'].items():
+            if 'sizes' in entry:
+                entry = dict(entry, urls={
+                    level: storage_service.get_presigned_object_url(
+                        self.object_name(file_id, visibility, level, page, fmt), Config.PAGE_IMAGE_URL_EXPIRY
+                    )
+                    for level in entry['sizes']
+                })
+            pages[page] = entry
+        return dict(manifest, pages=pages, status=status, url_template=None,
+                    expires_in=Config.PAGE_IMAGE_URL_EXPIRY)
+
+    def _render_logged(self, file_id: str, object_path: str, visibility: str):
+        workdir = None
+        try:
+            os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+            workdir = tempfile.mkdtemp(dir=Config.UPLOAD_FOLDER, prefix='pages-')
+            pdf_path = os.path.join(workdir, 'source.pdf')
+            self.client.fget_object(self.bucket_name, object_path, pdf_path)
+
+            manifest = self.load_manifest(file_id, visibility)
+            if manifest is None or manifest['levels'] != sorted(Config.PAGE_IMAGE_LEVELS):
+                page_count = self.pool.call(extract_pdf_info_from_file, pdf_path)['pages']
+                if page_count <= 0:
+                    raise ValueError("page count could not be determined")
+                manifest = {
+                    'file_id': file_id,
+                    'page_count': page_count,
+                    'levels': sorted(Config.PAGE_IMAGE_LEVELS),
+                    'format': Config.PAGE_IMAGE_FORMAT,
+                    'complete': False,
+                    'pages': {}
+                }
+
+            pending = [
+                page for page in range(1, manifest['page_count'] + 1)
+                if str(page) not in manifest['pages']
+            ]
+            self._render_pages(file_id, visibility, pdf_path, manifest, pending[:self.first_pages])
+            logger.info(f"Rendered first {min(len(pending), self.first_pages)} page images of {file_id}")
+
+            # Hand the rest (and the workdir) to the backfill thread
+            self._backfill.submit(self._backfill_logged, file_id, visibility, pdf_path, manifest,
+                                  pending[self.first_pages:], workdir)
+            workdir = None
+        except Exception as e:
+            logger.error(f"Page image rendering failed for {file_id}: {e}")
+            self._finish(file_id, visibility)
+        finally:
+            if workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    def _backfill_logged(self, file_id: str, visibility: str, pdf_path: str, manifest: Dict,
+                         pages: List[int], workdir: str):
+        try:
+            for start in range(0, len(pages), self.batch_pages):
+                self._render_pages(file_id, visibility, pdf_path, manifest, pages[start:start + self.batch_pages])
+            logger.info(f"Rendered all {manifest['page_count']} page images of {file_id}")
+        except Exception as e:
+            logger.error(f"Page image backfill failed for {file_id}: {e}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+            self._finish(file_id, visibility)
+
+    def _finish(self, file_id: str, visibility: str):
+        with self._lock:
+            self._active.discard(file_id)
+            deleted = file_id in self._deleted
+            self._deleted.discard(file_id)
+        if deleted:
+            # Images uploaded after delete() listed the prefix
+            self._remove_prefix(self.prefix(file_id, visibility))
+
+    def _remove_prefix(self, prefix: str):
+        objects = self.client.list_objects(self.bucket_name, prefix=prefix, recursive=True)
+        errors = self.client.remove_objects(self.bucket_name, (DeleteObject(obj.object_name) for obj in objects))
+        for error in errors:
+            logger.warning(f"Could not remove page image {error.name}: {error.message}")
+
+    def _render_pages(self, file_id: str, visibility: str, pdf_path: str, manifest: Dict, pages: List[int]):
+        """Render and upload ``pages``, then save the manifest"""
+        for page in pages:
+            if file_id in self._deleted:
+                raise RuntimeError("file was deleted")
+            try:
+                rendered = render_page_levels(pdf_path, page, manifest['levels'], manifest['format'])
+            except Exception as e:
+                # Keep going: one broken page should not hide the others
+                logger.warning(f"Could not render page {page} of {file_id}: {e}")
+                manifest['pages'][str(page)] = {'error': str(e)}
+                continue
+
+            sizes = {}
+            for level, (image_bytes, width, height) in rendered.items():
+                self.client.put_object(
+                    bucket_name=self.bucket_name,
+                    object_name=self.object_name(file_id, visibility, level, page, manifest['format']),
+                    data=BytesIO(image_bytes),
+                    length=len(image_bytes),
+                    content_type=image_content_type(manifest['format'])
+                )
+                sizes[str(level)] = [width, height]
+            manifest['pages'][str(page)] = {'sizes': sizes}
+
+        manifest['complete'] = len(manifest['pages']) >= manifest['page_count']
+        data = json.dumps(manifest).encode('utf-8')
+        self.client.put_object(
+            bucket_name=self.bucket_name,
+            object_name=self.manifest_name(file_id, visibility),
+            data=BytesIO(data),
+            length=len(data),
+            content_type='application/json'
+        )
+
+    def _find_pdf(self, file_id: str) -> Optional[tuple]:
+        """(object path, visibility) of the stored PDF, or None"""
+        for visibility in ['public', 'private']:
+            object_path = storage_service.resolve_object_path(file_id, visibility)
+            if object_path is None:
+                continue
+            try:
+                self.client.stat_object(self.bucket_name, object_path)
+                return object_path, visibility
+            except S3Error:
+                continue
+        return None
+
+
+# Global instance
+page_image_service = PageImageService(
+    workers=Config.PAGE_IMAGE_WORKERS,
+    first_pages=Config.PAGE_IMAGES_FIRST_PAGES,
+    batch_pages=Config.PAGE_IMAGES_BATCH_PAGES
+)
+
+
+def schedule_page_images(file_id, object_path, visibility):
+    """Convenience wrapper"""
+    return page_image_service.schedule(file_id, object_path, visibility)
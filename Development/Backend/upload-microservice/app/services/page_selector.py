@@ -0,0 +1,110 @@
+"""
+Preview page selection
+
+Many uploads start with a blank page, a scanner separator sheet or a page
+that is nearly all white, and a preview of it is useless. The first
+``PREVIEW_PAGE_SCAN`` pages are rendered tiny (``PREVIEW_SCAN_SIZE`` pixels
+on the long edge, a few milliseconds per page) and scored with NumPy:
+
+- ink coverage: share of pixels that differ clearly from the paper, i.e.
+  the page's most common grey level (dark slides have light ink)
+- histogram entropy: grey-level spread (photos and illustrations are high)
+- edge density: share of strong horizontal/vertical transitions
+
+A page is informative when it has both ink and edges, and either a wide
+grey-level spread or thin strokes (text, line art) rather than solid
+blocks such as patch codes and separator bars. The first informative page
+is previewed, page 1 when none is.
+"""
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+from PIL import Image
+
+from app.config.config import Config
+from app.services.render_engines import Source, render_pages
+
+logger = logging.getLogger(__name__)
+
+# Distance from the paper's grey level from which a pixel counts as ink
+# (scanner noise and paper texture stay below)
+INK_CONTRAST = 32
+# Difference between neighbouring pixels that counts as an edge
+EDGE_STEP = 40
+MIN_INK = 0.003
+MIN_EDGES = 0.003
+# Grey-level entropy (bits) from which a page counts as a picture
+PICTURE_ENTROPY = 3.0
+# Edges per inked pixel; text and line art are well above, solid blocks below
+MIN_EDGE_RATIO = 0.25
+
+
+def page_scores(image: Image.Image) -> Dict[str, float]:
+    """
+    Ink coverage, histogram entropy and edge density of a page image
+
+    The paper is the most common grey level, so ink is measured the same
+    way on white pages and on dark or inverted slides.
+
+    Returns:
+        dict: ``ink`` and ``edges`` as fractions of the page, ``entropy`` in bits
+    """
+    pixels = np.asarray(image.convert('L'), dtype=np.int16)
+    histogram = np.bincount(pixels.ravel(), minlength=256) / pixels.size
+    paper = int(np.argmax(histogram))
+    histogram = histogram[histogram > 0]
+    horizontal = np.abs(np.diff(pixels, axis=1)) > EDGE_STEP
+    vertical = np.abs(np.diff(pixels, axis=0)) > EDGE_STEP
+    return {
+        'ink': float(np.mean(np.abs(pixels - paper) >= INK_CONTRAST)),
+        'entropy': float(0.0 - (histogram * np.log2(histogram)).sum()),
+        'edges': float((horizontal.mean() + vertical.mean()) / 2) if pixels.size else 0.0
+    }
+
+
+def is_informative(scores: Dict[str, float]) -> bool:
+    """Whether a page scored by ``page_scores`` is worth previewing"""
+    if scores['ink'] < MIN_INK or scores['edges'] < MIN_EDGES:
+        return False
+    if scores['entropy'] >= PICTURE_ENTROPY:
+        return True
+    return scores['edges'] / scores['ink'] >= MIN_EDGE_RATIO
+
+
+def choose_preview_page(source: Source, page_count: Optional[int] = None,
+                        first_page: Optional[Image.Image] = None) -> int:
+    """
+    First informative page among the first PREVIEW_PAGE_SCAN pages
+
+    Args:
+        source: PDF content or path
+        page_count: Number of pages if known
+        first_page: An image of page 1 that is already at hand (e.g. the
+            embedded thumbnail); page 1 is not rendered again then
+
+    Returns:
+        int: Page number (1-based); 1 when no page qualifies or on errors
+    """
+    last = Config.PREVIEW_PAGE_SCAN if page_count is None else min(page_count, Config.PREVIEW_PAGE_SCAN)
+    if last <= 1:
+        return 1
+
+    start = 1
+    if first_page is not None:
+        if is_informative(page_scores(first_page)):
+            return 1
+        start = 2
+
+    try:
+        images = render_pages(source, list(range(start, last + 1)), Config.PREVIEW_SCAN_SIZE)
+    except Exception as e:
+        logger.warning(f"Could not scan pages for the preview: {e}")
+        return 1
+
+    for number, image in enumerate(images, start):
+        if is_informative(page_scores(image)):
+            if number != 1:
+                logger.info(f"Pages before {number} look blank, previewing page {number}")
+            return number
+    return 1
@@ -0,0 +1,216 @@
+"""
+Pluggable PDF parsing backends
+
+Metadata extraction needs three things from a PDF: the page count, the
+/Info dictionary and the first text line of page 1. Each backend provides
+them through the same small interface:
+
+- ``structure``: the on-demand trailer/xref reader in
+  ``app.services.pdf_structure`` (pure Python, no full parse)
+- ``pdfium``: Google's PDFium through ``pypdfium2`` (native code)
+- ``pypdf2``: a full ``PyPDF2.PdfReader`` parse
+
+``PDF_BACKENDS`` lists the backends to try in order; a backend that cannot
+read a file (or is not installed) hands it to the next one.
+``benchmarks/pdf_backends.py`` compares them on a local corpus.
+"""
+import io
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+import PyPDF2
+
+from app.config.config import Config
+from app.services.pdf_structure import PageTextExtractor, PdfStructureReader
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+logger = logging.getLogger(__name__)
+
+class PdfBackendUnavailable(RuntimeError):
+    """Raised when a configured backend is unknown or not installed"""
+
+
+class PdfDocument(ABC):
+    """An open document; ``info()`` keys have no leading slash"""
+
+    @abstractmethod
+    def page_count(self) -> int:
+        ...
+
+    @abstractmethod
+    def info(self) -> Dict[str, str]:
+        ...
+
+    @abstractmethod
+    def first_line(self, max_length: int = 100) -> Optional[str]:
+        """First non-empty text line of page 1 if at most ``max_length`` long, or None"""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PdfBackend(ABC):
+    """Opens PDFs held in memory (bytes or mmap)"""
+
+    name = None
+
+    @abstractmethod
+    def open(self, data) -> PdfDocument:
+        ...
+
+
+class _MappedStream(io.RawIOBase):
+    """Seekable read-only stream over bytes or an mmap, without copying it"""
+
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = max(min(len(buffer), len(self.data) - self.position), 0)
+        buffer[:count] = self.data[self.position:self.position + count]
+        self.position += count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: len(self.data)}[whence]
+        self.position = max(base + offset, 0)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
+def _first_line(text: Optional[str], max_length: int) -> Optional[str]:
+    lines = [line.strip() for line in (text or '').splitlines() if line.strip()]
+    if lines and len(lines[0]) <= max_length:
+        return lines[0]
+    return None
+
+
+class _StructureDocument(PdfDocument):
+    def __init__(self, data):
+        self.reader = PdfStructureReader(data)
+
+    def page_count(self):
+        return self.reader.page_count()
+
+    def info(self):
+        return self.reader.info()
+
+    def first_line(self, max_length=100):
+        page, resources = self.reader.first_page()
+        if page is None:
+            return None
+        extractor = PageTextExtractor(
+            self.reader,
+            max_bytes=Config.METADATA_TITLE_BYTE_BUDGET,
+            time_budget=Config.METADATA_TITLE_TIME_BUDGET
+        )
+        return extractor.first_line(page, resources, max_length)
+
+
+class StructureBackend(PdfBackend):
+    """Trailer, xref and the few objects needed; first-page text within a budget"""
+
+    name = 'structure'
+
+    def open(self, data):
+        return _StructureDocument(data)
+
+
+class _PdfiumDocument(PdfDocument):
+    def __init__(self, data):
+        self.document = pypdfium2.PdfDocument(data if isinstance(data, bytes) else _MappedStream(data))
+
+    def page_count(self):
+        return len(self.document)
+
+    def info(self):
+        return {key: value for key, value in self.document.get_metadata_dict().items() if value}
+
+    def first_line(self, max_length=100):
+        if len(self.document) == 0:
+            return None
+        page = self.document[0]
+        try:
+            text_page = page.get_textpage()
+            try:
+                return _first_line(text_page.get_text_range(), max_length)
+            finally:
+                text_page.close()
+        finally:
+            page.close()
+
+    def close(self):
+        self.document.close()
+
+
+class PdfiumBackend(PdfBackend):
+    """PDFium via pypdfium2 (not thread-safe; metadata runs in worker processes)"""
+
+    name = 'pdfium'
+
+    def open(self, data):
+        if pypdfium2 is None:
+            raise PdfBackendUnavailable("pdfium backend requires the pypdfium2 package")
+        return _PdfiumDocument(data)
+
+
+class _PyPDF2Document(PdfDocument):
+    def __init__(self, data):
+        self.reader = PyPDF2.PdfReader(io.BufferedReader(_MappedStream(data)))
+
+    def page_count(self):
+        return len(self.reader.pages)
+
+    def info(self):
+        metadata = self.reader.metadata or {}
+        # Indexing resolves indirect objects, items() does not
+        return {key[1:]: str(metadata[key]) for key in metadata if isinstance(metadata[key], str)}
+
+    def first_line(self, max_length=100):
+        if len(self.reader.pages) == 0:
+            return None
+        return _first_line(self.reader.pages[0].extract_text(), max_length)
+
+
+class PyPDF2Backend(PdfBackend):
+    """Full PyPDF2 parse (handles damaged and encrypted files best)"""
+
+    name = 'pypdf2'
+
+    def open(self, data):
+        return _PyPDF2Document(data)
+
+
+BACKENDS = {backend.name: backend for backend in (StructureBackend(), PdfiumBackend(), PyPDF2Backend())}
+
+
+def get_backend(name: str) -> PdfBackend:
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise PdfBackendUnavailable(f"Unknown PDF backend '{name}' (choose from {', '.join(BACKENDS)})")
+
+
+def configured_backends() -> List[PdfBackend]:
+    """Backends from ``PDF_BACKENDS``, in order"""
+    return [get_backend(name) for name in Config.PDF_BACKENDS]
@@ -0,0 +1,148 @@
+"""
+Structural PDF pre-scan
+
+A fast in-process look at the PDF object graph that decides how much
+scanning an upload deserves. It flags the features that carry active or
+hidden content - /JavaScript, /JS, /Launch, /EmbeddedFile(s), /OpenAction,
+/AA - and stream filters that plain documents do not use. Names are
+matched after #xx unescaping, and compressed object streams (/ObjStm),
+where most producers pack their dictionaries, are inflated and inspected
+too. Anything that cannot be inspected (encrypted documents, object
+streams that cannot be decoded or are too large) is flagged as well.
+
+Flagged files go to the deep ClamAV tier; see ``VirusScanner``.
+"""
+import logging
+import mmap
+import re
+import zlib
+from typing import Dict, Set
+
+from app.config.config import Config
+
+logger = logging.getLogger(__name__)
+
+RISKY_NAMES = {'JavaScript', 'JS', 'Launch', 'EmbeddedFile', 'EmbeddedFiles', 'OpenAction', 'AA'}
+
+# Filters ordinary producers emit for page content, fonts and images
+USUAL_FILTERS = {
+    'FlateDecode', 'Fl', 'DCTDecode', 'DCT', 'JPXDecode',
+    'CCITTFaxDecode', 'CCF', 'LZWDecode', 'LZW'
+}
+MAX_USUAL_FILTER_CHAIN = 2
+
+_DELIMITER = rb'\x00\t\n\x0c\r /<>\[\]()%{}'
+_RISKY_NAME = re.compile(
+    rb'/(' + b'|'.join(sorted((n.encode() for n in RISKY_NAMES), key=len, reverse=True)) +
+    rb')(?=[' + _DELIMITER + rb']|$)'
+)
+_ESCAPED_NAME = re.compile(rb'/[^' + _DELIMITER + rb']*#[0-9A-Fa-f]{2}[^' + _DELIMITER + rb']*')
+_FILTER = re.compile(rb'/Filter\s*(\[[^\]]*\]|/[^' + _DELIMITER + rb']+)')
+_FILTER_NAME = re.compile(rb'/([^' + _DELIMITER + rb']+)')
+_HEX_ESCAPE = re.compile(rb'#([0-9A-Fa-f]{2})')
+_OBJSTM = re.compile(rb'/Type\s*/ObjStm')
+_STREAM_START = re.compile(rb'stream\r?\n')
+_ENCRYPT = re.compile(rb'/Encrypt\s*[0-9<]')
+
+
+class PdfPreScanner:
+    """
+    Structural risk check for PDF bytes
+
+    Args:
+        max_inflate: Total bytes of object streams to decompress before
+            giving up and flagging the file
+    """
+
+    def __init__(self, max_inflate: int = 64 * 1024 * 1024):
+        self.max_inflate = max_inflate
+
+    def scan(self, data) -> Dict:
+        """
+        Inspect a PDF held in memory (bytes or mmap)
+
+        Returns:
+            dict: ``risky`` (bool) and sorted ``findings``
+        """
+        findings = set()
+        if not data[:1024].lstrip().startswith(b'%PDF-'):
+            findings.add('no-pdf-header')
+
+        self._inspect(data, findings)
+        if _ENCRYPT.search(data):
+            # Object streams and strings are encrypted and cannot be inspected
+            findings.add('encrypted')
+        self._inspect_object_streams(data, findings)
+
+        return {'risky': bool(findings), 'findings': sorted(findings)}
+
+    def scan_file(self, file_path: str) -> Dict:
+        """Inspect a PDF on local disk without reading it into memory"""
+        with open(file_path, 'rb') as pdf_file:
+            try:
+                data = mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped
+                return self.scan(b'')
+            with data:
+                return self.scan(data)
+
+    def _inspect(self, data, findings: Set[str]):
+        for match in _RISKY_NAME.finditer(data):
+            findings.add('/' + match.group(1).decode())
+
+        for match in _ESCAPED_NAME.finditer(data):
+            name = _HEX_ESCAPE.sub(lambda m: bytes([int(m.group(1), 16)]), match.group(0))
+            if name[1:].decode('latin-1') in RISKY_NAMES:
+                findings.add(name.decode('latin-1'))
+
+        for match in _FILTER.finditer(data):
+            filters = [m.group(1).decode('latin-1') for m in _FILTER_NAME.finditer(match.group(1))]
+            if len(filters) > MAX_USUAL_FILTER_CHAIN:
+                findings.add(f'filter-chain:{len(filters)}')
+            for name in filters:
+                if name not in USUAL_FILTERS:
+                    findings.add(f'filter:/{name}')
+
+    def _inspect_object_streams(self, data, findings: Set[str]):
+        budget = self.max_inflate
+        for match in _OBJSTM.finditer(data):
+            header_start = max(data.rfind(b'obj', 0, match.start()), 0)
+            stream = _STREAM_START.search(data, match.end())
+            if stream is None:
+                continue
+
+            header = data[header_start:stream.start()]
+            filters = [
+                m.group(1) for f in _FILTER.finditer(header) for m in _FILTER_NAME.finditer(f.group(1))
+            ]
+            if filters not in ([], [b'FlateDecode'], [b'Fl']):
+                findings.add('objstm:undecodable')
+                continue
+
+            end = data.find(b'endstream', stream.end())
+            raw = data[stream.end():end if end != -1 else len(data)]
+            try:
+                if filters:
+                    inflater = zlib.decompressobj()
+                    content = inflater.decompress(raw, budget + 1)
+                else:
+                    content = raw
+            except zlib.error:
+                findings.add('objstm:undecodable')
+                continue
+
+            if len(content) > budget:
+                findings.add('objstm:too-large')
+                return
+            budget -= len(content)
+            self._inspect(content, findings)
+
+
+# Global instance
+pdf_prescanner = PdfPreScanner(max_inflate=Config.PRESCAN_MAX_INFLATE)
+
+
+def prescan_pdf(data):
+    """Convenience wrapper"""
+    return pdf_prescanner.scan(data)
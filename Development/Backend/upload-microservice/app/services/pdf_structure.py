@@ -0,0 +1,769 @@
+"""
+Lightweight PDF structure reader
+
+Reads just enough of a PDF to answer metadata questions without a full
+parse: the cross-reference table or stream that ``startxref`` at the end
+of the file points to (following ``/Prev`` and ``/XRefStm``), the trailer,
+and the few objects reached from it - ``/Root`` -> ``/Pages`` ``/Count``
+and ``/Info``. Objects are parsed on demand, including objects packed in
+compressed object streams, so the cost does not grow with the page count.
+
+Anything it cannot read with confidence (damaged or encrypted files,
+unsupported stream filters) raises ``PdfStructureError``; callers then fall
+back to PyPDF2.
+"""
+import logging
+import re
+import time
+import zlib
+from collections import namedtuple
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Ref = namedtuple('Ref', 'num gen')
+
+MAX_NESTING = 64
+MAX_XREF_SECTIONS = 64
+# Page attributes a page inherits from its ancestors in the page tree
+INHERITABLE = ('Resources', 'MediaBox', 'CropBox', 'Rotate')
+
+_SKIP = re.compile(rb'(?:[\x00\t\n\x0c\r ]+|%[^\r\n]*)*')
+_REF = re.compile(rb'(\d+)[\x00\t\n\x0c\r ]+(\d+)[\x00\t\n\x0c\r ]+R(?![^\x00\t\n\x0c\r /<>\[\]()%{}])')
+_NUMBER = re.compile(rb'[+-]?(?:\d+\.?\d*|\.\d+)')
+_NAME = re.compile(rb'/([^\x00\t\n\x0c\r /<>\[\]()%{}]*)')
+_KEYWORD = re.compile(rb'[^\x00\t\n\x0c\r /<>\[\]()%{}]+')
+_HEX_ESCAPE = re.compile(r'#([0-9A-Fa-f]{2})')
+_OBJ_HEADER = re.compile(rb'[\x00\t\n\x0c\r ]*(\d+)[\x00\t\n\x0c\r ]+(\d+)[\x00\t\n\x0c\r ]+obj')
+_STREAM = re.compile(rb'[\x00\t\n\x0c\r ]*stream(?:\r\n|\n|\r)')
+_STARTXREF = re.compile(rb'startxref[\x00\t\n\x0c\r ]+(\d+)')
+_XREF_SUBSECTION = re.compile(rb'[\x00\t\n\x0c\r ]*(\d+)[\x00\t\n\x0c\r ]+(\d+)[ \t]*(?:\r\n|\n|\r)')
+_XREF_ENTRY = re.compile(rb'(\d{10}) (\d{5}) ([nf])')
+_STRING_ESCAPES = {
+    ord('n'): b'\n', ord('r'): b'\r', ord('t'): b'\t', ord('b'): b'\b',
+    ord('f'): b'\f', ord('('): b'(', ord(')'): b')', ord('\\'): b'\\'
+}
+
+
+class PdfStructureError(ValueError):
+    """Raised when a PDF cannot be read without the full parser"""
+
+
+class PdfStream:
+    """A stream object: its dictionary and undecoded bytes"""
+
+    def __init__(self, dictionary: Dict, raw):
+        self.dictionary = dictionary
+        self.raw = raw
+
+    def get(self, key, default=None):
+        return self.dictionary.get(key, default)
+
+
+class PdfStructureReader:
+    """
+    On-demand reader for a PDF held in memory (bytes or mmap)
+
+    Names are returned as ``str`` (without the leading slash), strings as
+    ``bytes``, indirect references as ``Ref``.
+
+    Args:
+        data: The whole file
+        max_inflate: Bytes any single stream may decompress to
+    """
+
+    def __init__(self, data, max_inflate: int = 16 * 1024 * 1024):
+        self.data = data
+        self.max_inflate = max_inflate
+        self._sections = []
+        self._object_streams = {}
+        self._cache = {}
+        self._resolving = set()
+        self.trailer = self._read_xref_chain()
+        if 'Encrypt' in self.trailer:
+            raise PdfStructureError("document is encrypted")
+
+    # -- document level -------------------------------------------------
+
+    def info(self) -> Dict[str, str]:
+        """The /Info dictionary with text values decoded"""
+        info = self.resolve(self.trailer.get('Info'))
+        if not isinstance(info, dict):
+            return {}
+        return {
+            key: decode_text(value)
+            for key, value in ((k, self.resolve(v)) for k, v in info.items())
+            if isinstance(value, bytes)
+        }
+
+    def page_count(self) -> int:
+        """``/Count`` of the root page tree node"""
+        count = self.resolve(self.pages_root().get('Count'))
+        if not isinstance(count, int) or isinstance(count, bool) or count < 0:
+            raise PdfStructureError(f"invalid page count: {count!r}")
+        return count
+
+    def pages_root(self) -> Dict:
+        root = self.resolve(self.trailer.get('Root'))
+        pages = self.resolve(root.get('Pages')) if isinstance(root, dict) else None
+        if not isinstance(pages, dict):
+            raise PdfStructureError("document catalog has no page tree")
+        return pages
+
+    def first_page(self):
+        """
+        Dictionary of the first page and the resources it inherits
+
+        Returns:
+            tuple: (page dict, resources dict), or (None, None) without pages
+        """
+        page, inherited = self._first_page_node()
+        if page is None:
+            return None, None
+        return page, self.resolve(inherited.get('Resources')) or {}
+
+    def page_size(self, index: int = 0) -> Optional[Tuple[float, float]]:
+        """
+        Displayed size of a page (0-based) in points (width, height)
+
+        Uses the CropBox (what renderers show) or else the MediaBox, with
+        /UserUnit and /Rotate applied. None when there is no such page.
+        """
+        page, inherited = self._page_node(index)
+        if page is None:
+            return None
+
+        box = self.resolve(inherited.get('CropBox')) or self.resolve(inherited.get('MediaBox'))
+        box = [self.resolve(value) for value in box] if isinstance(box, list) else None
+        if not box or len(box) != 4 or not all(isinstance(v, (int, float)) for v in box):
+            raise PdfStructureError(f"invalid page box: {box!r}")
+
+        unit = self.resolve(page.get('UserUnit', 1))
+        unit = unit if isinstance(unit, (int, float)) and unit > 0 else 1
+        width = abs(box[2] - box[0]) * unit
+        height = abs(box[3] - box[1]) * unit
+        rotate = self.resolve(inherited.get('Rotate', 0))
+        if isinstance(rotate, int) and rotate % 180 == 90:
+            width, height = height, width
+        return width, height
+
+    def first_page_thumbnail(self) -> Optional[PdfStream]:
+        """The first page's embedded /Thumb image stream, or None"""
+        page, inherited = self._first_page_node()
+        if page is None:
+            return None
+        thumb = self.resolve(page.get('Thumb'))
+        return thumb if isinstance(thumb, PdfStream) else None
+
+    def first_page_rotation(self) -> int:
+        """The first page's /Rotate in degrees (0, 90, 180 or 270)"""
+        page, inherited = self._first_page_node()
+        rotate = self.resolve(inherited.get('Rotate', 0)) if page is not None else 0
+        return rotate % 360 if isinstance(rotate, int) else 0
+
+    def _first_page_node(self):
+        """First page dict and the inheritable attributes in effect for it"""
+        return self._page_node(0)
+
+    def _page_node(self, index: int):
+        """Page dict (0-based, following /Count) and the inheritable attributes in effect for it"""
+        node = self.pages_root()
+        inherited = {}
+        for _ in range(MAX_NESTING):
+            for key in INHERITABLE:
+                if key in node:
+                    inherited[key] = node[key]
+            if node.get('Type') == 'Page' or 'Kids' not in node:
+                return (node, inherited) if index == 0 else (None, inherited)
+            for kid in self.resolve(node.get('Kids')) or []:
+                kid = self.resolve(kid)
+                if not isinstance(kid, dict):
+                    continue
+                count = 1 if kid.get('Type') == 'Page' or 'Kids' not in kid else self.resolve(kid.get('Count'))
+                if not isinstance(count, int) or count < 0:
+                    raise PdfStructureError(f"invalid page count in page tree: {count!r}")
+                if index < count:
+                    node = kid
+                    break
+                index -= count
+            else:
+                return None, inherited
+        raise PdfStructureError("page tree is too deep")
+
+    # -- objects --------------------------------------------------------
+
+    def resolve(self, value, depth: int = 0):
+        """Follow indirect references to the object they point to"""
+        while isinstance(value, Ref):
+            if depth > MAX_NESTING:
+                raise PdfStructureError("reference chain is too long")
+            value = self.get_object(value.num)
+            depth += 1
+        return value
+
+    def get_object(self, num: int):
+        if num in self._cache:
+            return self._cache[num]
+
+        if num in self._resolving:
+            # e.g. two streams whose /Length point at each other
+            raise PdfStructureError(f"object {num} depends on itself")
+        self._resolving.add(num)
+        try:
+            entry = self._lookup(num)
+            if entry is None:
+                value = None
+            elif entry[0] == 'n':
+                value = self._read_indirect(entry[1], num)
+            else:
+                value = self._read_compressed(entry[1], entry[2], num)
+        finally:
+            self._resolving.discard(num)
+        self._cache[num] = value
+        return value
+
+    def stream_data(self, stream: PdfStream, max_bytes: Optional[int] = None, predictors: bool = True) -> bytes:
+        """
+        Decoded content of a stream (FlateDecode and PNG predictors only)
+
+        With ``predictors=False`` PNG predictors are left in place.
+
+        Raises:
+            PdfStructureError: unsupported filter, corrupt data or more than
+                ``max_bytes`` (default ``max_inflate``) of output
+        """
+        limit = self.max_inflate if max_bytes is None else max_bytes
+        filters = self.resolve(stream.get('Filter'))
+        params = self.resolve(stream.get('DecodeParms'))
+        if not isinstance(filters, list):
+            filters = [filters] if filters else []
+            params = [params]
+        elif not isinstance(params, list):
+            params = [params] * len(filters)
+
+        data = bytes(stream.raw)
+        for name, param in zip(filters, params + [None] * len(filters)):
+            if name not in ('FlateDecode', 'Fl'):
+                raise PdfStructureError(f"unsupported stream filter /{name}")
+            inflater = zlib.decompressobj()
+            try:
+                data = inflater.decompress(data, limit + 1)
+            except zlib.error as e:
+                raise PdfStructureError(f"corrupt stream: {e}")
+            if len(data) > limit:
+                raise PdfStructureError("stream exceeds the decode budget")
+            param = self.resolve(param)
+            if predictors and isinstance(param, dict) and self.resolve(param.get('Predictor', 1)) >= 10:
+                data = _png_unpredict(data, self.resolve(param.get('Columns', 1)))
+        return data
+
+    def _read_indirect(self, offset: int, num: Optional[int] = None):
+        header = _OBJ_HEADER.match(self.data, offset)
+        if header is None or (num is not None and int(header.group(1)) != num):
+            raise PdfStructureError(f"no object {num} at offset {offset}")
+
+        value, position = parse_object(self.data, header.end())
+        stream = _STREAM.match(self.data, position) if isinstance(value, dict) else None
+        if stream is None:
+            return value
+
+        length = value.get('Length')
+        if isinstance(length, Ref):
+            # Resolving can reparse other objects; never recurse into this one
+            length = None if length.num == num else self.resolve(length)
+        start = stream.end()
+        if not isinstance(length, int) or start + length > len(self.data):
+            end = self.data.find(b'endstream', start)
+            if end == -1:
+                raise PdfStructureError(f"unterminated stream in object {num}")
+            length = end - start
+        return PdfStream(value, self.data[start:start + length])
+
+    def _read_compressed(self, stream_num: int, index: int, num: int):
+        objects = self._object_streams.get(stream_num)
+        if objects is None:
+            stream = self.get_object(stream_num)
+            if not isinstance(stream, PdfStream):
+                raise PdfStructureError(f"object stream {stream_num} is missing")
+            content = self.stream_data(stream)
+            count = self.resolve(stream.get('N'))
+            first = self.resolve(stream.get('First'))
+            if not isinstance(count, int) or not isinstance(first, int):
+                raise PdfStructureError(f"object stream {stream_num} has no /N or /First")
+            header = content[:first].split()
+            objects = {
+                int(header[2 * i]): first + int(header[2 * i + 1])
+                for i in range(min(count, len(header) // 2))
+            }
+            objects = (content, objects)
+            self._object_streams[stream_num] = objects
+
+        content, offsets = objects
+        if num not in offsets:
+            raise PdfStructureError(f"object {num} is not in object stream {stream_num}")
+        return parse_object(content, offsets[num])[0]
+
+    # -- cross-reference ------------------------------------------------
+
+    def _read_xref_chain(self) -> Dict:
+        tail = self.data[-2048:]
+        matches = list(_STARTXREF.finditer(tail))
+        if not matches:
+            raise PdfStructureError("no startxref")
+
+        trailer = None
+        offset = int(matches[-1].group(1))
+        seen = set()
+        while offset is not None:
+            if offset in seen or len(seen) >= MAX_XREF_SECTIONS:
+                raise PdfStructureError("cross-reference chain loops")
+            seen.add(offset)
+
+            section_trailer = self._read_xref_section(offset)
+            if trailer is None:
+                trailer = section_trailer
+            hybrid = section_trailer.get('XRefStm')
+            if isinstance(hybrid, int) and hybrid not in seen:
+                # Hybrid-reference file: the stream complements the table of
+                # the same revision, before any older revision is consulted
+                seen.add(hybrid)
+                table = self._sections[-1]
+                self._read_xref_section(hybrid)
+                if isinstance(table, _XrefTable):
+                    table.xref_stream = self._sections.pop()
+            offset = section_trailer.get('Prev')
+            if offset is not None and not isinstance(offset, int):
+                raise PdfStructureError(f"invalid /Prev: {offset!r}")
+        return trailer
+
+    def _read_xref_section(self, offset: int) -> Dict:
+        position = _SKIP.match(self.data, offset).end()
+        if self.data[position:position + 4] == b'xref':
+            return self._read_xref_table(position + 4)
+
+        stream = self._read_indirect(offset)
+        if not isinstance(stream, PdfStream) or stream.get('Type') != 'XRef':
+            raise PdfStructureError(f"no cross-reference section at offset {offset}")
+        self._sections.append(_XrefStream(self, stream))
+        return stream.dictionary
+
+    def _read_xref_table(self, position: int) -> Dict:
+        subsections = []
+        while True:
+            match = _XREF_SUBSECTION.match(self.data, position)
+            if match is None:
+                break
+            start, count = int(match.group(1)), int(match.group(2))
+            entries = match.end()
+            # Entries are 20 bytes; some writers end them with a bare EOL
+            width = 19 if self.data[entries + 18:entries + 19] in (b'\r', b'\n') and \
+                self.data[entries + 19:entries + 20] not in (b'\r', b'\n') else 20
+            subsections.append((start, count, entries, width))
+            position = entries + count * width
+
+        position = _SKIP.match(self.data, position).end()
+        if self.data[position:position + 7] != b'trailer':
+            raise PdfStructureError("cross-reference table without trailer")
+        trailer, _ = parse_object(self.data, position + 7)
+        if not isinstance(trailer, dict):
+            raise PdfStructureError("invalid trailer")
+        self._sections.append(_XrefTable(self.data, subsections))
+        return trailer
+
+    def _lookup(self, num: int):
+        for section in self._sections:
+            entry = section.lookup(num)
+            if entry is not None:
+                return entry if entry[0] != 'f' else None
+        return None
+
+
+class _XrefTable:
+    """
+    Classic cross-reference subsections; entries are read on lookup
+
+    In a hybrid-reference file ``xref_stream`` is the revision's /XRefStm.
+    Writers (e.g. Word) list objects that only the stream locates as free
+    in the table, so a free or missing entry is looked up there as well.
+    """
+
+    def __init__(self, data, subsections):
+        self.data = data
+        self.subsections = subsections
+        self.xref_stream = None
+
+    def lookup(self, num: int):
+        entry = self._lookup_table(num)
+        if self.xref_stream is None or (entry is not None and entry[0] != 'f'):
+            return entry
+        return self.xref_stream.lookup(num) or entry
+
+    def _lookup_table(self, num: int):
+        for start, count, position, width in self.subsections:
+            if start <= num < start + count:
+                entry = _XREF_ENTRY.match(self.data, position + (num - start) * width)
+                if entry is None:
+                    raise PdfStructureError(f"damaged cross-reference entry for object {num}")
+                if entry.group(3) == b'f':
+                    return ('f',)
+                return ('n', int(entry.group(1)))
+        return None
+
+
+class _XrefStream:
+    """Cross-reference stream (PDF 1.5+); rows are read on lookup"""
+
+    def __init__(self, reader: PdfStructureReader, stream: PdfStream):
+        widths = reader.resolve(stream.get('W'))
+        size = reader.resolve(stream.get('Size'))
+        index = reader.resolve(stream.get('Index')) or [0, size]
+        if not isinstance(widths, list) or len(widths) != 3 or not all(isinstance(w, int) for w in widths):
+            raise PdfStructureError(f"invalid cross-reference stream /W: {widths!r}")
+        self.widths = widths
+        self.row = sum(widths)
+        self.data = reader.stream_data(stream, predictors=False)
+        self.predicted = False
+        params = reader.resolve(stream.get('DecodeParms'))
+        if isinstance(params, list):
+            params = reader.resolve(params[0]) if params else None
+        if isinstance(params, dict) and reader.resolve(params.get('Predictor', 1)) >= 10:
+            if set(self.data[0::self.row + 1]) <= {2}:
+                # PNG "Up" on every row (what writers use): rows are column
+                # sums, so single rows can be decoded without the rest
+                self.predicted = True
+            else:
+                self.data = _png_unpredict(self.data, self.row)
+        self.ranges = []
+        row = 0
+        for i in range(0, len(index) - 1, 2):
+            self.ranges.append((index[i], index[i + 1], row))
+            row += index[i + 1]
+
+    def lookup(self, num: int):
+        for start, count, first_row in self.ranges:
+            if start <= num < start + count:
+                row = self._row(first_row + num - start)
+                fields = []
+                position = 0
+                for width in self.widths:
+                    fields.append(int.from_bytes(row[position:position + width], 'big'))
+                    position += width
+                kind = fields[0] if self.widths[0] else 1
+                if kind == 1:
+                    return ('n', fields[1])
+                if kind == 2:
+                    return ('c', fields[1], fields[2])
+                return ('f',)
+        return None
+
+    def _row(self, index: int) -> bytes:
+        if not self.predicted:
+            row = self.data[index * self.row:(index + 1) * self.row]
+        else:
+            stride = self.row + 1
+            end = (index + 1) * stride
+            row = bytes(sum(self.data[1 + column:end:stride]) & 0xff for column in range(self.row))
+        if len(row) != self.row:
+            raise PdfStructureError(f"cross-reference stream has no row {index}")
+        return row
+
+
+def parse_object(data, position: int, depth: int = 0):
+    """
+    Parse one direct object starting at ``position``
+
+    Returns:
+        tuple: (value, position after it)
+    """
+    if depth > MAX_NESTING:
+        raise PdfStructureError("objects are nested too deeply")
+    position = _SKIP.match(data, position).end()
+    lead = data[position:position + 2]
+
+    if lead == b'<<':
+        result = {}
+        position += 2
+        while True:
+            position = _SKIP.match(data, position).end()
+            if data[position:position + 2] == b'>>':
+                return result, position + 2
+            key, position = parse_object(data, position, depth + 1)
+            if not isinstance(key, str) or isinstance(key, Operator):
+                raise PdfStructureError(f"dictionary key is not a name at offset {position}")
+            result[key], position = parse_object(data, position, depth + 1)
+    if lead[:1] == b'[':
+        result = []
+        position += 1
+        while True:
+            position = _SKIP.match(data, position).end()
+            if data[position:position + 1] == b']':
+                return result, position + 1
+            if position >= len(data):
+                raise PdfStructureError("unterminated array")
+            value, position = parse_object(data, position, depth + 1)
+            result.append(value)
+    if lead[:1] == b'/':
+        match = _NAME.match(data, position)
+        name = match.group(1).decode('latin-1')
+        if '#' in name:
+            name = _HEX_ESCAPE.sub(lambda m: chr(int(m.group(1), 16)), name)
+        return name, match.end()
+    if lead[:1] == b'(':
+        return _parse_literal_string(data, position + 1)
+    if lead[:1] == b'<':
+        end = data.find(b'>', position)
+        if end == -1:
+            raise PdfStructureError("unterminated hex string")
+        digits = re.sub(rb'[^0-9A-Fa-f]', b'', data[position + 1:end])
+        return bytes.fromhex((digits + b'0' * (len(digits) % 2)).decode()), end + 1
+
+    match = _REF.match(data, position)
+    if match:
+        return Ref(int(match.group(1)), int(match.group(2))), match.end()
+    match = _NUMBER.match(data, position)
+    if match:
+        token = match.group(0)
+        return (float(token) if b'.' in token else int(token)), match.end()
+    match = _KEYWORD.match(data, position)
+    if match is None:
+        raise PdfStructureError(f"unexpected byte at offset {position}")
+    keyword = match.group(0)
+    if keyword in (b'true', b'false'):
+        return keyword == b'true', match.end()
+    if keyword == b'null':
+        return None, match.end()
+    return Operator(keyword.decode('latin-1')), match.end()
+
+
+class Operator(str):
+    """A bare keyword (content stream operator, ``endobj``...)"""
+
+
+def _parse_literal_string(data, position: int):
+    out = bytearray()
+    nesting = 1
+    length = len(data)
+    while position < length:
+        byte = data[position]
+        position += 1
+        if byte == 0x5c:  # backslash
+            if position >= length:
+                break
+            escaped = data[position]
+            position += 1
+            if escaped in _STRING_ESCAPES:
+                out += _STRING_ESCAPES[escaped]
+            elif 0x30 <= escaped <= 0x37:
+                digits = bytes([escaped])
+                while len(digits) < 3 and position < length and 0x30 <= data[position] <= 0x37:
+                    digits += bytes([data[position]])
+                    position += 1
+                out.append(int(digits, 8) & 0xff)
+            elif escaped == 0x0d:
+                if data[position:position + 1] == b'\n':
+                    position += 1
+            elif escaped != 0x0a:
+                out.append(escaped)
+        elif byte == 0x28:
+            nesting += 1
+            out.append(byte)
+        elif byte == 0x29:
+            nesting -= 1
+            if nesting == 0:
+                return bytes(out), position
+            out.append(byte)
+        else:
+            out.append(byte)
+    raise PdfStructureError("unterminated string")
+
+
+def _png_unpredict(data: bytes, columns: int) -> bytes:
+    """Undo PNG row predictors (as used by cross-reference streams)"""
+    row_length = columns + 1
+    previous = bytearray(columns)
+    out = bytearray()
+    for start in range(0, len(data) - columns, row_length):
+        kind = data[start]
+        row = bytearray(data[start + 1:start + row_length])
+        for i in range(len(row)):
+            left = row[i - 1] if i else 0
+            up = previous[i]
+            if kind == 1:
+                row[i] = (row[i] + left) & 0xff
+            elif kind == 2:
+                row[i] = (row[i] + up) & 0xff
+            elif kind == 3:
+                row[i] = (row[i] + ((left + up) >> 1)) & 0xff
+            elif kind == 4:
+                upper_left = previous[i - 1] if i else 0
+                estimate = left + up - upper_left
+                distances = (abs(estimate - left), abs(estimate - up), abs(estimate - upper_left))
+                row[i] = (row[i] + (left, up, upper_left)[distances.index(min(distances))]) & 0xff
+            elif kind != 0:
+                raise PdfStructureError(f"unknown PNG predictor {kind}")
+        out += row
+        previous = row
+    return bytes(out)
+
+
+def decode_text(value: bytes) -> str:
+    """Decode a PDF text string (UTF-16BE or UTF-8 with BOM, else PDFDocEncoding)"""
+    if value.startswith(b'\xfe\xff'):
+        return value[2:].decode('utf-16-be', errors='replace')
+    if value.startswith(b'\xef\xbb\xbf'):
+        return value[3:].decode('utf-8', errors='replace')
+    # PDFDocEncoding matches Latin-1 for printable text
+    return value.decode('latin-1')
+
+
+class PageTextExtractor:
+    """
+    Best-effort text of one page within a time and byte budget
+
+    Supports what is needed to find a title: Tj/TJ/'/" text in content
+    streams, simple fonts read as Latin-1, and fonts with a /ToUnicode CMap.
+    Text in composite fonts without a CMap is skipped.
+
+    Args:
+        reader: Document reader
+        max_bytes: Bytes of content streams and CMaps to decode in total
+        time_budget: Seconds to spend before returning what was found
+    """
+
+    TEXT_OPERATORS = {'Tj', 'TJ', "'", '"'}
+
+    def __init__(self, reader: PdfStructureReader, max_bytes: int, time_budget: float):
+        self.reader = reader
+        self.budget = max_bytes
+        self.deadline = time.monotonic() + time_budget
+        self._fonts = {}
+
+    def first_line(self, page: Dict, resources: Dict, max_length: int = 100) -> Optional[str]:
+        """First non-empty text line of ``page`` if it is at most ``max_length`` long, or None"""
+        fonts = self.reader.resolve(resources.get('Font')) if isinstance(resources, dict) else None
+        fonts = fonts if isinstance(fonts, dict) else {}
+        line = []
+        line_y = None
+        y, scale = 0, 1
+        font = None
+        for operator, operands in self._operations(page):
+            new_line = False
+            if operator == 'Tf' and operands:
+                font = self._font(fonts, operands[0])
+            elif operator == 'BT':
+                y, scale = 0, 1
+            elif operator == 'Tm' and len(operands) == 6 and all(isinstance(o, (int, float)) for o in operands):
+                y, scale = operands[5], operands[3] or 1
+            elif operator in ('Td', 'TD') and len(operands) == 2 and isinstance(operands[1], (int, float)):
+                y += operands[1] * scale
+            elif operator in ('T*', "'", '"'):
+                new_line = True
+
+            if operator in self.TEXT_OPERATORS and font is not False:
+                if line_y is not None and abs(y - line_y) > 1:
+                    new_line = True
+                if new_line:
+                    text = ''.join(line).strip()
+                    if text:
+                        return text if len(text) <= max_length else None
+                    line = []
+                line.append(self._show(font, operands))
+                line_y = y
+
+        text = ''.join(line).strip()
+        return text if text and len(text) <= max_length else None
+
+    def _operations(self, page: Dict):
+        contents = self.reader.resolve(page.get('Contents'))
+        streams = contents if isinstance(contents, list) else [contents]
+        for stream in streams:
+            stream = self.reader.resolve(stream)
+            if not isinstance(stream, PdfStream):
+                continue
+            data = self._decode(stream)
+            position = 0
+            operands = []
+            while position < len(data):
+                if time.monotonic() > self.deadline:
+                    logger.info("Title extraction ran out of time")
+                    return
+                value, position = parse_object(data, position)
+                if isinstance(value, Operator):
+                    if value == 'BI':
+                        # Skip inline image data
+                        end = data.find(b'EI', data.find(b'ID', position))
+                        position = len(data) if end == -1 else end + 2
+                    else:
+                        yield value, operands
+                    operands = []
+                else:
+                    operands.append(value)
+                position = _SKIP.match(data, position).end()
+
+    def _decode(self, stream: PdfStream) -> bytes:
+        data = self.reader.stream_data(stream, max_bytes=self.budget)
+        self.budget -= len(data)
+        return data
+
+    def _font(self, fonts: Dict, name):
+        """(code width, code -> text map or None), or False when undecodable"""
+        if name not in self._fonts:
+            font = self.reader.resolve(fonts.get(name))
+            self._fonts[name] = False
+            if isinstance(font, dict):
+                cmap = self.reader.resolve(font.get('ToUnicode'))
+                composite = font.get('Subtype') == 'Type0'
+                if isinstance(cmap, PdfStream):
+                    self._fonts[name] = _parse_cmap(self._decode(cmap), 2 if composite else 1)
+                elif not composite:
+                    self._fonts[name] = (1, None)
+        return self._fonts[name]
+
+    @staticmethod
+    def _show(font, operands) -> str:
+        strings = []
+        for operand in operands:
+            for item in operand if isinstance(operand, list) else [operand]:
+                if isinstance(item, bytes):
+                    strings.append(_decode_codes(font, item))
+                elif isinstance(item, (int, float)) and item < -200:
+                    strings.append(' ')
+        return ''.join(strings)
+
+
+def _parse_cmap(data: bytes, default_width: int):
+    codespace = re.search(rb'begincodespacerange\s*<([0-9A-Fa-f]+)>', data)
+    width = len(codespace.group(1)) // 2 if codespace else default_width
+    mapping = {}
+
+    def text(hex_digits):
+        return bytes.fromhex(hex_digits.decode()).decode('utf-16-be', errors='ignore')
+
+    for block in re.finditer(rb'beginbfchar(.*?)endbfchar', data, re.S):
+        for source, target in re.findall(rb'<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]*)>', block.group(1)):
+            mapping[int(source, 16)] = text(target)
+    for block in re.finditer(rb'beginbfrange(.*?)endbfrange', data, re.S):
+        for low, high, target in re.findall(
+                rb'<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>\s*(<[0-9A-Fa-f]*>|\[[^\]]*\])', block.group(1)):
+            low, high = int(low, 16), int(high, 16)
+            if high - low > 0xffff:
+                continue
+            if target.startswith(b'['):
+                for offset, item in enumerate(re.findall(rb'<([0-9A-Fa-f]*)>', target)):
+                    mapping[low + offset] = text(item)
+            else:
+                base = bytes.fromhex(target[1:-1].decode())
+                for offset in range(high - low + 1):
+                    code = base[:-1] + bytes([(base[-1] + offset) & 0xff]) if base else b''
+                    mapping[low + offset] = code.decode('utf-16-be', errors='ignore')
+    return (width, mapping)
+
+
+def _decode_codes(font, data: bytes) -> str:
+    width, mapping = font if font else (1, None)
+    if mapping is None:
+        return data.decode('latin-1')
+    return ''.join(
+        mapping.get(int.from_bytes(data[i:i + width], 'big'), '')
+        for i in range(0, len(data) - width + 1, width)
+    )
@@ -1,51 +1,395 @@
-from pdf2image import convert_from_bytes
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
 from io import BytesIO
+from minio.commonconfig import CopySource
+from minio.error import S3Error
+from PIL import Image
 from app.client.minio_client import minio_client
 from app.config.config import Config
+from app.services.admission import admission_controller
+from app.services.page_selector import choose_preview_page
+from app.services.pdf_structure import PdfStructureReader
+from app.services.render_engines import embedded_thumbnail, render_page
+from app.services.storage import storage_service
+import PyPDF2
 import logging
+import math
+import mmap
+import os
+import tempfile
+import threading
 
 logger = logging.getLogger(__name__)
 
-def generate_and_upload_preview(file_buffer: bytes, file_id: str):
+# Encoded preview images keyed by (width, format); width None is the
+# full-size preview in PREVIEW_FORMAT, the others are PREVIEW_WIDTHS variants
+PreviewSet = Dict[Tuple[Optional[int], str], bytes]
+
+_uploads = ThreadPoolExecutor(max_workers=8, thread_name_prefix='preview-upload')
+
+
+def preview_object_name(file_id: str, width: Optional[int] = None, fmt: Optional[str] = None) -> str:
     """
-    Generate first page preview from a PDF file and upload to MinIO
+    MinIO object name of a preview image
+
+    The full-size preview is ``<PREVIEW_FOLDER>/<file_id>.<ext>``, variants
+    are ``<PREVIEW_FOLDER>/<file_id>/<width>.<ext>``.
+    """
+    extension = _extension(fmt or Config.PREVIEW_FORMAT)
+    if width is None:
+        return f"{Config.PREVIEW_FOLDER}/{file_id}.{extension}"
+    return f"{Config.PREVIEW_FOLDER}/{file_id}/{width}.{extension}"
+
+
+def preview_public_url(object_name: str) -> str:
+    protocol = 'https' if Config.MINIO_SECURE else 'http'
+    return f"{protocol}://{Config.PUBLIC_MINIO_HOST}/{Config.MINIO_BUCKET}/{object_name}"
+
+
+def build_srcset(variants: Dict[str, Dict[int, str]]) -> Dict[str, str]:
+    """
+    srcset strings per MIME type
 
     Args:
-        file_buffer (bytes): The content of the PDF file
-        file_id (str): The unique file ID for naming the preview
-        visibility (str): Either 'public' or 'private'
+        variants (dict): MIME type -> {width: url}
+
+    Returns:
+        dict: MIME type -> ``"<url> 160w, <url> 320w, ..."``
+    """
+    return {
+        mime: ', '.join(f"{url} {width}w" for width, url in sorted(urls.items()))
+        for mime, urls in variants.items()
+    }
+
+
+def _extension(fmt: str) -> str:
+    fmt = fmt.upper()
+    return 'jpg' if fmt == 'JPEG' else fmt.lower()
+
+
+def image_content_type(fmt: str) -> str:
+    return Image.MIME.get(fmt.upper(), 'application/octet-stream')
+
+
+def page_size(data, page: int = 1) -> Optional[Tuple[float, float]]:
+    """
+    Displayed size of a page in points, read without rendering
+
+    Args:
+        data: PDF content (bytes or mmap)
+        page (int): Page number (1-based)
+
+    Returns:
+        tuple: (width, height), or None when it cannot be determined
     """
     try:
-        logger.info(f"Generating preview image for file ID: {file_id}")
-        
-        images = convert_from_bytes(file_buffer, dpi=Config.PREVIEW_DPI, first_page=1, last_page=1, fmt=Config.PREVIEW_FORMAT.lower())
-        
-        if not images:
-            raise Exception("No page found in PDF for preview")
+        return PdfStructureReader(data).page_size(page - 1)
+    except Exception as e:
+        logger.debug(f"Structure reader could not size page {page}: {e}")
 
-        img_buffer = BytesIO()
-        images[0].save(img_buffer, Config.PREVIEW_FORMAT)
-        img_buffer.seek(0)
+    try:
+        # An mmap is file-like already; wrapping it in BytesIO would copy the file
+        stream = BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+        pdf_page = PyPDF2.PdfReader(stream).pages[page - 1]
+        width, height = float(pdf_page.cropbox.width), float(pdf_page.cropbox.height)
+        unit = float(pdf_page.get('/UserUnit', 1) or 1)
+        if (pdf_page.get('/Rotate') or 0) % 180 == 90:
+            width, height = height, width
+        return width * unit, height * unit
+    except Exception as e:
+        logger.debug(f"PyPDF2 could not size page {page}: {e}")
+        return None
 
-        object_path = f"{Config.PREVIEW_FOLDER}/{file_id}.jpg"
 
+def preview_dpi(size: Tuple[float, float]) -> float:
+    """
+    DPI that fits a page into the preview limits
+
+    The long edge gets at most PREVIEW_MAX_SIZE pixels and the whole image
+    at most PREVIEW_MAX_PIXELS, never more than PREVIEW_DPI.
+
+    Args:
+        size (tuple): Page width and height in points
+    """
+    width, height = (max(edge, 1.0) / 72 for edge in size)
+    dpi = min(Config.PREVIEW_DPI, Config.PREVIEW_MAX_SIZE / max(width, height))
+    if width * height * dpi * dpi > Config.PREVIEW_MAX_PIXELS:
+        dpi = math.sqrt(Config.PREVIEW_MAX_PIXELS / (width * height))
+    # Round down so the engine's rounding cannot push the image over the limits
+    return max(math.floor(dpi * 100) / 100, 1.0)
+
+
+def _inspect(data, source) -> Tuple[Optional[Image.Image], int, Optional[Tuple[float, float]]]:
+    """
+    Pick the preview page and what is known about it, rendering only tiny scans
+
+    Returns:
+        tuple: (usable embedded thumbnail or None, page number, page size or None)
+    """
+    thumbnail = None
+    if Config.PREVIEW_THUMB_MIN_SIZE:
+        thumbnail = embedded_thumbnail(data, Config.PREVIEW_THUMB_MIN_SIZE)
+
+    page = 1
+    if Config.PREVIEW_PAGE_SCAN > 1:
+        try:
+            page_count = PdfStructureReader(data).page_count()
+        except Exception:
+            page_count = None
+        page = choose_preview_page(source, page_count, thumbnail)
+
+    if page == 1 and thumbnail is not None:
+        return thumbnail, page, None
+    return None, page, page_size(data, page)
+
+
+def render_preview(file_buffer: Optional[bytes] = None, file_path: Optional[str] = None) -> PreviewSet:
+    """
+    Render the preview page of a PDF once and encode every preview image from it
+
+    The preview page is the first informative one among the first
+    PREVIEW_PAGE_SCAN pages (app.services.page_selector), so blank pages and
+    separator sheets are skipped. A large enough embedded /Thumb of page 1
+    (PREVIEW_THUMB_MIN_SIZE) is used instead of rendering, scaled to the same
+    limits. Otherwise the page box is read
+    first to pick a DPI within PREVIEW_MAX_SIZE and PREVIEW_MAX_PIXELS and
+    the page is rendered by the RENDER_ENGINES (app.services.render_engines).
+    The full-size preview is encoded as PREVIEW_FORMAT; each PREVIEW_WIDTHS
+    variant is downscaled from the next larger one and encoded in every
+    PREVIEW_VARIANT_FORMATS format. Widths the render does not reach are
+    stored once, under the render's own width, so srcset never claims
+    pixels that are not there.
+
+    Args:
+        file_buffer (bytes): The content of the PDF file
+        file_path (str): PDF on local disk, used instead of file_buffer when given
+
+    Returns:
+        dict: Encoded images keyed by (width, format); width None is the full-size preview
+    """
+    source = file_path or file_buffer
+    if file_path:
+        with open(file_path, 'rb') as pdf_file:
+            with mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                image, page, size = _inspect(data, source)
+    else:
+        image, page, size = _inspect(file_buffer, source)
+
+    if image is None:
+        if size:
+            image = render_page(source, page, dpi=preview_dpi(size))
+        else:
+            # Unknown page size: let the engine scale the long edge
+            image = render_page(source, page, scale_to=Config.PREVIEW_MAX_SIZE)
+
+    images = {(None, Config.PREVIEW_FORMAT.upper()): encode_image(image, Config.PREVIEW_FORMAT)}
+    for width in sorted(Config.PREVIEW_WIDTHS, reverse=True):
+        if width < image.width:
+            # reducing_gap lets Pillow shrink by an integer factor with
+            # reduce() first and resample only the last step
+            height = max(round(image.height * width / image.width), 1)
+            image = image.resize((width, height), Image.LANCZOS, reducing_gap=2.0)
+        elif any(key[0] == image.width for key in images):
+            continue
+        for fmt in Config.PREVIEW_VARIANT_FORMATS:
+            images[(image.width, fmt.upper())] = encode_image(image, fmt)
+    return images
+
+
+def encode_image(image: Image.Image, fmt: str) -> bytes:
+    options = {}
+    if fmt.upper() == 'JPEG':
+        options = dict(quality=Config.PREVIEW_QUALITY, progressive=True, optimize=True)
+    elif fmt.upper() == 'WEBP':
+        options = dict(quality=Config.PREVIEW_QUALITY, method=4)
+    img_buffer = BytesIO()
+    image.save(img_buffer, fmt, **options)
+    return img_buffer.getvalue()
+
+
+def upload_preview(images: PreviewSet, file_id: str):
+    """
+    Upload a rendered preview set to MinIO, all images in parallel
+
+    Args:
+        images (dict): Encoded images from render_preview
+        file_id (str): The unique file ID for naming the preview
+
+    Returns:
+        dict: ``success``, ``preview_url`` and ``preview_srcset`` (MIME type -> srcset)
+    """
+    def put(key):
+        width, fmt = key
+        object_path = preview_object_name(file_id, width, fmt)
         minio_client.put_object(
             bucket_name=Config.MINIO_BUCKET,
             object_name=object_path,
-            data=img_buffer,
-            length=img_buffer.getbuffer().nbytes,
-            content_type='image/jpeg'
+            data=BytesIO(images[key]),
+            length=len(images[key]),
+            content_type=image_content_type(fmt)
         )
+        return object_path
 
-        logger.info(f"Uploaded preview to MinIO: {object_path}")
+    futures = {key: _uploads.submit(put, key) for key in images}
+    paths = {key: future.result() for key, future in futures.items()}
+    logger.info(f"Uploaded {len(paths)} preview images to MinIO for {file_id}")
 
-        protocol = 'https' if Config.MINIO_SECURE else 'http'
-        url = f"{protocol}://{Config.PUBLIC_MINIO_HOST}/{Config.MINIO_BUCKET}/{object_path}"
-        return {
-            "success": True,
-            "preview_url": url,
-        }
+    variants = {}
+    for (width, fmt), object_path in paths.items():
+        if width is not None:
+            variants.setdefault(image_content_type(fmt), {})[width] = preview_public_url(object_path)
+    return {
+        "success": True,
+        "preview_url": preview_public_url(preview_object_name(file_id)),
+        "preview_srcset": build_srcset(variants),
+    }
+
+
+def list_preview_variants(file_id: str) -> Dict[str, Dict[int, str]]:
+    """
+    Stored size variants of a preview
+
+    Returns:
+        dict: MIME type -> {width: url}; empty for previews stored without variants
+    """
+    variants = {}
+    prefix = f"{Config.PREVIEW_FOLDER}/{file_id}/"
+    for obj in minio_client.list_objects(Config.MINIO_BUCKET, prefix=prefix):
+        width, _, extension = obj.object_name[len(prefix):].partition('.')
+        if not width.isdigit():
+            continue
+        fmt = 'JPEG' if extension == 'jpg' else extension.upper()
+        variants.setdefault(image_content_type(fmt), {})[int(width)] = preview_public_url(obj.object_name)
+    return variants
+
+
+def copy_preview(source_file_id: str, file_id: str):
+    """
+    Reuse the preview set of byte-identical content for another file id
+
+    Args:
+        source_file_id (str): File ID whose preview already exists
+        file_id (str): File ID that should get the same preview
+    """
+    prefix = f"{Config.PREVIEW_FOLDER}/{source_file_id}/"
+    sources = [preview_object_name(source_file_id)] + [
+        obj.object_name for obj in minio_client.list_objects(Config.MINIO_BUCKET, prefix=prefix)
+    ]
+
+    def copy(source):
+        if source.startswith(prefix):
+            target = f"{Config.PREVIEW_FOLDER}/{file_id}/{source[len(prefix):]}"
+        else:
+            target = preview_object_name(file_id)
+        minio_client.copy_object(Config.MINIO_BUCKET, target, CopySource(Config.MINIO_BUCKET, source))
+
+    for future in [_uploads.submit(copy, source) for source in sources]:
+        future.result()
+
+    return {
+        "success": True,
+        "preview_url": preview_public_url(preview_object_name(file_id)),
+        "preview_srcset": build_srcset(list_preview_variants(file_id)),
+    }
+
+
+def generate_and_upload_preview(file_buffer: Optional[bytes], file_id: str, file_path: Optional[str] = None):
+    """
+    Generate first page preview from a PDF file and upload to MinIO
+
+    Args:
+        file_buffer (bytes): The content of the PDF file
+        file_id (str): The unique file ID for naming the preview
+        file_path (str): PDF on local disk, used instead of file_buffer when given
+    """
+    try:
+        logger.info(f"Generating preview image for file ID: {file_id}")
+        return upload_preview(render_preview(file_buffer, file_path), file_id)
 
     except Exception as e:
         logger.error(f"Failed to generate/upload preview image: {e}")
         raise
+
+
+class _SingleFlight:
+    """Run one call per key at a time; concurrent callers wait for and share its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+
+    def do(self, key: str, func, *args):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+_renders = _SingleFlight()
+
+
+def render_preview_on_demand(file_id: str) -> Optional[Dict]:
+    """
+    Render and store the preview of an uploaded PDF that has none yet
+
+    Concurrent calls for the same file id in this process share one render.
+    The render holds a 'render' admission slot, so AdmissionRejected is
+    raised when too many are already running.
+
+    Args:
+        file_id (str): The ID of the PDF file
+
+    Returns:
+        dict: upload_preview result, or None when no PDF exists for file_id
+    """
+    return _renders.do(file_id, _render_stored_pdf, file_id)
+
+
+def _render_stored_pdf(file_id: str) -> Optional[Dict]:
+    # Another request (or worker process) may have finished it meanwhile
+    try:
+        minio_client.stat_object(Config.MINIO_BUCKET, preview_object_name(file_id))
+        return {
+            "success": True,
+            "preview_url": preview_public_url(preview_object_name(file_id)),
+            "preview_srcset": build_srcset(list_preview_variants(file_id)),
+        }
+    except S3Error:
+        pass
+
+    object_path = None
+    for visibility in ['public', 'private']:
+        candidate = storage_service.resolve_object_path(file_id, visibility)
+        if candidate is None:
+            continue
+        try:
+            minio_client.stat_object(Config.MINIO_BUCKET, candidate)
+            object_path = candidate
+            break
+        except S3Error:
+            continue
+    if object_path is None:
+        return None
+
+    logger.info(f"Rendering preview on demand for file ID: {file_id}")
+    os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+    with admission_controller.stage('render'):
+        with tempfile.TemporaryDirectory(dir=Config.UPLOAD_FOLDER, prefix='preview-') as workdir:
+            pdf_path = os.path.join(workdir, 'source.pdf')
+            minio_client.fget_object(Config.MINIO_BUCKET, object_path, pdf_path)
+            images = render_preview(None, pdf_path)
+    return upload_preview(images, file_id)
@@ -0,0 +1,297 @@
+"""
+Pluggable page rendering engines
+
+Previews and page images need one thing from a PDF: a page as a Pillow
+image at a given DPI, or with its long edge scaled to a given size. Each
+engine provides it through the same interface:
+
+- ``pdfium``: PDFium through ``pypdfium2``, in long-lived isolated worker
+  processes (``app.services.worker_pool``) that keep the library loaded -
+  no fork/exec, no PPM round trip per render
+- ``poppler``: a ``pdftoppm`` process per render, PPM over stdout
+
+``RENDER_ENGINES`` lists the engines to try in order; an engine that
+fails on a file (or is not installed) hands it to the next one.
+``embedded_thumbnail`` skips rendering entirely when the PDF carries a
+large enough ``/Thumb`` image for its first page.
+"""
+import logging
+import math
+import subprocess
+from abc import ABC, abstractmethod
+from io import BytesIO
+from typing import List, Optional, Tuple, Union
+
+from PIL import Image
+
+from app.config.config import Config
+from app.services.pdf_structure import PdfStructureReader
+from app.services.worker_pool import IsolatedProcessPool
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+logger = logging.getLogger(__name__)
+
+# A PDF held in memory or the path of one on local disk
+Source = Union[bytes, str]
+
+
+class RenderEngineUnavailable(RuntimeError):
+    """Raised when a configured engine is unknown or not installed"""
+
+
+class RenderEngine(ABC):
+    """Renders single pages; exactly one of ``dpi`` and ``scale_to`` is given"""
+
+    name = None
+
+    @abstractmethod
+    def render(self, source: Source, page: int = 1, dpi: Optional[float] = None,
+               scale_to: Optional[int] = None) -> Image.Image:
+        """
+        Render a page (1-based) as an RGB image
+
+        Args:
+            source: PDF content or path
+            page: Page number
+            dpi: Resolution
+            scale_to: Long edge in pixels, instead of a resolution
+        """
+
+    def render_pages(self, source: Source, pages: List[int], scale_to: int) -> List[Image.Image]:
+        """
+        Render several pages with their long edge scaled to ``scale_to``
+
+        Stops at the first page that does not exist, so the result may be
+        shorter than ``pages``.
+        """
+        images = []
+        for page in pages:
+            try:
+                images.append(self.render(source, page, scale_to=scale_to))
+            except Exception:
+                if not images:
+                    raise
+                break
+        return images
+
+
+def run_pdftoppm(command, stdin=None, input_data=None) -> bytes:
+    """Run pdftoppm and return its stdout; raises on timeout, failure or empty output"""
+    process = subprocess.Popen(
+        command,
+        stdin=stdin if input_data is None else subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    try:
+        output, errors = process.communicate(input_data, timeout=Config.PREVIEW_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        raise Exception(f"pdftoppm did not finish within {Config.PREVIEW_TIMEOUT}s")
+
+    if process.returncode != 0:
+        raise Exception(f"pdftoppm failed ({process.returncode}): {errors.decode(errors='replace').strip()}")
+    if not output:
+        raise Exception("No page found in PDF for preview")
+    return output
+
+
+class PopplerEngine(RenderEngine):
+    """pdftoppm; reads a buffer over stdin (or the file directly), PPM on stdout"""
+
+    name = 'poppler'
+
+    def render(self, source, page=1, dpi=None, scale_to=None):
+        command = ['pdftoppm', '-f', str(page), '-l', str(page), '-singlefile']
+        if dpi:
+            command += ['-r', f"{dpi:g}"]
+        else:
+            command += ['-scale-to', str(scale_to)]
+        # No output root: the image is written to stdout
+        if isinstance(source, str):
+            output = run_pdftoppm(command + [source])
+        else:
+            output = run_pdftoppm(command + ['-'], input_data=source)
+
+        with Image.open(BytesIO(output)) as bitmap:
+            return bitmap.convert('RGB')
+
+
+def render_with_pdfium(source: Source, page: int, dpi: Optional[float], scale_to: Optional[int]) -> Image.Image:
+    """Render a page with PDFium (runs in a render worker process)"""
+    document = pypdfium2.PdfDocument(source)
+    try:
+        if page > len(document):
+            raise Exception("No page found in PDF for preview")
+        pdf_page = document[page - 1]
+        try:
+            scale = dpi / 72 if dpi else scale_to / max(max(pdf_page.get_size()), 1.0)
+            bitmap = pdf_page.render(scale=scale, may_draw_forms=True)
+            try:
+                return bitmap.to_pil().convert('RGB')
+            finally:
+                bitmap.close()
+        finally:
+            pdf_page.close()
+    finally:
+        document.close()
+
+
+def render_pages_with_pdfium(source: Source, pages: List[int], scale_to: int) -> List[Image.Image]:
+    """Render several pages of one document with PDFium (runs in a render worker process)"""
+    document = pypdfium2.PdfDocument(source)
+    try:
+        images = []
+        for page in pages:
+            if page > len(document):
+                break
+            pdf_page = document[page - 1]
+            try:
+                bitmap = pdf_page.render(scale=scale_to / max(max(pdf_page.get_size()), 1.0))
+                try:
+                    images.append(bitmap.to_pil().convert('RGB'))
+                finally:
+                    bitmap.close()
+            finally:
+                pdf_page.close()
+        return images
+    finally:
+        document.close()
+
+
+class PdfiumEngine(RenderEngine):
+    """PDFium via pypdfium2 on a pool of warm worker processes (PDFium is not thread-safe)"""
+
+    name = 'pdfium'
+
+    def __init__(self):
+        self.pool = IsolatedProcessPool(
+            'render',
+            size=Config.RENDER_WORKERS,
+            timeout=Config.PREVIEW_TIMEOUT,
+            memory_limit=Config.STAGE_PROCESS_MEMORY_LIMIT_MB * 1024 * 1024,
+            max_tasks=Config.STAGE_PROCESS_MAX_TASKS,
+            start_method=Config.STAGE_PROCESS_START_METHOD
+        )
+
+    def render(self, source, page=1, dpi=None, scale_to=None):
+        if pypdfium2 is None:
+            raise RenderEngineUnavailable("pdfium engine requires the pypdfium2 package")
+        return self.pool.call(render_with_pdfium, source, page, dpi, scale_to)
+
+    def render_pages(self, source, pages, scale_to):
+        # One task: the document is opened once for all pages
+        if pypdfium2 is None:
+            raise RenderEngineUnavailable("pdfium engine requires the pypdfium2 package")
+        return self.pool.call(render_pages_with_pdfium, source, list(pages), scale_to)
+
+
+ENGINES = {engine.name: engine for engine in (PdfiumEngine(), PopplerEngine())}
+
+
+def get_engine(name: str) -> RenderEngine:
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise RenderEngineUnavailable(f"Unknown render engine '{name}' (choose from {', '.join(ENGINES)})")
+
+
+def configured_engines() -> List[RenderEngine]:
+    """Engines from ``RENDER_ENGINES``, in order"""
+    return [get_engine(name) for name in Config.RENDER_ENGINES]
+
+
+def render_page(source: Source, page: int = 1, dpi: Optional[float] = None,
+                scale_to: Optional[int] = None) -> Image.Image:
+    """
+    Render a page with the first configured engine that succeeds
+
+    Raises:
+        Exception: the last engine's error when none of them could render it
+    """
+    error = None
+    for engine in configured_engines():
+        try:
+            return engine.render(source, page, dpi=dpi, scale_to=scale_to)
+        except Exception as e:
+            logger.warning(f"Render engine '{engine.name}' failed on page {page}: {e}")
+            error = e
+    raise error or RenderEngineUnavailable("No render engine configured")
+
+
+def render_pages(source: Source, pages: List[int], scale_to: int) -> List[Image.Image]:
+    """``render_page`` for several pages at a long-edge size (see RenderEngine.render_pages)"""
+    error = None
+    for engine in configured_engines():
+        try:
+            return engine.render_pages(source, pages, scale_to)
+        except Exception as e:
+            logger.warning(f"Render engine '{engine.name}' failed on pages {pages}: {e}")
+            error = e
+    raise error or RenderEngineUnavailable("No render engine configured")
+
+
+def preview_bounds(width: int, height: int) -> Tuple[int, int]:
+    """``(width, height)`` scaled down to fit PREVIEW_MAX_SIZE and PREVIEW_MAX_PIXELS"""
+    scale = min(1.0, Config.PREVIEW_MAX_SIZE / max(width, height),
+                math.sqrt(Config.PREVIEW_MAX_PIXELS / (width * height)))
+    return max(int(width * scale), 1), max(int(height * scale), 1)
+
+
+def embedded_thumbnail(data, min_size: int) -> Optional[Image.Image]:
+    """
+    The first page's embedded /Thumb image if its long edge is at least ``min_size``
+
+    Only 8-bit DeviceRGB/DeviceGray thumbnails (raw, Flate or DCT) of
+    unrotated pages are used, and only when the image really has its
+    declared /Width and /Height; anything else returns None. The image is
+    scaled down to the preview limits like a rendered page. JPEGs are
+    decoded at a reduced scale (``draft``), so nothing much larger than the
+    preview is ever decoded.
+
+    Args:
+        data: PDF content (bytes or mmap)
+    """
+    try:
+        reader = PdfStructureReader(data)
+        thumb = reader.first_page_thumbnail()
+        if thumb is None or reader.first_page_rotation() != 0:
+            return None
+
+        width, height = reader.resolve(thumb.get('Width')), reader.resolve(thumb.get('Height'))
+        if not isinstance(width, int) or not isinstance(height, int) or \
+                min(width, height) <= 0 or max(width, height) < min_size:
+            return None
+        bounds = preview_bounds(width, height)
+
+        filters = reader.resolve(thumb.get('Filter'))
+        filters = filters if isinstance(filters, list) else [filters] if filters else []
+        if filters in (['DCTDecode'], ['DCT']):
+            with Image.open(BytesIO(bytes(thumb.raw))) as image:
+                if image.format != 'JPEG' or image.size != (width, height):
+                    return None
+                image.draft('RGB', bounds)
+                image = image.convert('RGB')
+        else:
+            mode = {'DeviceRGB': 'RGB', 'RGB': 'RGB', 'DeviceGray': 'L', 'G': 'L'}.get(
+                reader.resolve(thumb.get('ColorSpace'))
+            )
+            if mode is None or reader.resolve(thumb.get('BitsPerComponent', 8)) != 8:
+                return None
+            expected = width * height * len(mode)
+            # Some writers pad the stream; anything much longer is not this image
+            pixels = reader.stream_data(thumb, max_bytes=expected + 1024)
+            if len(pixels) < expected:
+                return None
+            image = Image.frombytes(mode, (width, height), pixels).convert('RGB')
+
+        image.thumbnail(bounds, Image.LANCZOS, reducing_gap=2.0)
+        return image
+    except Exception as e:
+        logger.debug(f"Embedded thumbnail not usable: {e}")
+        return None
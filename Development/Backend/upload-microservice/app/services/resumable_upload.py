@@ -0,0 +1,312 @@
+"""
+Resumable chunked uploads
+
+A client opens a session, PUTs fixed-size chunks at explicit byte offsets and
+finalizes once everything has arrived. Every chunk is stored straight away as
+one part of a MinIO multipart upload into the quarantine prefix, so an
+interrupted client only re-sends what MinIO does not have yet: the current
+offset is always derived from the parts MinIO reports, never from local state.
+
+Session documents live in MinIO under ``Config.SESSIONS_FOLDER`` so that
+chunks can land on any gunicorn worker. Completing a session takes an
+exclusive claim on it first, so two concurrent finalize calls never both
+process the file. A background sweep aborts the multipart uploads of
+sessions that expired without being finalized.
+"""
+import datetime
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from minio.datatypes import Part
+from minio.error import S3Error
+
+from app.config.config import Config
+from app.services.document_store import JsonDocumentStore
+from app.services.storage import storage_service
+
+logger = logging.getLogger(__name__)
+
+SESSION_UPLOADING = 'uploading'
+SESSION_FINALIZING = 'finalizing'
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _failure(error: str, error_code: str, **extra) -> Dict:
+    return {'success': False, 'error': error, 'error_code': error_code, **extra}
+
+
+class ResumableUploadService:
+    """Create, fill and complete resumable upload sessions"""
+
+    def __init__(self, chunk_size: int = None, max_size: int = None, ttl: int = None,
+                 store: Optional[JsonDocumentStore] = None):
+        self.chunk_size = chunk_size or Config.RESUMABLE_CHUNK_SIZE
+        self.max_size = max_size or Config.RESUMABLE_MAX_SIZE
+        self.ttl = ttl or Config.RESUMABLE_SESSION_TTL
+        self.store = store or JsonDocumentStore(Config.SESSIONS_FOLDER)
+        self._sweeper = None
+        self._lock = threading.Lock()
+
+    def create_session(self, user_id: str, filename: str, size: int,
+                       validated_data: Dict) -> Dict:
+        """
+        Open a session and the MinIO multipart upload behind it
+
+        Args:
+            user_id: Owner of the session
+            filename: Sanitized original filename
+            size: Total size of the file in bytes, declared up front
+            validated_data: Validated category, subcategory, tags and visibility
+
+        Returns:
+            dict: ``success``, ``error``, ``error_code`` and ``session``
+        """
+        if size <= 0:
+            return _failure("Empty file uploaded", 'FILE_ERROR')
+        if size > self.max_size:
+            return _failure(
+                f"File too large. Maximum size is {self.max_size // (1024 * 1024)}MB", 'FILE_ERROR'
+            )
+
+        file_id = str(uuid.uuid4())
+        try:
+            upload_id = storage_service.start_staged_multipart(file_id, filename)
+        except Exception as e:
+            logger.error(f"MinIO error opening upload session for {filename}: {e}")
+            return _failure(f"Failed to upload file: {str(e)}", 'STORAGE_ERROR')
+
+        created_at = _now()
+        session = {
+            'session_id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'file_id': file_id,
+            'upload_id': upload_id,
+            'filename': filename,
+            'validated_data': validated_data,
+            'size': size,
+            'chunk_size': self.chunk_size,
+            'status': SESSION_UPLOADING,
+            'created_at': created_at.isoformat(),
+            'expires_at': (created_at + datetime.timedelta(seconds=self.ttl)).isoformat()
+        }
+        self.store.save(session['session_id'], session)
+        logger.info(f"Resumable upload session {session['session_id']} opened for "
+                    f"{filename} ({size} bytes)")
+        return {'success': True, 'error': None, 'error_code': None,
+                'session': self._describe(session, 0)}
+
+    def get_session(self, session_id: str, user_id: str) -> Dict:
+        """Return the session with the offset the client must resume from"""
+        session, failure = self._load(session_id, user_id)
+        if failure:
+            return failure
+        try:
+            offset = self._offset(session, self._parts(session))
+        except S3Error as e:
+            return self._storage_failure(session, e)
+        return {'success': True, 'error': None, 'error_code': None,
+                'session': self._describe(session, offset)}
+
+    def upload_chunk(self, session_id: str, user_id: str, offset: int, data: bytes) -> Dict:
+        """
+        Store the chunk starting at ``offset``
+
+        Offsets must fall on a chunk boundary no later than the current
+        offset; re-sending an already stored chunk simply replaces it. Every
+        chunk is exactly ``chunk_size`` bytes except the last one.
+
+        Returns:
+            dict: ``success``, ``error``, ``error_code`` and ``session``;
+            ``OFFSET_MISMATCH`` failures carry the current ``offset``
+        """
+        session, failure = self._load(session_id, user_id)
+        if failure:
+            return failure
+        if session['status'] != SESSION_UPLOADING:
+            return _failure("Upload session is already being finalized", 'OFFSET_MISMATCH',
+                            offset=session['size'])
+
+        chunk_size = session['chunk_size']
+        try:
+            current = self._offset(session, self._parts(session))
+        except S3Error as e:
+            return self._storage_failure(session, e)
+
+        if offset < 0 or offset % chunk_size or offset > current or offset >= session['size']:
+            return _failure(f"Chunk must start at offset {current}", 'OFFSET_MISMATCH',
+                            offset=current)
+
+        expected = min(chunk_size, session['size'] - offset)
+        if len(data) != expected:
+            return _failure(f"Chunk at offset {offset} must be {expected} bytes, got {len(data)}",
+                            'VALIDATION_ERROR')
+
+        part_number = offset // chunk_size + 1
+        try:
+            storage_service.upload_staged_part(session['file_id'], session['upload_id'],
+                                               part_number, data)
+            current = self._offset(session, self._parts(session))
+        except S3Error as e:
+            return self._storage_failure(session, e)
+
+        return {'success': True, 'error': None, 'error_code': None,
+                'session': self._describe(session, current)}
+
+    def complete(self, session_id: str, user_id: str) -> Dict:
+        """
+        Assemble the parts into ``quarantine/<file_id>.pdf``
+
+        The session is marked as finalizing so no more chunks are accepted;
+        the caller runs the processing pipeline and then ``discard()``s it.
+
+        Returns:
+            dict: ``success``, ``error``, ``error_code``, ``session`` and the
+            full session ``record`` (filename and validated form data)
+        """
+        session, failure = self._load(session_id, user_id)
+        if failure:
+            return failure
+        if session['status'] != SESSION_UPLOADING or not self.store.claim(session_id):
+            return _failure("Upload session is already being finalized", 'OFFSET_MISMATCH',
+                            offset=session['size'])
+
+        try:
+            parts = self._parts(session)
+            offset = self._offset(session, parts)
+            if offset != session['size']:
+                self.store.release_claim(session_id)
+                return _failure(f"Upload incomplete: {offset} of {session['size']} bytes received",
+                                'OFFSET_MISMATCH', offset=offset)
+
+            storage_service.complete_staged_multipart(
+                session['file_id'], session['upload_id'],
+                [Part(part.part_number, part.etag) for part in parts]
+            )
+        except S3Error as e:
+            self.store.release_claim(session_id)
+            return self._storage_failure(session, e)
+
+        session['status'] = SESSION_FINALIZING
+        self.store.save(session_id, session)
+        logger.info(f"Resumable upload session {session_id} assembled as {session['file_id']}")
+        return {'success': True, 'error': None, 'error_code': None,
+                'session': self._describe(session, session['size']), 'record': session}
+
+    def abort(self, session_id: str, user_id: str) -> Dict:
+        """Cancel a session and drop the parts uploaded so far"""
+        session, failure = self._load(session_id, user_id)
+        if failure:
+            return failure
+        self._expire(session)
+        logger.info(f"Resumable upload session {session_id} aborted")
+        return {'success': True, 'error': None, 'error_code': None}
+
+    def discard(self, session_id: str):
+        """Forget a finalized session"""
+        try:
+            self.store.delete(session_id)
+            self.store.release_claim(session_id)
+        except Exception as e:
+            logger.warning(f"Could not remove upload session {session_id}: {e}")
+
+    def sweep_expired(self) -> int:
+        """
+        Abort expired sessions and multipart uploads no session owns any more
+
+        Returns:
+            int: Number of sessions expired
+        """
+        now = _now()
+        expired = 0
+        for session_id in list(self.store.keys()):
+            session = self.store.load(session_id)
+            if (session is not None and session['status'] == SESSION_UPLOADING and
+                    datetime.datetime.fromisoformat(session['expires_at']) < now):
+                self._expire(session)
+                expired += 1
+        # Every session older than the TTL has expired, so these uploads are orphans
+        orphans = storage_service.abort_stale_multipart(now - datetime.timedelta(seconds=self.ttl))
+        if expired or orphans:
+            logger.info(f"Expired {expired} upload sessions, aborted {orphans} orphaned multipart uploads")
+        return expired
+
+    def start_sweeper(self, interval: float):
+        """Run ``sweep_expired`` every ``interval`` seconds on a daemon thread (0 disables)"""
+        with self._lock:
+            if self._sweeper is not None or interval <= 0:
+                return
+            self._sweeper = threading.Thread(
+                target=self._sweep_forever, args=(interval,), name='upload-session-sweeper', daemon=True
+            )
+            self._sweeper.start()
+
+    def _sweep_forever(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.sweep_expired()
+            except Exception as e:
+                logger.warning(f"Upload session sweep failed: {e}")
+
+    def _load(self, session_id: str, user_id: str):
+        session = self.store.load(session_id)
+        if session is None or session.get('user_id') != user_id:
+            return None, _failure("Upload session not found", 'NOT_FOUND')
+        if (session['status'] == SESSION_UPLOADING and
+                datetime.datetime.fromisoformat(session['expires_at']) < _now()):
+            self._expire(session)
+            return None, _failure("Upload session not found", 'NOT_FOUND')
+        return session, None
+
+    def _expire(self, session: Dict):
+        if session['status'] == SESSION_UPLOADING:
+            storage_service.abort_staged_multipart(session['file_id'], session['upload_id'])
+        self.discard(session['session_id'])
+
+    def _parts(self, session: Dict):
+        parts = storage_service.list_staged_parts(session['file_id'], session['upload_id'])
+        return sorted(parts, key=lambda part: part.part_number)
+
+    @staticmethod
+    def _offset(session: Dict, parts) -> int:
+        """Bytes received without gaps from the start of the file"""
+        offset = 0
+        for expected_number, part in enumerate(parts, start=1):
+            if part.part_number != expected_number:
+                break
+            offset += part.size
+            if part.size != session['chunk_size']:
+                break
+        return min(offset, session['size'])
+
+    def _storage_failure(self, session: Dict, error: Exception) -> Dict:
+        logger.error(f"MinIO error in upload session {session['session_id']}: {error}")
+        if getattr(error, 'code', None) == 'NoSuchUpload':
+            self.discard(session['session_id'])
+            return _failure("Upload session not found", 'NOT_FOUND')
+        return _failure(f"Failed to upload file: {str(error)}", 'STORAGE_ERROR')
+
+    @staticmethod
+    def _describe(session: Dict, offset: int) -> Dict:
+        """Public view of a session"""
+        return {
+            'session_id': session['session_id'],
+            'file_id': session['file_id'],
+            'filename': session['filename'],
+            'size': session['size'],
+            'offset': offset,
+            'chunk_size': session['chunk_size'],
+            'status': session['status'],
+            'created_at': session['created_at'],
+            'expires_at': session['expires_at']
+        }
+
+
+# Global instance
+resumable_upload_service = ResumableUploadService()
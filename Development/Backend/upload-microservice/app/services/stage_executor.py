@@ -0,0 +1,226 @@
+"""
+Dependency-aware stage executor for the upload pipeline
+
+Stages declare which other stages they require. Independent stages run
+concurrently on a shared thread pool (I/O and subprocess work) or on
+isolated worker processes (pure-Python CPU work on untrusted files, with a
+timeout and memory cap per task; see ``app.services.worker_pool``). A gate stage - the virus scan - can veto the
+run: once it fails, nothing new is scheduled and the results of anything
+that already started are thrown away.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from app.config.config import Config
+from app.services.admission import admission_controller
+from app.services.worker_pool import IsolatedProcessPool
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    One unit of pipeline work
+
+    Args:
+        name: Unique stage name, used as the key in the results
+        func: Callable run as ``func(*args, *dependency_results)``
+        args: Positional arguments bound up front
+        requires: Names of stages whose results are appended to ``args``
+        after: Names of stages that must succeed first (ordering only)
+        pool: ``'thread'`` or ``'process'`` (func and args must be picklable;
+            the stage fails with ``WorkerTimeoutError`` or ``WorkerCrashedError``
+            when the worker has to be killed)
+        slot: Admission control stage whose concurrency limit applies
+    """
+
+    def __init__(self, name: str, func: Callable, args: Tuple = (),
+                 requires: Iterable[str] = (), after: Iterable[str] = (),
+                 pool: str = 'thread', slot: Optional[str] = None):
+        if pool not in ('thread', 'process'):
+            raise ValueError(f"Unknown pool '{pool}' for stage {name}")
+        self.name = name
+        self.func = func
+        self.args = tuple(args)
+        self.requires = tuple(requires)
+        self.after = tuple(after)
+        self.pool = pool
+        self.slot = slot
+
+    @property
+    def dependencies(self) -> Tuple[str, ...]:
+        return self.requires + self.after
+
+
+class StageRun:
+    """Outcome of ``StageExecutor.run``"""
+
+    def __init__(self):
+        self.results: Dict = {}
+        self.errors: Dict[str, Exception] = {}
+        self.skipped = set()
+        self.durations: Dict[str, float] = {}
+        self.rejected = False
+
+    def succeeded(self, name: str) -> bool:
+        return name in self.results
+
+
+class StageExecutor:
+    """Run stage graphs on a shared thread pool and isolated worker processes"""
+
+    def __init__(self, thread_workers: int = 8, process_workers: int = 2,
+                 inline: bool = False):
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self.inline = inline
+        self._thread_pool = None
+        self._process_pool = None
+        self._lock = threading.Lock()
+
+    def run(self, stages: Iterable[Stage], gate: Optional[str] = None,
+            gate_check: Optional[Callable] = None,
+            on_stage: Optional[Callable] = None) -> StageRun:
+        """
+        Execute ``stages`` honouring their dependencies
+
+        Args:
+            stages: Stages in declaration order (inline mode runs them in that order)
+            gate: Name of the stage that may veto the run
+            gate_check: Predicate on the gate's result; falsy rejects the run
+            on_stage: Progress callback ``on_stage(name, status)`` with status
+                'running', 'done', 'failed' or 'skipped'; called from this thread
+
+        Returns:
+            StageRun with results, errors, skipped stages and timings
+        """
+        pending = {stage.name: stage for stage in stages}
+        unknown = {dep for s in pending.values() for dep in s.dependencies} - set(pending)
+        if unknown:
+            raise ValueError(f"Stages require undeclared stages: {sorted(unknown)}")
+
+        run = StageRun()
+        in_flight: Dict[Future, str] = {}
+        started: Dict[str, float] = {}
+        notify = on_stage or (lambda name, status: None)
+
+        def skip(names):
+            for name in names:
+                run.skipped.add(name)
+                notify(name, 'skipped')
+
+        while pending or in_flight:
+            for name, stage in list(pending.items()):
+                if any(dep in run.errors or dep in run.skipped for dep in stage.dependencies):
+                    del pending[name]
+                    skip([name])
+                elif all(dep in run.results for dep in stage.dependencies):
+                    started[name] = time.perf_counter()
+                    notify(name, 'running')
+                    in_flight[self._submit(stage, run.results)] = name
+                    del pending[name]
+
+            if not in_flight:
+                skip(list(pending))
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = in_flight.pop(future)
+                run.durations[name] = time.perf_counter() - started[name]
+                try:
+                    run.results[name] = future.result()
+                    notify(name, 'done')
+                except Exception as e:
+                    logger.warning(f"Stage '{name}' failed: {e}")
+                    run.errors[name] = e
+                    notify(name, 'failed')
+
+                if name == gate and (name in run.errors or
+                                     (gate_check and not gate_check(run.results[name]))):
+                    run.rejected = True
+
+            if run.rejected:
+                # Drop speculative work; running tasks finish in the background
+                for future in in_flight:
+                    future.cancel()
+                skip(list(in_flight.values()) + list(pending))
+                run.results = {gate: run.results[gate]} if gate in run.results else {}
+                break
+
+        logger.debug("Stage timings: " + ", ".join(
+            f"{name}={duration * 1000:.0f}ms" for name, duration in run.durations.items()
+        ))
+        return run
+
+    def submit(self, func: Callable, *args, pool: str = 'thread') -> Future:
+        """Run a single call on the shared pools (for callers outside a stage graph)"""
+        return self._submit(Stage(getattr(func, '__name__', 'call'), func, args, pool=pool), {})
+
+    def shutdown(self, wait_for_tasks: bool = True):
+        with self._lock:
+            if self._thread_pool:
+                self._thread_pool.shutdown(wait=wait_for_tasks)
+                self._thread_pool = None
+            if self._process_pool:
+                self._process_pool.shutdown()
+                self._process_pool = None
+
+    def _submit(self, stage: Stage, results: Dict) -> Future:
+        args = stage.args + tuple(results[dep] for dep in stage.requires)
+
+        if self.inline:
+            future = Future()
+            try:
+                with admission_controller.stage(stage.slot):
+                    future.set_result(self._call(stage, args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        if stage.slot:
+            # Wait for the slot on a pool thread, never on the scheduler
+            return self._get_thread_pool().submit(self._run_admitted, stage, args)
+        # Process stages also get a thread, which waits on the worker
+        return self._get_thread_pool().submit(self._call, stage, args)
+
+    def _run_admitted(self, stage: Stage, args: Tuple):
+        with admission_controller.stage(stage.slot):
+            return self._call(stage, args)
+
+    def _call(self, stage: Stage, args: Tuple):
+        if stage.pool == 'process':
+            return self._get_process_pool().call(stage.func, *args)
+        return stage.func(*args)
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(
+                    max_workers=self.thread_workers, thread_name_prefix='upload-stage'
+                )
+            return self._thread_pool
+
+    def _get_process_pool(self) -> IsolatedProcessPool:
+        with self._lock:
+            if self._process_pool is None:
+                self._process_pool = IsolatedProcessPool(
+                    'stage',
+                    size=self.process_workers,
+                    timeout=Config.STAGE_PROCESS_TIMEOUT,
+                    memory_limit=Config.STAGE_PROCESS_MEMORY_LIMIT_MB * 1024 * 1024,
+                    max_tasks=Config.STAGE_PROCESS_MAX_TASKS,
+                    start_method=Config.STAGE_PROCESS_START_METHOD
+                )
+            return self._process_pool
+
+
+# Global instance
+stage_executor = StageExecutor(
+    thread_workers=Config.STAGE_THREAD_WORKERS,
+    process_workers=Config.STAGE_PROCESS_WORKERS,
+    inline=Config.UPLOAD_STAGE_MODE == 'sequential'
+)
@@ -7,8 +7,11 @@ import logging
 from urllib.parse import urlparse, urlunparse
 from minio.error import S3Error
 from minio import Minio
+from minio.commonconfig import CopySource, REPLACE
 from app.client.minio_client import get_minio_client
+from app.client.minio_lowlevel import MinioLowLevel
 from app.config.config import Config
+from app.services.content_index import content_index
 import datetime
 
 logger = logging.getLogger(__name__)
@@ -18,41 +21,84 @@ class StorageService:
     
     def __init__(self):
         self.client = get_minio_client()
+        self.multipart = MinioLowLevel(self.client)
         self.bucket_name = Config.MINIO_BUCKET
 
     def _get_object_path(self, file_id: str, visibility: str) -> str:
         """Helper to build object path within bucket"""
         return f"{visibility}/{file_id}.pdf"
 
-    def upload_pdf(self, file_buffer, visibility='public', filename=None):
+    def _get_quarantine_path(self, file_id: str) -> str:
+        """Helper to build the staging path used before a file is scanned"""
+        return f"{Config.QUARANTINE_FOLDER}/{file_id}.pdf"
+
+    def _get_blob_path(self, content_hash: str, visibility: str) -> str:
+        """Helper to build the shared, content-addressed path of a deduplicated PDF"""
+        return f"{visibility}/blobs/{content_hash}.pdf"
+
+    @staticmethod
+    def get_text_object_path(object_path: str) -> str:
+        """Path of the NDJSON full text stored next to a PDF"""
+        base = object_path[:-len('.pdf')] if object_path.endswith('.pdf') else object_path
+        return f"{base}.text.ndjson"
+
+    def resolve_object_path(self, file_id: str, visibility: str):
+        """
+        Object path backing a file id, following deduplication aliases
+
+        Returns None when the file id is an alias of another visibility.
+        """
+        alias = content_index.get_alias(file_id) if Config.UPLOAD_DEDUP else None
+        if alias is None:
+            return self._get_object_path(file_id, visibility)
+        if alias['visibility'] != visibility:
+            return None
+        return alias['object_path']
+
+    def _build_file_url(self, object_path: str, visibility: str):
+        """Public URL for public objects, None for private ones"""
+        if visibility != 'public':
+            return None
+        protocol = 'https' if Config.MINIO_SECURE else 'http'
+        return f"{protocol}://{Config.PUBLIC_MINIO_HOST}/{self.bucket_name}/{object_path}"
+
+    def upload_pdf(self, file_buffer, visibility='public', filename=None, content_hash=None):
         """
         Upload PDF file to MinIO storage
+
+        With ``content_hash`` the bytes are stored once at the content-addressed
+        blob path and the new file id is registered as a reference to it.
         """
         try:
             file_id = str(uuid.uuid4())
-            object_path = self._get_object_path(file_id, visibility)
+            if content_hash:
+                object_path = self._get_blob_path(content_hash, visibility)
+            else:
+                object_path = self._get_object_path(file_id, visibility)
 
-            file_stream = BytesIO(file_buffer)
             file_size = len(file_buffer)
 
-            self.client.put_object(
-                bucket_name=self.bucket_name,
-                object_name=object_path,
-                data=file_stream,
-                length=file_size,
-                content_type='application/pdf',
-                metadata={
-                    'original_filename': filename or 'unknown.pdf',
-                    'visibility': visibility,
-                    'file_id': file_id
-                }
-            )
+            def store(path):
+                self.client.put_object(
+                    bucket_name=self.bucket_name,
+                    object_name=path,
+                    data=BytesIO(file_buffer),
+                    length=file_size,
+                    content_type='application/pdf',
+                    metadata={
+                        'original_filename': filename or 'unknown.pdf',
+                        'visibility': visibility,
+                        'file_id': file_id
+                    }
+                )
+
+            store(object_path)
+            if content_hash and not self.claim_blob(content_hash, file_id, visibility, object_path, filename):
+                # The shared blob is being deleted right now: keep a copy of its own
+                object_path = self._get_object_path(file_id, visibility)
+                store(object_path)
 
-            file_url = None
-            if visibility == 'public':
-                protocol = 'https' if Config.MINIO_SECURE else 'http'
-                public_endpoint = Config.PUBLIC_MINIO_HOST
-                file_url = f"{protocol}://{public_endpoint}/{self.bucket_name}/{object_path}"
+            file_url = self._build_file_url(object_path, visibility)
 
             logger.info(f"File uploaded successfully: {file_id} ({visibility})")
             return {
@@ -70,13 +116,257 @@ class StorageService:
             logger.error(f"Unexpected error uploading file: {e}")
             return {'success': False, 'error': f'Upload error: {str(e)}'}
 
+    def upload_stream(self, stream, file_id, filename=None):
+        """
+        Upload a PDF of unknown length into the quarantine prefix.
+
+        The stream is consumed with MinIO multipart uploads of
+        ``Config.MINIO_PART_SIZE``, so only one part is buffered at a time.
+        Errors are raised to the caller.
+        """
+        object_path = self._get_quarantine_path(file_id)
+        self.client.put_object(
+            bucket_name=self.bucket_name,
+            object_name=object_path,
+            data=stream,
+            length=-1,
+            part_size=Config.MINIO_PART_SIZE,
+            content_type='application/pdf',
+            metadata={
+                'original_filename': filename or 'unknown.pdf',
+                'file_id': file_id
+            }
+        )
+        return object_path
+
+    def open_staged(self, file_id):
+        """
+        Open a quarantined object for reading
+
+        The caller must ``close()`` and ``release_conn()`` the response.
+        """
+        return self.client.get_object(self.bucket_name, self._get_quarantine_path(file_id))
+
+    def get_staged_upload_url(self, file_id, expires_in=900):
+        """
+        Presigned PUT URL that lets a client upload straight into quarantine
+        """
+        return self._public_client().presigned_put_object(
+            self.bucket_name,
+            self._get_quarantine_path(file_id),
+            expires=datetime.timedelta(seconds=expires_in)
+        )
+
+    def stat_staged(self, file_id):
+        """Return the size of a quarantined object, or None if it does not exist"""
+        try:
+            return self.client.stat_object(self.bucket_name, self._get_quarantine_path(file_id)).size
+        except S3Error:
+            return None
+
+    def start_staged_multipart(self, file_id, filename=None):
+        """Begin a client-driven multipart upload into the quarantine prefix"""
+        headers = {
+            'Content-Type': 'application/pdf',
+            'x-amz-meta-original_filename': filename or 'unknown.pdf',
+            'x-amz-meta-file_id': file_id
+        }
+        return self.multipart.create_multipart_upload(
+            self.bucket_name, self._get_quarantine_path(file_id), headers
+        )
+
+    def upload_staged_part(self, file_id, upload_id, part_number, data):
+        """Store one part of a multipart upload; returns its ETag"""
+        return self.multipart.upload_part(
+            self.bucket_name, self._get_quarantine_path(file_id), upload_id, part_number, data
+        )
+
+    def list_staged_parts(self, file_id, upload_id):
+        """Return every part MinIO holds for a multipart upload, in order"""
+        return self.multipart.list_parts(self.bucket_name, self._get_quarantine_path(file_id), upload_id)
+
+    def complete_staged_multipart(self, file_id, upload_id, parts):
+        """Assemble the listed parts into the quarantined object"""
+        return self.multipart.complete_multipart_upload(
+            self.bucket_name, self._get_quarantine_path(file_id), upload_id, parts
+        )
+
+    def abort_staged_multipart(self, file_id, upload_id):
+        try:
+            self.multipart.abort_multipart_upload(
+                self.bucket_name, self._get_quarantine_path(file_id), upload_id
+            )
+            return True
+        except Exception as e:
+            logger.warning(f"Could not abort multipart upload for {file_id}: {e}")
+            return False
+
+    def abort_stale_multipart(self, older_than):
+        """
+        Abort multipart uploads into quarantine started before ``older_than``
+
+        Catches uploads no session points at any more (e.g. a worker died
+        between opening the upload and saving the session).
+
+        Returns:
+            int: Number of uploads aborted
+        """
+        aborted = 0
+        for upload in self.multipart.list_multipart_uploads(self.bucket_name, f"{Config.QUARANTINE_FOLDER}/"):
+            if upload.initiated_time is None or upload.initiated_time >= older_than:
+                continue
+            try:
+                self.multipart.abort_multipart_upload(self.bucket_name, upload.object_name, upload.upload_id)
+                aborted += 1
+            except S3Error as e:
+                logger.warning(f"Could not abort stale multipart upload {upload.object_name}: {e}")
+        return aborted
+
+    def promote_file(self, file_id, visibility='public', filename=None, size_bytes=None,
+                     content_hash=None, scanned_etag=None):
+        """
+        Move a scanned file out of quarantine with a server-side copy
+
+        With ``scanned_etag`` the copy only succeeds if the quarantined
+        object still holds the bytes that were scanned; a client that
+        overwrites it through a still valid presigned URL makes it fail.
+        """
+        try:
+            staged_path = self._get_quarantine_path(file_id)
+            if content_hash:
+                object_path = self._get_blob_path(content_hash, visibility)
+            else:
+                object_path = self._get_object_path(file_id, visibility)
+
+            def copy(path):
+                self.client.copy_object(
+                    self.bucket_name,
+                    path,
+                    CopySource(self.bucket_name, staged_path, match_etag=scanned_etag),
+                    metadata={
+                        'Content-Type': 'application/pdf',
+                        'original_filename': filename or 'unknown.pdf',
+                        'visibility': visibility,
+                        'file_id': file_id
+                    },
+                    metadata_directive=REPLACE
+                )
+
+            copy(object_path)
+            if content_hash and not self.claim_blob(content_hash, file_id, visibility, object_path, filename):
+                # The shared blob is being deleted right now: keep a copy of its own
+                object_path = self._get_object_path(file_id, visibility)
+                copy(object_path)
+            self.discard_staged(file_id)
+
+            logger.info(f"File promoted from quarantine: {file_id} ({visibility})")
+            return {
+                'success': True,
+                'file_id': file_id,
+                'file_url': self._build_file_url(object_path, visibility),
+                'object_path': object_path,
+                'size_bytes': size_bytes
+            }
+
+        except S3Error as e:
+            logger.error(f"MinIO error promoting file {file_id}: {e}")
+            return {'success': False, 'error': f'Storage error: {str(e)}'}
+        except Exception as e:
+            logger.error(f"Unexpected error promoting file {file_id}: {e}")
+            return {'success': False, 'error': f'Upload error: {str(e)}'}
+
+    def link_blob(self, content_hash, visibility='public', filename=None, size_bytes=None):
+        """
+        Create a new file id that points at an already stored blob
+
+        If the blob only exists under the other visibility it is copied
+        server-side, so no PDF bytes pass through this service.
+        """
+        try:
+            object_path = self._get_blob_path(content_hash, visibility)
+            if not self._object_exists(object_path):
+                other = 'private' if visibility == 'public' else 'public'
+                source_path = self._get_blob_path(content_hash, other)
+                if not self._object_exists(source_path):
+                    return {'success': False, 'error': 'Shared blob is missing'}
+                self.client.copy_object(
+                    self.bucket_name, object_path, CopySource(self.bucket_name, source_path)
+                )
+
+            file_id = str(uuid.uuid4())
+            if not self.claim_blob(content_hash, file_id, visibility, object_path, filename):
+                return {'success': False, 'error': 'Shared blob is being deleted'}
+
+            logger.info(f"File {file_id} linked to existing blob {content_hash[:12]}… ({visibility})")
+            return {
+                'success': True,
+                'file_id': file_id,
+                'file_url': self._build_file_url(object_path, visibility),
+                'object_path': object_path,
+                'size_bytes': size_bytes
+            }
+
+        except S3Error as e:
+            logger.error(f"MinIO error linking blob {content_hash}: {e}")
+            return {'success': False, 'error': f'Storage error: {str(e)}'}
+        except Exception as e:
+            logger.error(f"Unexpected error linking blob {content_hash}: {e}")
+            return {'success': False, 'error': f'Upload error: {str(e)}'}
+
+    def claim_blob(self, content_hash, file_id, visibility, object_path, filename=None):
+        """
+        Register ``file_id`` as a reference to a stored blob
+
+        Returns False, leaving no reference behind, when a concurrent delete
+        has tombstoned or already removed the blob (see ``ContentIndex``).
+        """
+        if not content_index.claim_reference(content_hash, file_id, visibility, object_path, filename):
+            return False
+        if not self._object_exists(object_path):
+            content_index.withdraw_reference(content_hash, file_id, visibility)
+            return False
+        return True
+
+    def _object_exists(self, object_path):
+        try:
+            self.client.stat_object(self.bucket_name, object_path)
+            return True
+        except S3Error:
+            return False
+
+    def discard_staged(self, file_id):
+        """Remove a quarantined object (rejected or abandoned upload)"""
+        try:
+            self.client.remove_object(self.bucket_name, self._get_quarantine_path(file_id))
+            return True
+        except Exception as e:
+            logger.warning(f"Could not remove quarantined file {file_id}: {e}")
+            return False
+
     def delete_file(self, file_id, visibility='public'):
         """
         Delete file from storage
         """
         try:
+            alias = content_index.get_alias(file_id) if Config.UPLOAD_DEDUP else None
+            if alias is not None:
+                if alias['visibility'] != visibility:
+                    return False
+                released = content_index.release(alias)
+                if released['blob_orphaned']:
+                    try:
+                        self.client.remove_object(self.bucket_name, alias['object_path'])
+                        self.client.remove_object(
+                            self.bucket_name, self.get_text_object_path(alias['object_path'])
+                        )
+                    finally:
+                        content_index.finish_removal(alias['sha256'], alias['visibility'])
+                logger.info(f"File reference deleted successfully: {file_id}")
+                return True
+
             object_path = self._get_object_path(file_id, visibility)
             self.client.remove_object(self.bucket_name, object_path)
+            self.client.remove_object(self.bucket_name, self.get_text_object_path(object_path))
             logger.info(f"File deleted successfully: {file_id}")
             return True
         except S3Error as e:
@@ -86,9 +376,21 @@ class StorageService:
             logger.error(f"Unexpected error deleting file {file_id}: {e}")
             return False
 
+    def _public_client(self):
+        """Client signing URLs for the host browsers reach MinIO on"""
+        return Minio(
+            endpoint=Config.PUBLIC_MINIO_HOST,
+            access_key=Config.MINIO_ACCESS_KEY,
+            secret_key=Config.MINIO_SECRET_KEY,
+            secure=False
+        )
+
     def get_presigned_url(self, file_id, visibility='private', expires_in=3600):
 
-        object_path = f"{visibility}/{file_id}.pdf"
+        object_path = self.resolve_object_path(file_id, visibility)
+        if object_path is None:
+            logger.error(f"File not found: {file_id} ({visibility})")
+            return None
 
         try:
             self.client.stat_object(self.bucket_name, object_path)
@@ -97,19 +399,7 @@ class StorageService:
             return None
 
         try:
-            public_client = Minio(
-            endpoint=Config.PUBLIC_MINIO_HOST,
-            access_key=Config.MINIO_ACCESS_KEY,
-            secret_key=Config.MINIO_SECRET_KEY,
-            secure=False
-)
-
-            url = public_client.presigned_get_object(
-            self.bucket_name,
-            object_path,
-            expires=datetime.timedelta(seconds=expires_in)
-            )
-            return url
+            return self.get_presigned_object_url(object_path, expires_in)
 
         except S3Error as e:
             logger.error(f"Error generating presigned URL for {file_id}: {e}")
@@ -119,8 +409,16 @@ class StorageService:
             logger.error(f"Error generating presigned URL for {file_id}: {e}")
             return None
 
+    def get_presigned_object_url(self, object_path, expires_in=3600):
+        """Presigned GET URL of any object, e.g. a private file's page image (no existence check)"""
+        return self._public_client().presigned_get_object(
+            self.bucket_name,
+            object_path,
+            expires=datetime.timedelta(seconds=expires_in)
+        )
+
 
 storage_service = StorageService()
 
-def upload_file_to_storage(file_buffer, visibility='public', filename=None):
-    return storage_service.upload_pdf(file_buffer, visibility, filename)
+def upload_file_to_storage(file_buffer, visibility='public', filename=None, content_hash=None):
+    return storage_service.upload_pdf(file_buffer, visibility, filename, content_hash)
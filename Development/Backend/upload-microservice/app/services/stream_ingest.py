@@ -0,0 +1,294 @@
+"""
+Streaming ingest service
+
+Reads an upload once, in chunks, and fans every chunk out to:
+  - a ClamAV INSTREAM session
+  - a MinIO multipart upload into the quarantine prefix
+  - a running SHA-256
+  - a spool file on disk that the PDF parsers read afterwards
+
+No stage ever sees the whole file as a single ``bytes`` object.
+"""
+import hashlib
+import logging
+import os
+import queue
+import tempfile
+import threading
+import uuid
+
+from app.config.config import Config
+from app.services.virus_scanner import scanner
+from app.services.storage import storage_service
+
+logger = logging.getLogger(__name__)
+
+
+class PipeAbortedError(IOError):
+    """Raised when the other side of a ChunkPipe has given up"""
+
+
+class ChunkPipe:
+    """
+    Bounded, file-like bridge between the request thread (writer) and the
+    MinIO upload thread (reader). ``read()`` follows the usual contract:
+    it returns ``b''`` only at end of stream.
+    """
+
+    _EOF = object()
+
+    def __init__(self, max_chunks=16):
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._pending = b''
+        self._eof = False
+        self._aborted = threading.Event()
+
+    def write(self, chunk):
+        self._put(chunk)
+
+    def close(self):
+        self._put(self._EOF)
+
+    def abort(self):
+        """Unblock both sides; further reads and writes raise PipeAbortedError"""
+        self._aborted.set()
+
+    def _put(self, item):
+        while True:
+            if self._aborted.is_set():
+                raise PipeAbortedError("Reader side of the pipe was aborted")
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def read(self, size=-1):
+        chunks = [self._pending] if self._pending else []
+        available = len(self._pending)
+        self._pending = b''
+
+        while not self._eof and (size < 0 or available < size):
+            try:
+                item = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._aborted.is_set():
+                    raise PipeAbortedError("Writer side of the pipe was aborted")
+                continue
+            if item is self._EOF:
+                self._eof = True
+                break
+            chunks.append(item)
+            available += len(item)
+
+        data = b''.join(chunks)
+        if 0 <= size < len(data):
+            data, self._pending = data[:size], data[size:]
+        return data
+
+
+class StreamingIngest:
+    """Single-pass upload ingest"""
+
+    def __init__(self, chunk_size=None, max_size=None):
+        self.chunk_size = chunk_size or Config.STREAM_CHUNK_SIZE
+        self.max_size = max_size or Config.MAX_CONTENT_LENGTH
+
+    def ingest(self, stream, filename=None, file_id=None, staged=False, max_size=None):
+        """
+        Consume ``stream`` and run scan, staging upload and hashing concurrently
+
+        Args:
+            stream: Readable binary file object (e.g. ``FileStorage.stream``)
+            filename: Sanitized original filename
+            file_id: Reuse this id instead of generating one
+            staged: The bytes already sit in the quarantine prefix (resumable
+                and direct uploads); skip the staging upload and leave the
+                staged object alone on failure
+            max_size: Override the size limit
+
+        Returns:
+            dict: ``success``, ``error``, ``file_id``, ``sha256``, ``size_bytes``,
+            ``scan_result`` and ``spool_path`` (caller must ``cleanup()``)
+        """
+        file_id = file_id or str(uuid.uuid4())
+        max_size = max_size or self.max_size
+        os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+        spool = tempfile.NamedTemporaryFile(
+            dir=Config.UPLOAD_FOLDER, prefix=f"{file_id}-", suffix='.pdf', delete=False
+        )
+        result = {
+            'success': False,
+            'error': None,
+            'file_id': file_id,
+            'sha256': None,
+            'size_bytes': 0,
+            'scan_result': None,
+            'spool_path': spool.name
+        }
+
+        pipe = None
+        uploader = None
+        upload_state = {'error': None}
+        if not staged:
+            pipe = ChunkPipe(Config.STREAM_QUEUE_DEPTH)
+            uploader = threading.Thread(
+                target=self._upload_worker,
+                args=(pipe, file_id, filename, upload_state),
+                daemon=True
+            )
+            uploader.start()
+
+        def abandon():
+            if pipe is not None:
+                pipe.abort()
+                uploader.join()
+                storage_service.discard_staged(file_id)
+            if clam_stream is not None:
+                clam_stream.close()
+            self.cleanup(result)
+
+        clam_stream, scan_result = self._open_scan()
+        sha256 = hashlib.sha256()
+        size = 0
+
+        try:
+            with spool:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+
+                    size += len(chunk)
+                    if size > max_size:
+                        result['error'] = (
+                            f"File too large. Maximum size is {max_size // (1024 * 1024)}MB"
+                        )
+                        break
+
+                    sha256.update(chunk)
+                    spool.write(chunk)
+
+                    if clam_stream is not None:
+                        try:
+                            clam_stream.write(chunk)
+                        except OSError as e:
+                            # clamd closes the socket on StreamMaxLength overrun
+                            logger.error(f"❌ Error streaming to ClamAV: {e}")
+                            clam_stream.close()
+                            clam_stream = None
+                            scan_result = {'clean': False, 'result': f'Scan error: {str(e)}'}
+
+                    if pipe is not None:
+                        pipe.write(chunk)
+
+            if result['error'] is None and size == 0:
+                result['error'] = "Empty file uploaded"
+
+            if pipe is not None and result['error'] is None:
+                pipe.close()
+        except PipeAbortedError:
+            pass
+        except Exception:
+            abandon()
+            raise
+
+        if uploader is not None and result['error'] is None:
+            uploader.join()
+            if upload_state['error'] is not None:
+                result['error'] = f"Failed to upload file: {upload_state['error']}"
+
+        if result['error'] is not None:
+            abandon()
+            return result
+
+        if clam_stream is not None:
+            try:
+                scan_result = clam_stream.finish()
+            except Exception as e:
+                logger.error(f"❌ Error reading ClamAV verdict: {e}")
+                scan_result = {'clean': False, 'result': f'Scan error: {str(e)}'}
+            else:
+                scan_result['signature'] = clam_stream.signature
+                scan_result = scanner.escalate(result['spool_path'], scan_result)
+
+        result.update({
+            'success': True,
+            'sha256': sha256.hexdigest(),
+            'size_bytes': size,
+            'scan_result': scan_result
+        })
+        if clam_stream is not None:
+            scanner.remember(result['sha256'], clam_stream.signature, scan_result)
+        logger.info(f"Streamed {size} bytes for {file_id} (sha256 {result['sha256'][:12]}…)")
+        return result
+
+    def cleanup(self, result):
+        """Remove the spool file left behind by ``ingest()``"""
+        spool_path = result.get('spool_path') if result else None
+        if spool_path:
+            try:
+                os.remove(spool_path)
+            except FileNotFoundError:
+                pass
+            result['spool_path'] = None
+
+    @staticmethod
+    def _open_scan():
+        try:
+            clam_stream = scanner.open_stream()
+        except Exception as e:
+            logger.error(f"❌ Error opening ClamAV stream: {e}")
+            return None, {'clean': False, 'result': f'Scan error: {str(e)}'}
+        return clam_stream, None
+
+    @staticmethod
+    def _upload_worker(pipe, file_id, filename, upload_state):
+        try:
+            storage_service.upload_stream(pipe, file_id, filename)
+        except PipeAbortedError as e:
+            upload_state['error'] = str(e)
+        except Exception as e:
+            logger.error(f"MinIO error streaming file {file_id}: {e}")
+            upload_state['error'] = str(e)
+            pipe.abort()
+
+
+def spool_upload(stream, chunk_size=None, max_size=None):
+    """
+    Copy an upload stream to a spool file in ``Config.UPLOAD_FOLDER``
+
+    Size limits are enforced while copying, with the same messages as
+    ``StreamingIngest``.
+
+    Returns:
+        dict: ``success``, ``error``, ``spool_path`` and ``size_bytes``
+    """
+    chunk_size = chunk_size or Config.STREAM_CHUNK_SIZE
+    max_size = max_size or Config.MAX_CONTENT_LENGTH
+    os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+
+    size = 0
+    error = None
+    with tempfile.NamedTemporaryFile(
+        dir=Config.UPLOAD_FOLDER, prefix='job-', suffix='.pdf', delete=False
+    ) as spool:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                error = f"File too large. Maximum size is {max_size // (1024 * 1024)}MB"
+                break
+            spool.write(chunk)
+
+    if error is None and size == 0:
+        error = "Empty file uploaded"
+    if error is not None:
+        os.remove(spool.name)
+        return {'success': False, 'error': error, 'spool_path': None, 'size_bytes': size}
+    return {'success': True, 'error': None, 'spool_path': spool.name, 'size_bytes': size}
+
+
+streaming_ingest = StreamingIngest()
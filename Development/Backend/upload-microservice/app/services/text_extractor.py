@@ -0,0 +1,232 @@
+"""
+Full-text extraction service
+
+Extracts the text of every page of a stored PDF in the background, after
+the upload has been answered, and stores it next to the PDF as NDJSON -
+one ``{"page": n, "text": "..."}`` line per page - for search and other
+downstream services.
+
+Pages are read one at a time by a generator, and large documents are split
+into ranges of ``TEXT_PAGES_PER_TASK`` pages that run in parallel on
+isolated worker processes (``app.services.worker_pool``). Each range is
+written to its own part file and the parts are streamed to MinIO in page
+order, so memory stays bounded whatever the page count.
+"""
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import PyPDF2
+from minio.error import S3Error
+
+from app.client.minio_client import get_minio_client
+from app.config.config import Config
+from app.services.metadata_extractor import extract_pdf_info_from_file
+from app.services.storage import storage_service
+from app.services.worker_pool import IsolatedProcessPool, WorkerCrashedError, WorkerTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+def iter_page_text(reader: PyPDF2.PdfReader, start: int = 0,
+                   stop: Optional[int] = None) -> Iterator[Tuple[int, str, Optional[str]]]:
+    """
+    Yield the text of pages ``start`` to ``stop`` (0-based, exclusive) one by one
+
+    Yields:
+        tuple: (1-based page number, text, error message or None)
+    """
+    page_count = len(reader.pages)
+    stop = page_count if stop is None else min(stop, page_count)
+    for index in range(start, stop):
+        try:
+            yield index + 1, reader.pages[index].extract_text(), None
+        except Exception as e:
+            logger.warning(f"Could not extract text of page {index + 1}: {e}")
+            yield index + 1, '', str(e)
+
+
+def extract_text_range(pdf_path: str, start: int, stop: Optional[int], out_path: str) -> int:
+    """
+    Write NDJSON lines for a range of pages to ``out_path`` (runs in a worker process)
+
+    Returns:
+        int: Number of pages written
+    """
+    reader = PyPDF2.PdfReader(pdf_path)
+    if reader.is_encrypted:
+        reader.decrypt('')
+
+    written = 0
+    with open(out_path, 'w', encoding='utf-8') as out:
+        for number, text, error in iter_page_text(reader, start, stop):
+            out.write(_page_line(number, text, error))
+            written += 1
+    return written
+
+
+def _page_line(number: int, text: str, error: Optional[str] = None) -> str:
+    line = {'page': number, 'text': text}
+    if error:
+        line['error'] = error
+    return json.dumps(line, ensure_ascii=False) + '\n'
+
+
+class _PartsReader:
+    """Read part files back to back as one stream (for MinIO multipart uploads)"""
+
+    def __init__(self, paths: List[str]):
+        self.paths = list(paths)
+        self.current = None
+
+    def read(self, size: int = -1) -> bytes:
+        chunks = []
+        while size != 0:
+            if self.current is None:
+                if not self.paths:
+                    break
+                self.current = open(self.paths.pop(0), 'rb')
+            chunk = self.current.read(size)
+            if not chunk:
+                self.current.close()
+                self.current = None
+                continue
+            chunks.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b''.join(chunks)
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+
+
+class TextExtractionService:
+    """Background page-by-page text extraction into MinIO"""
+
+    def __init__(self, workers: int = 2, pages_per_task: int = 50):
+        self.client = get_minio_client()
+        self.bucket_name = Config.MINIO_BUCKET
+        self.workers = max(workers, 1)
+        self.pages_per_task = max(pages_per_task, 1)
+        self.pool = IsolatedProcessPool(
+            'text',
+            size=self.workers,
+            timeout=Config.TEXT_TASK_TIMEOUT,
+            memory_limit=Config.STAGE_PROCESS_MEMORY_LIMIT_MB * 1024 * 1024,
+            max_tasks=Config.STAGE_PROCESS_MAX_TASKS,
+            start_method=Config.STAGE_PROCESS_START_METHOD
+        )
+        self._jobs = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='text-job')
+        self._ranges = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='text-range')
+
+    def schedule(self, object_path: str) -> Optional[Future]:
+        """
+        Queue text extraction for a stored PDF; returns immediately
+
+        Returns:
+            Future of ``extract``'s result, or None when TEXT_EXTRACTION is off
+        """
+        if not Config.TEXT_EXTRACTION:
+            return None
+        return self._jobs.submit(self._extract_logged, object_path)
+
+    def extract(self, object_path: str) -> Dict:
+        """
+        Extract the text of ``object_path`` into its NDJSON object
+
+        Content-addressed blobs that already have text are skipped.
+
+        Returns:
+            dict: ``success``, ``text_path`` and ``pages`` (None when skipped)
+        """
+        text_path = storage_service.get_text_object_path(object_path)
+        if self._exists(text_path):
+            return {'success': True, 'text_path': text_path, 'pages': None}
+
+        os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=Config.UPLOAD_FOLDER, prefix='text-') as workdir:
+            pdf_path = os.path.join(workdir, 'source.pdf')
+            self.client.fget_object(self.bucket_name, object_path, pdf_path)
+
+            page_count = self.pool.call(extract_pdf_info_from_file, pdf_path)['pages']
+            ranges = self._page_ranges(page_count)
+            parts = [os.path.join(workdir, f'part-{i:05d}.ndjson') for i in range(len(ranges))]
+            futures = [
+                self._ranges.submit(self.pool.call, extract_text_range, pdf_path, start, stop, part)
+                for (start, stop), part in zip(ranges, parts)
+            ]
+
+            pages = 0
+            for (start, stop), part, future in zip(ranges, parts, futures):
+                try:
+                    pages += future.result()
+                except (WorkerTimeoutError, WorkerCrashedError, MemoryError) as e:
+                    if stop is None:
+                        raise
+                    # Keep one line per page so consumers can rely on the page numbers
+                    logger.warning(f"Text extraction of pages {start + 1}-{stop} of {object_path} failed: {e}")
+                    with open(part, 'w', encoding='utf-8') as out:
+                        for number in range(start + 1, stop + 1):
+                            out.write(_page_line(number, '', str(e)))
+                    pages += stop - start
+
+            reader = _PartsReader(parts)
+            try:
+                self.client.put_object(
+                    bucket_name=self.bucket_name,
+                    object_name=text_path,
+                    data=reader,
+                    length=-1,
+                    part_size=Config.MINIO_PART_SIZE,
+                    content_type='application/x-ndjson'
+                )
+            finally:
+                reader.close()
+
+        logger.info(f"Extracted text of {pages} pages from {object_path} into {text_path}")
+        return {'success': True, 'text_path': text_path, 'pages': pages}
+
+    def shutdown(self):
+        self._jobs.shutdown(wait=False, cancel_futures=True)
+        self._ranges.shutdown(wait=False, cancel_futures=True)
+        self.pool.shutdown()
+
+    def _extract_logged(self, object_path: str) -> Dict:
+        try:
+            return self.extract(object_path)
+        except Exception as e:
+            logger.error(f"Text extraction failed for {object_path}: {e}")
+            return {'success': False, 'error': str(e), 'text_path': None, 'pages': None}
+
+    def _page_ranges(self, page_count: int) -> List[Tuple[int, Optional[int]]]:
+        """Page ranges per task; one open-ended range when the page count is unknown"""
+        if page_count <= 0:
+            return [(0, None)]
+        return [
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+
+    def _exists(self, object_path: str) -> bool:
+        try:
+            self.client.stat_object(self.bucket_name, object_path)
+            return True
+        except S3Error:
+            return False
+
+
+# Global instance
+text_extraction_service = TextExtractionService(
+    workers=Config.TEXT_WORKERS,
+    pages_per_task=Config.TEXT_PAGES_PER_TASK
+)
+
+
+def schedule_text_extraction(object_path):
+    """Convenience wrapper"""
+    return text_extraction_service.schedule(object_path)
@@ -0,0 +1,129 @@
+"""
+Background upload jobs
+
+Accepted uploads are spooled to disk and processed on a worker pool while the
+request returns 202. Job documents live in MinIO under ``Config.JOBS_FOLDER``
+so that any gunicorn worker can answer a status query, not only the one that
+accepted the upload.
+"""
+import datetime
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from app.config.config import Config
+from app.services.document_store import JsonDocumentStore
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_PROCESSING = 'processing'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+class UploadJobManager:
+    """Run upload processing in the background and track its progress"""
+
+    def __init__(self, workers: int = 4, store: Optional[JsonDocumentStore] = None):
+        self.workers = workers
+        self.store = store or JsonDocumentStore(Config.JOBS_FOLDER)
+        self._pool = None
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, process: Callable, user_id: str, filename: str,
+               on_finish: Optional[Callable] = None) -> Dict:
+        """
+        Queue ``process(on_stage)`` and return the initial job document
+
+        Args:
+            process: Callable returning ``(success, error_message, response_data)``;
+                it receives a stage progress callback ``on_stage(name, status)``
+            user_id: Owner of the job, the only user allowed to read it
+            filename: Original filename, for display
+            on_finish: Cleanup callback run after processing, success or not
+        """
+        job_id = str(uuid.uuid4())
+        job = {
+            'job_id': job_id,
+            'status': JOB_QUEUED,
+            'user_id': user_id,
+            'filename': filename,
+            'stages': {},
+            'result': None,
+            'error': None,
+            'created_at': _now(),
+            'updated_at': _now()
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            snapshot = dict(job)
+        self.store.save(job_id, snapshot)
+
+        self._get_pool().submit(self._run, job_id, process, on_finish)
+        logger.info(f"Upload job {job_id} queued for user {user_id}")
+        return snapshot
+
+    def get(self, job_id: str, user_id: str) -> Optional[Dict]:
+        """Return the job if it exists and belongs to ``user_id``"""
+        with self._lock:
+            job = dict(self._jobs[job_id]) if job_id in self._jobs else None
+        if job is None:
+            job = self.store.load(job_id)
+        if job is None or job.get('user_id') != user_id:
+            return None
+        return job
+
+    def _run(self, job_id: str, process: Callable, on_finish: Optional[Callable]):
+        self._update(job_id, status=JOB_PROCESSING)
+        try:
+            success, error_message, response_data = process(
+                lambda name, status: self._update_stage(job_id, name, status)
+            )
+            if success:
+                self._update(job_id, status=JOB_SUCCEEDED, result=response_data)
+            else:
+                self._update(job_id, status=JOB_FAILED, error=error_message)
+        except Exception as e:
+            logger.error(f"Upload job {job_id} crashed: {e}")
+            self._update(job_id, status=JOB_FAILED, error=f"Internal server error: {str(e)}")
+        finally:
+            if on_finish:
+                on_finish()
+            with self._lock:
+                self._jobs.pop(job_id, None)
+
+    def _update_stage(self, job_id: str, name: str, status: str):
+        with self._lock:
+            stages = dict(self._jobs[job_id]['stages'])
+        stages[name] = status
+        self._update(job_id, stages=stages)
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields, updated_at=_now())
+            snapshot = dict(job)
+        try:
+            self.store.save(job_id, snapshot)
+        except Exception as e:
+            logger.warning(f"Could not persist upload job {job_id}: {e}")
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='upload-job'
+                )
+            return self._pool
+
+
+# Global instance
+upload_job_manager = UploadJobManager(workers=Config.UPLOAD_JOB_WORKERS)
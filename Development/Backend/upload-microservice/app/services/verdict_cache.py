@@ -0,0 +1,115 @@
+"""
+Scan verdict cache
+
+Remembers clamd verdicts by (SHA-256 of the content, signature database
+version) so that repeated and retried uploads of the same bytes skip the
+INSTREAM round trip. The version is what clamd's ``VERSION`` command
+reports for the loaded database, as last polled by the dependency monitor
+(see ``ClamdNode.ping``); when it changes, every cached verdict is
+dropped. Without a known version nothing is cached or served.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ScanVerdictCache:
+    """
+    In-process LRU + TTL cache of scan verdicts
+
+    Args:
+        signature_provider: Returns clamd's cached VERSION string, or None
+            when it is unknown; called on every lookup, so it must not do I/O
+        max_entries: LRU capacity; 0 disables the cache
+        ttl: Seconds a verdict stays valid even if the signatures do not change
+    """
+
+    def __init__(self, signature_provider: Callable[[], Optional[str]], max_entries: int = 10000,
+                 ttl: float = 3600):
+        self.signature_provider = signature_provider
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._signature = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def signature(self) -> Optional[str]:
+        """Current signature version, or None when it cannot be determined"""
+        signature = self.signature_provider()
+        with self._lock:
+            if signature != self._signature:
+                if self._entries:
+                    logger.info(f"🔄 ClamAV signatures changed ({self._signature} -> {signature}), "
+                                f"dropping {len(self._entries)} cached verdicts")
+                self._entries.clear()
+                self._signature = signature
+        return signature
+
+    def get(self, sha256: str, signature: Optional[str]) -> Optional[Dict]:
+        """Return the cached verdict for ``sha256`` under ``signature``"""
+        if signature is None or not self.enabled:
+            return None
+
+        key = (sha256, signature)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def put(self, sha256: str, signature: Optional[str], verdict: Dict):
+        """
+        Remember a verdict obtained with ``signature`` (read before scanning)
+
+        Scan errors and skipped scans are not cached, and neither is anything
+        scanned with signatures that have been replaced in the meantime.
+        """
+        if signature is None or not self.enabled or not self._is_definitive(verdict):
+            return
+
+        with self._lock:
+            if signature != self._signature:
+                return
+            key = (sha256, signature)
+            self._entries[key] = (dict(verdict), time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Drop every cached verdict"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'capacity': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'signature': self._signature
+            }
+
+    @staticmethod
+    def _is_definitive(verdict: Dict) -> bool:
+        result = verdict.get('result', '')
+        if verdict.get('clean'):
+            return result == 'File is clean'
+        return result.startswith('Virus detected:')
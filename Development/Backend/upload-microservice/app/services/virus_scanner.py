@@ -1,43 +1,739 @@
 """
 Virus scanning service using ClamAV (TCP only)
 """
+import asyncio
 import clamd
+import hashlib
 import logging
+import mmap
+import threading
 import time
-import io
+import socket
+import struct
+from concurrent.futures import Future
 from app.config.config import Config
+from app.services.pdf_prescan import pdf_prescanner
+from app.services.verdict_cache import ScanVerdictCache
+from app.utils.circuit_breaker import CircuitBreaker
 
 logger = logging.getLogger(__name__)
 
-class VirusScanner:
-    """ClamAV virus scanner wrapper using TCP only"""
+SCANNER_UNAVAILABLE = 'Scan error: virus scanner unavailable'
+
+
+class ScannerUnavailable(ConnectionError):
+    """Raised when a scan is requested while the ClamAV circuit is open"""
+
+
+def rejection_message(verdict):
+    """
+    Upload error message for a verdict that is not clean
+
+    A scan that did not complete (connection failure, timeout, clamd error)
+    is reported as the scanner being unavailable rather than as a virus.
+    """
+    if verdict['result'].startswith('Scan error'):
+        return f"Virus scanner unavailable - {verdict['result']}"
+    return f"File rejected - virus detected: {verdict['result']}"
+
+
+def _verdict_from_stream_result(scan_result):
+    """Translate a clamd ``{'stream': (status, reason)}`` reply into our verdict dict"""
+    status, reason = scan_result['stream']
+    if status == 'OK':
+        return {'clean': True, 'result': 'File is clean'}
+    if status == 'ERROR':
+        return {'clean': False, 'result': f'Scan error: {reason}'}
+    return {'clean': False, 'result': f'Virus detected: {reason}'}
+
+
+class ClamdStream:
+    """
+    Incremental INSTREAM session.
+
+    Chunks are forwarded to clamd as they arrive, so the caller never has to
+    hold the whole file in memory. Call ``finish()`` once to get the verdict.
+    """
+
+    def __init__(self, host, port, timeout=None):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.sendall(b'nINSTREAM\n')
+
+    def write(self, chunk):
+        """Send one chunk using the INSTREAM length-prefixed framing"""
+        if chunk:
+            self.sock.sendall(struct.pack('!L', len(chunk)))
+            self.sock.sendall(chunk)
+
+    def finish(self):
+        """Terminate the stream and return the parsed verdict"""
+        try:
+            self.sock.sendall(struct.pack('!L', 0))
+            with self.sock.makefile('rb') as reply:
+                response = reply.readline().decode('utf-8').strip()
+            return _verdict_from_stream_result(self._parse_response(response))
+        finally:
+            self.close()
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    @staticmethod
+    def _parse_response(response):
+        """Parse ``stream: <reason> <STATUS>`` into clamd's result shape"""
+        _, _, body = response.partition(': ')
+        reason, _, status = body.rpartition(' ')
+        if status not in ('OK', 'FOUND', 'ERROR'):
+            return {'stream': ('ERROR', response or 'empty response from clamd')}
+        return {'stream': (status, reason or None)}
+
+
+class AsyncClamdStream:
+    """asyncio counterpart of ``ClamdStream``; create it with ``await open()``"""
+
+    def __init__(self, reader, writer, on_release=None):
+        self.reader = reader
+        self.writer = writer
+        self.on_release = on_release
+
+    @classmethod
+    async def open(cls, host, port, timeout=None, on_release=None):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.write(b'nINSTREAM\n')
+        return cls(reader, writer, on_release)
+
+    async def write(self, chunk):
+        if chunk:
+            self.writer.write(struct.pack('!L', len(chunk)))
+            self.writer.write(chunk)
+            await self.writer.drain()
+
+    async def finish(self):
+        try:
+            self.writer.write(struct.pack('!L', 0))
+            await self.writer.drain()
+            response = (await self.reader.readline()).decode('utf-8').strip()
+            return _verdict_from_stream_result(ClamdStream._parse_response(response))
+        finally:
+            self.close()
+
+    def close(self):
+        try:
+            self.writer.close()
+        except (OSError, RuntimeError):
+            pass
+        if self.on_release:
+            self.on_release()
+            self.on_release = None
+
+
+class ClamdSession:
+    """
+    One persistent clamd connection in IDSESSION mode
+
+    Commands are written one at a time - INSTREAM frames cannot interleave -
+    but the next command goes out without waiting for the previous reply.
+    clamd prefixes every reply with the command's sequence number in the
+    session, and a reader thread hands it to the matching future.
+    """
+
+    def __init__(self, host, port, timeout=None):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.sendall(b'zIDSESSION\0')
+        self.write_lock = threading.Lock()
+        self.broken = False
+        # Maintained by ClamdConnectionPool under its lock
+        self.in_flight = 0
+        self.streaming = False
+        self.last_used = time.monotonic()
+        self._next_id = 0
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_replies, name='clamd-session', daemon=True)
+        self._reader.start()
+
+    def begin(self, command):
+        """
+        Send ``command``; the caller must hold ``write_lock``
+
+        Returns:
+            Future resolved with the reply body (without the request id)
+        """
+        future = Future()
+        with self._pending_lock:
+            if self.broken:
+                raise ConnectionError("clamd session is closed")
+            self._next_id += 1
+            self._pending[self._next_id] = future
+        self._send(b'z' + command + b'\0')
+        return future
+
+    def send_chunk(self, chunk):
+        """Send one INSTREAM frame; the caller must hold ``write_lock``"""
+        if chunk:
+            self._send(struct.pack('!L', len(chunk)) + chunk)
+
+    def end_stream(self):
+        """Send the zero-length frame that terminates an INSTREAM"""
+        self._send(struct.pack('!L', 0))
+
+    def ping(self, timeout=None):
+        with self.write_lock:
+            future = self.begin(b'PING')
+        return future.result(timeout) == 'PONG'
+
+    def close(self):
+        """Drop the connection; pending commands fail with ConnectionError"""
+        self._fail(ConnectionError("clamd session closed"))
 
-    def __init__(self, retries=30, delay=2):
-        self.cd = None
-        for attempt in range(1, retries + 1):
+    def _send(self, data):
+        try:
+            self.sock.sendall(data)
+        except OSError as e:
+            self._fail(e)
+            raise
+
+    def _read_replies(self):
+        buffer = b''
+        while True:
             try:
-                self.cd = clamd.ClamdNetworkSocket(
-                    host=Config.CLAMAV_HOST,
-                    port=Config.CLAMAV_PORT
-                )
-                self.cd.ping()
-                logger.info("✅ ClamAV connection established")
-                break
-            except Exception as e:
-                logger.warning(f"⏳ Attempt {attempt}/{retries} - Failed to connect to ClamAV: {e}")
-                time.sleep(delay)
+                data = self.sock.recv(65536)
+            except socket.timeout:
+                if self.broken:
+                    return
+                continue
+            except OSError as e:
+                self._fail(e)
+                return
+            if not data:
+                self._fail(ConnectionError("clamd closed the session"))
+                return
+
+            buffer += data
+            while b'\0' in buffer:
+                reply, buffer = buffer.split(b'\0', 1)
+                self._dispatch(reply.decode('utf-8', errors='replace'))
+
+    def _dispatch(self, reply):
+        request_id, separator, body = reply.partition(': ')
+        future = None
+        if separator and request_id.isdigit():
+            with self._pending_lock:
+                future = self._pending.pop(int(request_id), None)
+        if future is None:
+            # Untagged replies are session-level errors; clamd hangs up after them
+            self._fail(ConnectionError(f"Unexpected reply from clamd: {reply}"))
+            return
+        future.set_result(body)
+
+    def _fail(self, error):
+        with self._pending_lock:
+            was_broken, self.broken = self.broken, True
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(error)
+        if was_broken:
+            return
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class ClamdConnectionPool:
+    """
+    Thread-safe pool of persistent ``ClamdSession`` connections
+
+    A lease goes to an idle connection first, then to a new connection
+    while the pool is below ``size``, and otherwise is pipelined onto the
+    connection with the fewest outstanding commands (up to
+    ``pipeline_depth``). Connections idle for longer than
+    ``health_interval`` are PINGed before reuse; dead ones are dropped and
+    replaced on demand.
+    """
+
+    SCAN_CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, host, port, size=4, pipeline_depth=4, timeout=None, health_interval=15.0):
+        self.host = host
+        self.port = port
+        self.size = max(size, 1)
+        self.pipeline_depth = max(pipeline_depth, 1)
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self._sessions = []
+        self._opening = 0
+        self._cond = threading.Condition()
+
+    def lease(self, streaming=False):
+        """
+        Reserve a slot on a connection; pair with ``release``
+
+        Args:
+            streaming: The caller will hold the connection's write side for a
+                whole incremental INSTREAM, so no other command is pipelined
+                behind it until it is released
+        """
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            session, stale = self._reserve(deadline, streaming)
+            if session is None:
+                return self._open(streaming)
+            if stale and not self._healthy(session):
+                self.release(session, streaming)
+                continue
+            return session
+
+    def release(self, session, streaming=False):
+        with self._cond:
+            session.in_flight -= 1
+            if streaming:
+                session.streaming = False
+            session.last_used = time.monotonic()
+            self._cond.notify_all()
+
+    def scan(self, file_buffer):
+        """
+        INSTREAM ``file_buffer`` on a pooled connection
+
+        A connection that turns out to be dead is replaced and the scan is
+        retried once, since the whole buffer can be resent.
+
+        Returns:
+            clamd-style ``{'stream': (status, reason)}`` result
+        """
+        for attempt in (1, 2):
+            session = self.lease()
+            try:
+                with session.write_lock:
+                    future = session.begin(b'INSTREAM')
+                    for offset in range(0, len(file_buffer), self.SCAN_CHUNK_SIZE):
+                        session.send_chunk(file_buffer[offset:offset + self.SCAN_CHUNK_SIZE])
+                    session.end_stream()
+                return ClamdStream._parse_response(future.result(self.timeout))
+            except TimeoutError:
+                # clamd is slow, not gone (TimeoutError is an OSError):
+                # resending would only run the same scan twice
+                raise
+            except OSError as e:
+                session.close()
+                if attempt == 2:
+                    raise
+                logger.warning(f"⚠️ clamd connection lost ({e}), retrying scan on a new connection")
+            finally:
+                self.release(session)
+
+    def command(self, name):
+        """Send a command without payload (``PING``, ``VERSION``) and return its reply"""
+        session = self.lease()
+        try:
+            with session.write_lock:
+                future = session.begin(name)
+            return future.result(self.timeout)
+        except OSError:
+            session.close()
+            raise
+        finally:
+            self.release(session)
+
+    def close(self):
+        """Close every connection, e.g. when the worker shuts down"""
+        with self._cond:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+
+    def stats(self):
+        with self._cond:
+            live = [s for s in self._sessions if not s.broken]
+            return {
+                'connections': len(live),
+                'in_flight': sum(s.in_flight for s in live),
+                'streaming': sum(1 for s in live if s.streaming)
+            }
+
+    def _reserve(self, deadline, streaming):
+        """
+        Lease an existing connection, or claim room to open a new one
+
+        Returns:
+            (session, stale) - session is None when the caller should open one;
+            stale is True when it sat idle past the health-check interval
+        """
+        with self._cond:
+            while True:
+                self._sessions = [s for s in self._sessions if not s.broken]
+                candidates = [
+                    s for s in self._sessions
+                    if not s.streaming and s.in_flight < self.pipeline_depth
+                ]
+                best = min(candidates, key=lambda s: s.in_flight, default=None)
+                room = len(self._sessions) + self._opening < self.size
+
+                if best is not None and (best.in_flight == 0 or not room):
+                    stale = (best.in_flight == 0 and
+                             time.monotonic() - best.last_used > self.health_interval)
+                    best.in_flight += 1
+                    best.streaming = streaming
+                    return best, stale
+                if room:
+                    self._opening += 1
+                    return None, False
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No clamd connection available")
+                self._cond.wait(remaining)
+
+    def _open(self, streaming):
+        session = None
+        try:
+            session = ClamdSession(self.host, self.port, timeout=self.timeout)
+            return session
+        finally:
+            with self._cond:
+                self._opening -= 1
+                if session is not None:
+                    session.in_flight = 1
+                    session.streaming = streaming
+                    self._sessions.append(session)
+                self._cond.notify_all()
+
+    def _healthy(self, session):
+        try:
+            if session.ping(self.timeout):
+                return True
+        except Exception as e:
+            logger.warning(f"⚠️ Idle clamd connection failed health check: {e}")
+        session.close()
+        return False
+
+
+class PooledClamdStream:
+    """
+    ``ClamdStream`` on a pooled session
+
+    The connection's write side is held from the first chunk until
+    ``finish()``; the verdict is awaited after releasing it, so other scans
+    can already be pipelined on the same connection.
+    """
+
+    def __init__(self, pool, on_release=None):
+        self.pool = pool
+        self.on_release = on_release
+        self.session = pool.lease(streaming=True)
+        self._leased = True
+        self._writing = True
+        self.session.write_lock.acquire()
+        try:
+            self.future = self.session.begin(b'INSTREAM')
+        except Exception:
+            self._release()
+            raise
+
+    def write(self, chunk):
+        self.session.send_chunk(chunk)
+
+    def finish(self):
+        """Terminate the stream and return the parsed verdict"""
+        try:
+            self.session.end_stream()
+            self._unlock()
+            response = self.future.result(self.pool.timeout)
+            return _verdict_from_stream_result(ClamdStream._parse_response(response))
+        except OSError:
+            self.session.close()
+            raise
+        finally:
+            self._release()
+
+    def close(self):
+        """Abandon the stream; the connection stays usable when it is still healthy"""
+        if not self._leased:
+            return
+        if self._writing:
+            try:
+                self.session.end_stream()
+            except OSError:
+                pass
+        self._release()
+
+    def _unlock(self):
+        if self._writing:
+            self._writing = False
+            self.session.write_lock.release()
+
+    def _release(self):
+        self._unlock()
+        if self._leased:
+            self._leased = False
+            self.pool.release(self.session, streaming=True)
+            if self.on_release:
+                self.on_release()
+
+
+class ClamdNode:
+    """One clamd endpoint: its connection pool plus ejection state"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.pool = ClamdConnectionPool(
+            host,
+            port,
+            size=Config.CLAMAV_POOL_SIZE,
+            pipeline_depth=Config.CLAMAV_PIPELINE_DEPTH,
+            timeout=Config.CLAMAV_TIMEOUT,
+            health_interval=Config.CLAMAV_HEALTH_INTERVAL
+        )
+        self.breaker = CircuitBreaker(
+            f'ClamAV {self.name}', Config.CLAMAV_EJECT_THRESHOLD, Config.DEPENDENCY_RESET_TIMEOUT
+        )
+        # Scans and streams currently assigned; maintained by VirusScanner
+        self.outstanding = 0
+        # Signature database version, refreshed by every ping
+        self.version = None
+
+    @property
+    def name(self):
+        return f'{self.host}:{self.port}'
+
+    def client(self, timeout=None):
+        """One-off ``clamd`` client for this node"""
+        return clamd.ClamdNetworkSocket(host=self.host, port=self.port, timeout=timeout)
+
+    def ping(self):
+        """
+        PING on a short-lived connection; the result feeds the ejection breaker
+
+        A node that answers is also asked for its signature VERSION, so the
+        scan path never has to wait for it.
+        """
+        client = self.client(Config.DEPENDENCY_TIMEOUT)
+        try:
+            healthy = client.ping() == 'PONG'
+        except Exception as e:
+            logger.warning(f"⚠️ ClamAV node {self.name} failed ping: {e}")
+            healthy = False
+        if healthy:
+            self.breaker.record_success()
+            self.version = self._read_version(client)
         else:
-            logger.warning("❌ ClamAV connection failed after retries, continuing without it")
-            self.cd = None
+            self.breaker.record_failure()
+            self.version = None
+        return healthy
+
+    def _read_version(self, client):
+        """VERSION reply such as ``ClamAV 1.4.1/27000/Mon Oct 13 08:23:45 2026``, or None"""
+        try:
+            version = (client.version() or '').strip()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read signature version of ClamAV node {self.name}: {e}")
+            return None
+        if '/' not in version:
+            logger.warning(f"⚠️ Unexpected VERSION reply from ClamAV node {self.name}: {version!r}")
+            return None
+        return version
+
+    def status(self):
+        return dict(self.breaker.stats(), outstanding=self.outstanding, **self.pool.stats())
+
+
+class ClamdCluster:
+    """
+    A set of interchangeable clamd nodes (one scanning tier)
+
+    Work goes to the node in rotation with the fewest outstanding requests.
+    A node is ejected after ``CLAMAV_EJECT_THRESHOLD`` failed pings or scans
+    in a row and is probed again once its breaker half-opens; a failed
+    buffered scan is retried on another node. Verdicts are cached per
+    cluster, so a verdict from one tier never answers for another.
+    """
+
+    def __init__(self, name, endpoints):
+        self.name = name
+        self.nodes = [ClamdNode(host, port) for host, port in endpoints]
+        self.verdicts = ScanVerdictCache(
+            self.signature_version,
+            max_entries=Config.SCAN_CACHE_MAX_ENTRIES,
+            ttl=Config.SCAN_CACHE_TTL
+        )
+        self._lock = threading.Lock()
+
+    def ping(self):
+        """Ping every node; healthy as long as one of them answers"""
+        results = [node.ping() for node in self.nodes]
+        return any(results)
+
+    @property
+    def healthy(self):
+        return any(node.breaker.allow() for node in self.nodes)
+
+    def status(self):
+        return {node.name: node.status() for node in self.nodes}
+
+    def scan(self, file_buffer):
+        """
+        INSTREAM ``file_buffer`` (bytes or mmap), reusing a cached verdict for identical bytes
+
+        Returns:
+            Verdict dict, with the ``signature`` version it was obtained
+            under; raises when no node could scan it
+        """
+        signature = self.verdicts.signature()
+        digest = hashlib.sha256(file_buffer).hexdigest() if signature else None
+        cached = self.verdicts.get(digest, signature) if digest else None
+        if cached is not None:
+            logger.info(f"✅ Reusing {self.name} scan verdict for {digest[:12]}…")
+            return cached
+
+        verdict = dict(_verdict_from_stream_result(self._scan_on_nodes(file_buffer)), signature=signature)
+        if digest:
+            self.verdicts.put(digest, signature, verdict)
+        return verdict
+
+    def signature_version(self):
+        """
+        VERSION shared by every node in rotation, as of the last ping
+
+        None when a node could not report it or when nodes disagree (e.g. in
+        the middle of a signature rollout), which turns the verdict cache off
+        until they converge. Never does I/O.
+        """
+        versions = {node.version for node in self._rotation()}
+        if len(versions) != 1:
+            return None
+        return versions.pop()
+
+    def open_stream(self):
+        signature = self.verdicts.signature()
+        node = self._acquire()
+        try:
+            stream = PooledClamdStream(node.pool, on_release=lambda: self._release(node))
+        except Exception:
+            node.breaker.record_failure()
+            self._release(node)
+            raise
+        stream.signature = signature
+        return stream
+
+    async def open_async_stream(self):
+        signature = self.verdicts.signature()
+        node = self._acquire()
+        try:
+            stream = await AsyncClamdStream.open(
+                node.host, node.port, timeout=Config.CLAMAV_TIMEOUT, on_release=lambda: self._release(node)
+            )
+        except Exception:
+            node.breaker.record_failure()
+            self._release(node)
+            raise
+        stream.signature = signature
+        return stream
+
+    def scan_path(self, file_path):
+        """clamd ``SCAN <path>`` on the least busy node"""
+        node = self._acquire()
+        try:
+            return node.client(Config.CLAMAV_TIMEOUT).scan(file_path)
+        finally:
+            self._release(node)
+
+    def _scan_on_nodes(self, file_buffer):
+        """INSTREAM on the least busy node, moving on to another one on failure (not on timeout)"""
+        tried = []
+        last_error = None
+        for _ in range(min(Config.CLAMAV_SCAN_ATTEMPTS, len(self.nodes))):
+            node = self._acquire(exclude=tried)
+            try:
+                result = node.pool.scan(file_buffer)
+                node.breaker.record_success()
+                return result
+            except TimeoutError as e:
+                # Not retried elsewhere: a slow verdict would just be slow twice
+                node.breaker.record_failure()
+                logger.warning(f"⚠️ Scan on ClamAV node {node.name} timed out: {e}")
+                raise
+            except Exception as e:
+                node.breaker.record_failure()
+                logger.warning(f"⚠️ Scan on ClamAV node {node.name} failed: {e}")
+                tried.append(node)
+                last_error = e
+            finally:
+                self._release(node)
+        raise last_error
+
+    def _rotation(self):
+        """Nodes that are not ejected (all of them if every node is)"""
+        return [node for node in self.nodes if node.breaker.allow()] or self.nodes
+
+    def _acquire(self, exclude=()):
+        """Assign work to the node in rotation with the fewest outstanding requests"""
+        with self._lock:
+            candidates = [node for node in self._rotation() if node not in exclude] or \
+                [node for node in self.nodes if node not in exclude] or self.nodes
+            node = min(candidates, key=lambda n: n.outstanding)
+            node.outstanding += 1
+            return node
+
+    def _release(self, node):
+        with self._lock:
+            node.outstanding -= 1
+
+
+class VirusScanner:
+    """
+    ClamAV virus scanner wrapper using TCP only
+
+    Two tiers of clamd nodes: the standard tier (``CLAMAV_ENDPOINTS``)
+    scans everything, and PDFs that the structural pre-scan flags
+    (``app.services.pdf_prescan``) go to the deep tier
+    (``CLAMAV_DEEP_ENDPOINTS``, clamd with every heuristic enabled) instead.
+    Without deep endpoints, or while every deep node is ejected, flagged
+    files are scanned on the standard tier.
+
+    Constructing it does no I/O: pooled connections are opened on first use,
+    and the dependency monitor (``app.services.dependencies``) pings the
+    nodes in the background. After ``retries`` rounds in which no standard
+    node answered, the ClamAV circuit opens. Scans then fail closed - the
+    verdict is a scan error, never clean - and the routes answer 503 until
+    a node answers again.
+    """
+
+    def __init__(self, endpoints, deep_endpoints=(), retries=30):
+        self.standard = ClamdCluster('standard', endpoints)
+        self.deep = ClamdCluster('deep', deep_endpoints) if deep_endpoints else None
+        self.breaker = CircuitBreaker('ClamAV', retries, Config.DEPENDENCY_RESET_TIMEOUT)
+
+    @property
+    def available(self):
+        """False while the ClamAV circuit is open"""
+        return not self.breaker.is_open
+
+    def ping(self):
+        """Ping every node; healthy as long as a standard node answers"""
+        if self.deep:
+            self.deep.ping()
+        return self.standard.ping()
+
+    def nodes_status(self):
+        status = self.standard.status()
+        if self.deep:
+            status.update({f'{name} (deep)': node for name, node in self.deep.status().items()})
+        return status
 
     def scan_file(self, file_path):
         """Scan a file for viruses"""
-        if not self.cd:
-            logger.warning("⚠️ ClamAV not available, skipping virus scan")
-            return {'clean': True, 'result': 'ClamAV not available - scan skipped'}
+        if not self.available:
+            logger.warning("⚠️ ClamAV not available, rejecting unscanned file")
+            return {'clean': False, 'result': SCANNER_UNAVAILABLE}
 
         try:
-            scan_result = self.cd.scan(file_path)
+            scan_result = self.standard.scan_path(file_path)
             if scan_result is None:
                 return {'clean': True, 'result': 'File is clean'}
             else:
@@ -49,26 +745,109 @@ class VirusScanner:
             return {'clean': False, 'result': f'Scan error: {str(e)}'}
 
     def scan_buffer(self, file_buffer):
-        """Scan file content from buffer"""
-        if not self.cd:
-            logger.warning("⚠️ ClamAV not available, skipping virus scan")
-            return {'clean': True, 'result': 'ClamAV not available - scan skipped'}
+        """
+        Scan file content from buffer on the tier its pre-scan calls for,
+        reusing a cached verdict for identical bytes
+        """
+        if not self.available:
+            logger.warning("⚠️ ClamAV not available, rejecting unscanned file")
+            return {'clean': False, 'result': SCANNER_UNAVAILABLE}
 
+        cluster = self._tier_for(file_buffer)
         try:
-            scan_result = self.cd.instream(io.BytesIO(file_buffer))
-            if scan_result['stream'][0] == 'OK':
-                return {'clean': True, 'result': 'File is clean'}
-            else:
-                virus_info = scan_result['stream'][1]
-                return {'clean': False, 'result': f'Virus detected: {virus_info}'}
+            return cluster.scan(file_buffer)
         except Exception as e:
             logger.error(f"❌ Error scanning buffer: {e}")
             return {'clean': False, 'result': f'Scan error: {str(e)}'}
 
+    def escalate(self, file_path, verdict):
+        """
+        Deep-scan a file that was already scanned on the standard tier
+        (streaming ingest) when its pre-scan flags it
+
+        Returns:
+            The deep verdict, or ``verdict`` when no deep scan is needed
+        """
+        if self.deep is None or not Config.SCAN_TIERING:
+            return verdict
+        if not verdict or not verdict['clean'] or not self.available:
+            return verdict
+
+        with open(file_path, 'rb') as pdf_file:
+            try:
+                data = mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return verdict
+            with data:
+                cluster = self._tier_for(data)
+                if cluster is self.standard:
+                    return verdict
+                try:
+                    return cluster.scan(data)
+                except Exception as e:
+                    logger.error(f"❌ Error deep-scanning {file_path}: {e}")
+                    return {'clean': False, 'result': f'Scan error: {str(e)}'}
+
+    def signature_is_current(self, signature):
+        """True when ``signature`` is the database version a tier is running now"""
+        if not signature:
+            return False
+        clusters = [self.standard] + ([self.deep] if self.deep else [])
+        return any(cluster.signature_version() == signature for cluster in clusters)
+
+    def remember(self, sha256, signature, verdict):
+        """Cache the verdict of a streamed (standard tier) scan, once its hash is known"""
+        self.standard.verdicts.put(sha256, signature, verdict)
+
+    def open_stream(self):
+        """
+        Open an incremental INSTREAM session for chunked scanning
+
+        Streams are scanned on the standard tier; call ``escalate`` once the
+        whole file is available.
+
+        Returns:
+            PooledClamdStream; its ``signature`` is the version to record in
+            the verdict and pass to ``remember``
+
+        Raises:
+            ScannerUnavailable: while the ClamAV circuit is open
+        """
+        if not self.available:
+            raise ScannerUnavailable("virus scanner unavailable")
+        return self.standard.open_stream()
+
+    async def open_async_stream(self):
+        """asyncio variant of ``open_stream``"""
+        if not self.available:
+            raise ScannerUnavailable("virus scanner unavailable")
+        return await self.standard.open_async_stream()
+
+    def _tier_for(self, data):
+        """Standard or deep cluster for ``data``, based on the structural pre-scan"""
+        if self.deep is None or not Config.SCAN_TIERING:
+            return self.standard
+
+        try:
+            prescan = pdf_prescanner.scan(data)
+        except Exception as e:
+            logger.warning(f"⚠️ PDF pre-scan failed, treating file as risky: {e}")
+            prescan = {'risky': True, 'findings': ['prescan-error']}
+
+        if not prescan['risky']:
+            return self.standard
+        if not self.deep.healthy:
+            logger.warning(f"⚠️ Deep ClamAV tier unavailable, scanning flagged file "
+                           f"({', '.join(prescan['findings'])}) on the standard tier")
+            return self.standard
+        logger.info(f"🔍 Pre-scan flagged {', '.join(prescan['findings'])}: using deep ClamAV tier")
+        return self.deep
+
 # Global instance
 scanner = VirusScanner(
-    retries=int(getattr(Config, "CLAMAV_RETRIES", 30)),
-    delay=int(getattr(Config, "CLAMAV_RETRY_DELAY", 2))
+    Config.CLAMAV_ENDPOINTS,
+    deep_endpoints=Config.CLAMAV_DEEP_ENDPOINTS,
+    retries=int(getattr(Config, "CLAMAV_RETRIES", 30))
 )
 
 def scan_uploaded_file(file_buffer):
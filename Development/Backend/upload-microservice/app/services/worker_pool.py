@@ -0,0 +1,204 @@
+"""
+Isolated worker processes for untrusted CPU-bound work
+
+Parsing user-supplied PDFs is pure-Python work that a malicious file can
+make spin for minutes or grow to gigabytes. Tasks run in reusable child
+processes instead: every call has a wall-clock timeout, and every worker
+runs under an ``RLIMIT_AS`` address-space cap. A worker that times out is
+killed and replaced; one that dies (segfault, OOM kill) is replaced too.
+The caller gets ``WorkerTimeoutError`` or ``WorkerCrashedError`` and the
+serving process is never stalled or taken down by the file.
+"""
+import logging
+import multiprocessing
+import threading
+from typing import Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Sent by a worker once a task is unpickled (and its module imported), so
+# that imports in a fresh worker do not count against the task's timeout
+_STARTED = 'started'
+STARTUP_TIMEOUT = 60.0
+
+
+class WorkerTimeoutError(TimeoutError):
+    """Raised when a task exceeds its wall-clock timeout (the worker is killed)"""
+
+
+class WorkerCrashedError(RuntimeError):
+    """Raised when the worker running a task died"""
+
+
+def _worker_main(conn, memory_limit: int):
+    """Child process loop: run ``(func, args)`` tasks until told to stop"""
+    if memory_limit and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+        if task is None:
+            return
+
+        func, args = task
+        conn.send(_STARTED)
+        try:
+            reply = (True, func(*args))
+        except MemoryError:
+            reply = (False, MemoryError(f"memory limit of {memory_limit // (1024 * 1024)}MB exceeded"))
+        except Exception as e:
+            reply = (False, e)
+
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # Unpicklable result or exception
+            conn.send((False, RuntimeError(f"{type(reply[1]).__name__}: {reply[1]} ({e})")))
+
+
+class _Worker:
+    def __init__(self, context, memory_limit: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_limit), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class IsolatedProcessPool:
+    """
+    Pool of reusable worker processes with per-task timeouts and memory caps
+
+    Workers are started on demand, up to ``size``. Calls block while all of
+    them are busy.
+
+    Args:
+        name: Name used in logs and errors
+        size: Maximum number of worker processes
+        timeout: Default wall-clock seconds per task (None = no limit)
+        memory_limit: ``RLIMIT_AS`` per worker in bytes (0 = no limit)
+        max_tasks: Tasks after which a worker is replaced (0 = never)
+        start_method: multiprocessing start method
+    """
+
+    def __init__(self, name: str, size: int = 2, timeout: Optional[float] = 30.0,
+                 memory_limit: int = 0, max_tasks: int = 0, start_method: str = 'forkserver'):
+        self.name = name
+        self.size = max(size, 1)
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.max_tasks = max_tasks
+        self.start_method = start_method
+        self.timeouts = 0
+        self.crashes = 0
+        self._idle: List[_Worker] = []
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._context = None
+        self._closed = False
+
+    def call(self, func: Callable, *args, timeout: Optional[float] = None):
+        """
+        Run ``func(*args)`` in a worker process (func and args must be picklable)
+
+        Raises:
+            WorkerTimeoutError: the task did not finish in time
+            WorkerCrashedError: the worker died while running it
+            Exception: whatever ``func`` raised
+        """
+        limit = self.timeout if timeout is None else timeout
+        task_name = getattr(func, '__name__', 'task')
+
+        self._slots.acquire()
+        worker = None
+        try:
+            worker = self._checkout()
+            worker.tasks += 1
+            try:
+                worker.conn.send((func, args))
+                finished = worker.conn.poll(STARTUP_TIMEOUT) and worker.conn.recv() == _STARTED \
+                    and worker.conn.poll(limit)
+                if finished:
+                    ok, value = worker.conn.recv()
+            except (EOFError, OSError):
+                worker.kill()
+                worker = None
+                self.crashes += 1
+                raise WorkerCrashedError(f"{self.name} worker died running {task_name}")
+
+            if not finished:
+                worker.kill()
+                worker = None
+                self.timeouts += 1
+                logger.warning(f"⏱️ {self.name} task {task_name} exceeded {limit}s, worker killed")
+                raise WorkerTimeoutError(f"{task_name} timed out after {limit}s")
+        finally:
+            if worker is not None:
+                self._checkin(worker)
+            self._slots.release()
+
+        if not ok:
+            raise value
+        return value
+
+    def shutdown(self):
+        """Stop idle workers (busy ones finish their task and are stopped on return)"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._closed = True
+        for worker in idle:
+            worker.stop()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'timeouts': self.timeouts,
+                'crashes': self.crashes
+            }
+
+    def _checkout(self) -> _Worker:
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.kill()
+            if self._context is None:
+                self._context = multiprocessing.get_context(self.start_method)
+            context = self._context
+        return _Worker(context, self.memory_limit)
+
+    def _checkin(self, worker: _Worker):
+        if not worker.process.is_alive() or self._closed or \
+                (self.max_tasks and worker.tasks >= self.max_tasks):
+            worker.stop()
+            return
+        with self._lock:
+            self._idle.append(worker)
@@ -2,6 +2,7 @@
 Authentication utilities for validating JWT tokens and getting user info
 """
 import requests
+import httpx
 import logging
 from flask import request
 from app.config.config import Config
@@ -49,6 +50,47 @@ def get_user_from_token():
         logger.error(f"Unexpected error in token validation: {e}")
         return None
 
+async def get_user_from_token_async(auth_header):
+    """
+    asyncio variant of ``get_user_from_token`` for the ASGI entry point
+    
+    Args:
+        auth_header: Value of the Authorization header
+        
+    Returns user UUID if valid, None if invalid
+    """
+    try:
+        if not auth_header:
+            logger.warning("No Authorization header provided")
+            return None
+        
+        if not auth_header.startswith('Bearer '):
+            logger.warning("Invalid Authorization header format")
+            return None
+        
+        token = auth_header[7:]
+        
+        auth_url = f"{Config.AUTH_SERVICE_URL}/api/auth/user"
+        headers = {'Authorization': f'Bearer {token}'}
+        
+        async with httpx.AsyncClient(timeout=10) as client:
+            response = await client.get(auth_url, headers=headers)
+        
+        if response.status_code == 200:
+            user_id = response.json().get('id')
+            logger.info(f"Token validated for user: {user_id}")
+            return user_id
+        else:
+            logger.warning(f"Token validation failed: {response.status_code}")
+            return None
+            
+    except httpx.HTTPError as e:
+        logger.error(f"Error contacting auth service: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected error in token validation: {e}")
+        return None
+
 def require_auth(f):
     """
     Decorator to require authentication for routes
@@ -0,0 +1,82 @@
+"""
+Circuit breaker for external dependencies (ClamAV, MinIO)
+"""
+import logging
+import threading
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    ``closed`` until ``failure_threshold`` failures in a row, then ``open``
+    for ``reset_timeout`` seconds, then ``half_open``: the next attempt either
+    closes it again or re-opens it for another ``reset_timeout``.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now"""
+        return not self.is_open
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets the next attempt through"""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"✅ Circuit '{self.name}' closed")
+            self.failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(now)
+            self.failures += 1
+            if state == self.HALF_OPEN or (state == self.CLOSED and self.failures >= self.failure_threshold):
+                if state == self.CLOSED:
+                    logger.warning(f"❌ Circuit '{self.name}' opened after {self.failures} consecutive failures")
+                self._opened_at = now
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'state': self._state(time.monotonic()),
+                'consecutive_failures': self.failures
+            }
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if now - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
@@ -0,0 +1,4 @@
+from app.asgi import create_asgi_app
+
+# uvicorn asgi:app --host 0.0.0.0 --port 3003
+app = create_asgi_app()
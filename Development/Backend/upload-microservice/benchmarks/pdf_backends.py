@@ -0,0 +1,127 @@
+"""
+Compare the PDF parsing backends on a local corpus
+
+    python benchmarks/pdf_backends.py CORPUS_DIR [--backends structure,pdfium,pypdf2]
+                                                 [--repeat 3] [--json]
+
+Every backend runs in its own fresh process over all ``*.pdf`` files under
+CORPUS_DIR (page count, /Info and first-page title, as metadata extraction
+does) and reports throughput, per-file latency, peak memory (growth of the
+process' maximum RSS, so native allocations count too), failures and how
+often its page count agrees with the first backend listed.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.pdf_backends import BACKENDS, get_backend  # noqa: E402
+
+
+def _max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def _run_backend(name, paths, repeat, results):
+    backend = get_backend(name)
+    baseline = _max_rss_mb()
+    timings = []
+    pages = {}
+    failures = {}
+    total_bytes = 0
+
+    for _ in range(repeat):
+        for path in paths:
+            with open(path, 'rb') as pdf_file:
+                data = pdf_file.read()
+            started = time.perf_counter()
+            try:
+                with backend.open(data) as document:
+                    count = document.page_count()
+                    info = document.info()
+                    if not (info.get('Title') or '').strip():
+                        document.first_line()
+            except Exception as e:
+                failures[path] = f"{type(e).__name__}: {e}"
+                continue
+            timings.append(time.perf_counter() - started)
+            pages[path] = count
+            total_bytes += len(data)
+
+    elapsed = sum(timings)
+    results.put({
+        'backend': name,
+        'files': len(paths),
+        'failures': failures,
+        'pages': pages,
+        'seconds': elapsed,
+        'files_per_second': len(timings) / elapsed if elapsed else 0.0,
+        'mb_per_second': total_bytes / (1024 * 1024) / elapsed if elapsed else 0.0,
+        'p50_ms': statistics.median(timings) * 1000 if timings else None,
+        'p95_ms': sorted(timings)[min(int(len(timings) * 0.95), len(timings) - 1)] * 1000 if timings else None,
+        'peak_rss_mb': _max_rss_mb() - baseline
+    })
+
+
+def _corpus(directory):
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith('.pdf'))
+    return sorted(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('corpus', help='Directory of PDF files (searched recursively)')
+    parser.add_argument('--backends', default=','.join(BACKENDS),
+                        help=f"Comma-separated backends (default: {','.join(BACKENDS)})")
+    parser.add_argument('--repeat', type=int, default=3, help='Passes over the corpus per backend')
+    parser.add_argument('--json', action='store_true', help='Print the raw results as JSON')
+    args = parser.parse_args()
+
+    paths = _corpus(args.corpus)
+    if not paths:
+        parser.error(f"no PDF files under {args.corpus}")
+
+    context = multiprocessing.get_context('spawn')
+    reports = []
+    for name in [n.strip() for n in args.backends.split(',') if n.strip()]:
+        results = context.Queue()
+        process = context.Process(target=_run_backend, args=(name, paths, args.repeat, results))
+        process.start()
+        reports.append(results.get())
+        process.join()
+
+    reference = reports[0]['pages']
+    for report in reports:
+        compared = [path for path in report['pages'] if path in reference]
+        agreeing = sum(report['pages'][path] == reference[path] for path in compared)
+        report['page_count_agreement'] = agreeing / len(compared) if compared else None
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    print(f"{len(paths)} files, {args.repeat} passes; page counts compared with '{reports[0]['backend']}'\n")
+    print(f"{'backend':<10} {'files/s':>9} {'MB/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'peak MB':>8} {'failed':>7} {'agree':>7}")
+    for report in reports:
+        agreement = report['page_count_agreement']
+        print(f"{report['backend']:<10} {report['files_per_second']:>9.1f} {report['mb_per_second']:>8.1f} "
+              f"{report['p50_ms'] or 0:>8.2f} {report['p95_ms'] or 0:>8.2f} {report['peak_rss_mb']:>8.1f} "
+              f"{len(report['failures']):>7} {'-' if agreement is None else f'{agreement:.0%}':>7}")
+    for report in reports:
+        for path, error in sorted(report['failures'].items()):
+            print(f"  {report['backend']}: {os.path.relpath(path, args.corpus)}: {error}")
+
+
+if __name__ == '__main__':
+    main()
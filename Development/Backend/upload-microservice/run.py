@@ -1,28 +1,16 @@
 import os
 from app import create_app
-from app.config.config import Config
-from app.client.minio_client import get_minio_client
-from app.services.virus_scanner import scanner
+from app.services.dependencies import dependency_monitor
 
 app = create_app()
 
-def check_clamav_ready():
-    """Check if ClamAV scanner is available"""
-    if scanner.cd is not None:
-        print("✅ Connected to ClamAV Socket")
-    else:
-        print("❌ ClamAV not available (scanner disabled)")
-
-def check_minio_ready():
-    """Check if MinIO bucket exists"""
-    try:
-        client = get_minio_client()
-        if client.bucket_exists(Config.MINIO_BUCKET):
-            print(f"✅ Connected to Minio Bucket: {Config.MINIO_BUCKET}")
+def check_dependencies_ready():
+    """Report ClamAV and MinIO as seen by the background monitor so far"""
+    for name, status in dependency_monitor.status().items():
+        if status['ready']:
+            print(f"✅ Connected to {name}")
         else:
-            print(f"❌ Bucket '{Config.MINIO_BUCKET}' does not exist.")
-    except Exception as e:
-        print(f"❌ Failed to connect to MinIO: {e}")
+            print(f"⏳ {name} not connected yet ({status['last_error'] or 'checking'})")
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 3003))
@@ -31,8 +19,7 @@ if __name__ == '__main__':
 
     # Start checks
     print("\n🔍 Running startup checks...\n")
-    check_clamav_ready()
-    check_minio_ready()
+    check_dependencies_ready()
 
     print(f"\n🚀 Upload Microservice running on port {port}")
     print(f"📋 Environment: {environment}")
@@ -0,0 +1,53 @@
+import os
+import sys
+import zlib
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build_pdf(objects, trailer=b'', version=b'1.4'):
+    """
+    A classic-xref PDF from ``{number: body}``
+
+    The catalog is expected to be object 1; ``trailer`` is added to the
+    trailer dictionary.
+    """
+    body = b'%PDF-' + version + b'\n'
+    offsets = {}
+    for num in sorted(objects):
+        offsets[num] = len(body)
+        body += b'%d 0 obj\n' % num + objects[num] + b'\nendobj\n'
+
+    size = max(objects) + 1
+    xref = len(body)
+    body += b'xref\n0 %d\n0000000000 65535 f \n' % size
+    for num in range(1, size):
+        if num in offsets:
+            body += b'%010d 00000 n \n' % offsets[num]
+        else:
+            body += b'0000000000 00000 f \n'
+    body += b'trailer\n<< /Size %d /Root 1 0 R %s>>\nstartxref\n%d\n%%%%EOF\n' % (size, trailer, xref)
+    return body
+
+
+def object_stream(objects):
+    """Body of a FlateDecode /ObjStm holding ``{number: body}``"""
+    header, content = b'', b''
+    for num, data in objects.items():
+        header += b'%d %d ' % (num, len(content))
+        content += data + b' '
+    data = zlib.compress(header + content)
+    return b'<< /Type /ObjStm /N %d /First %d /Filter /FlateDecode /Length %d >>\nstream\n' % (
+        len(objects), len(header), len(data)
+    ) + data + b'\nendstream'
+
+
+@pytest.fixture
+def simple_pdf():
+    return build_pdf({
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        2: b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        3: b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>',
+    })
@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+from app.services import near_duplicates
+from app.services.near_duplicates import NearDuplicateIndex
+
+
+def flip(value, *bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+@pytest.fixture
+def index(tmp_path):
+    return NearDuplicateIndex(str(tmp_path / 'near-duplicates.idx'))
+
+
+def test_empty_index_matches_nothing(index):
+    assert index.search(0x0123456789ABCDEF, 8) == []
+
+
+def test_matches_within_the_radius_closest_first(index):
+    query = 0x0123456789ABCDEF
+    index.add(flip(query, 1, 2, 3), 'three', 'alice', public=True)
+    index.add(query, 'same', 'alice', public=True)
+    index.add(flip(query, 10), 'one', 'alice', public=True)
+    index.add(flip(query, *range(20, 29)), 'nine', 'alice', public=True)
+
+    assert index.search(query, 8) == [
+        {'pdf_id': 'same', 'distance': 0},
+        {'pdf_id': 'one', 'distance': 1},
+        {'pdf_id': 'three', 'distance': 3},
+    ]
+    assert [match['pdf_id'] for match in index.search(query, 8, limit=2)] == ['same', 'one']
+
+
+def test_differences_spread_over_every_chunk_are_found(index):
+    """Two bits per 16-bit chunk: no chunk matches exactly, one flip per chunk is probed"""
+    query = 0xFFFF0000FFFF0000
+    index.add(flip(query, 0, 1, 16, 17, 32, 33, 48, 49), 'spread', 'alice', public=True)
+
+    assert index.search(query, 8) == [{'pdf_id': 'spread', 'distance': 8}]
+    assert index.search(query, 7) == []
+
+
+def test_private_entries_only_match_their_owner(index):
+    index.add(42, 'private', 'alice', public=False)
+    index.add(42, 'public', 'bob', public=True)
+
+    assert [m['pdf_id'] for m in index.search(42, 0, owner='alice')] == ['private', 'public']
+    assert [m['pdf_id'] for m in index.search(42, 0, owner='carol')] == ['public']
+    assert [m['pdf_id'] for m in index.search(42, 0)] == ['public']
+
+
+def test_removed_files_are_not_matched(index):
+    index.add(42, 'gone', 'alice', public=True)
+    index.add(43, 'kept', 'alice', public=True)
+    index.remove('gone')
+
+    assert index.search(42, 2) == [{'pdf_id': 'kept', 'distance': 1}]
+
+
+def test_entries_appended_by_another_process_are_searched(tmp_path):
+    path = str(tmp_path / 'shared.idx')
+    reader, writer = NearDuplicateIndex(path), NearDuplicateIndex(path)
+    writer.add(7, 'first', 'alice', public=True)
+    assert [m['pdf_id'] for m in reader.search(7, 0)] == ['first']
+
+    writer.add(7, 'second', 'alice', public=True)
+    writer.remove('first')
+
+    assert [m['pdf_id'] for m in reader.search(7, 0)] == ['second']
+
+
+def test_merged_tables_and_tail_agree_with_brute_force(index, monkeypatch):
+    monkeypatch.setattr(near_duplicates, 'MERGE_THRESHOLD', 200)
+    rng = random.Random(1)
+    hashes = {}
+    # The first batch is merged into the chunk tables, the second stays in the tail
+    for batch in range(2):
+        for number in range(150):
+            value = rng.getrandbits(64)
+            if number % 10 == 0:
+                # Near copies of earlier entries so that every query has matches
+                value = flip(rng.choice(list(hashes.values()) or [value]), *rng.sample(range(64), rng.randint(0, 8)))
+            file_id = f'{batch}-{number}'
+            hashes[file_id] = value
+            index.add(value, file_id, 'alice', public=True)
+        index.search(0, 0)
+
+    assert len(index._base) == len(index._tail[0]) == 150
+    for query in rng.sample(list(hashes.values()), 50):
+        expected = sorted(
+            (bin(value ^ query).count('1'), file_id)
+            for file_id, value in hashes.items() if bin(value ^ query).count('1') <= 8
+        )
+        found = index.search(query, 8, limit=len(hashes))
+        assert sorted((m['distance'], m['pdf_id']) for m in found) == expected
@@ -0,0 +1,106 @@
+import pytest
+
+from app.config.config import Config
+from app.services.pdf_prescan import PdfPreScanner
+from app.services.virus_scanner import VirusScanner
+from conftest import build_pdf, object_stream
+
+
+def catalog(extra=b''):
+    return build_pdf({
+        1: b'<< /Type /Catalog /Pages 2 0 R ' + extra + b' >>',
+        2: b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        3: b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R >>',
+        4: b'<< /Length 0 /Filter /FlateDecode >>\nstream\n\nendstream',
+        5: b'<< /Type /Font /BaseFont /Times#20New#20Roman >>',
+    })
+
+
+@pytest.fixture
+def prescanner():
+    return PdfPreScanner()
+
+
+def test_plain_document_is_not_risky(prescanner):
+    assert prescanner.scan(catalog()) == {'risky': False, 'findings': []}
+
+
+@pytest.mark.parametrize('extra, finding', [
+    (b'/OpenAction << /S /JavaScript /JS (app.alert(1)) >>', '/JavaScript'),
+    (b'/AA << /O << /S /Launch /F (cmd.exe) >> >>', '/Launch'),
+    (b'/Names << /EmbeddedFiles 6 0 R >>', '/EmbeddedFiles'),
+    (b'/OpenAction << /S /Java#53cript >>', '/JavaScript'),
+])
+def test_active_content_is_risky(prescanner, extra, finding):
+    result = prescanner.scan(catalog(extra))
+
+    assert result['risky']
+    assert finding in result['findings']
+
+
+def test_escaped_names_alone_are_not_risky(prescanner):
+    assert not prescanner.scan(catalog(b'/Lang /en#2DGB'))['risky']
+
+
+def test_names_are_matched_whole(prescanner):
+    assert not prescanner.scan(catalog(b'/JSONData (x) /AAA 1'))['risky']
+
+
+def test_active_content_inside_object_streams_is_found(prescanner):
+    pdf = build_pdf({
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        2: b'<< /Type /Pages /Kids [] /Count 0 >>',
+        3: object_stream({4: b'<< /S /JavaScript /JS (app.alert(1)) >>'}),
+    })
+
+    assert '/JavaScript' in prescanner.scan(pdf)['findings']
+
+
+def test_object_streams_over_the_inflate_budget_are_risky():
+    pdf = build_pdf({
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        2: object_stream({3: b'<< /Data (' + b'x' * 4096 + b') >>'}),
+    })
+
+    assert PdfPreScanner(max_inflate=1024).scan(pdf)['findings'] == ['objstm:too-large']
+
+
+@pytest.mark.parametrize('filters, finding', [
+    (b'/JBIG2Decode', 'filter:/JBIG2Decode'),
+    (b'[/ASCIIHexDecode /FlateDecode]', 'filter:/ASCIIHexDecode'),
+    (b'[/FlateDecode /FlateDecode /FlateDecode]', 'filter-chain:3'),
+])
+def test_unusual_filters_are_risky(prescanner, filters, finding):
+    pdf = catalog().replace(b'/Filter /FlateDecode', b'/Filter ' + filters)
+
+    assert finding in prescanner.scan(pdf)['findings']
+
+
+def test_encrypted_and_headerless_files_are_risky(prescanner):
+    assert prescanner.scan(catalog(b'/Encrypt 9 0 R'))['findings'] == ['encrypted']
+    assert 'no-pdf-header' in prescanner.scan(b'MZ' + catalog())['findings']
+
+
+class TestTiering:
+    @pytest.fixture
+    def scanner(self, monkeypatch):
+        monkeypatch.setattr(Config, 'SCAN_TIERING', True)
+        return VirusScanner([('standard', 3310)], deep_endpoints=[('deep', 3310)])
+
+    def test_plain_documents_use_the_standard_tier(self, scanner):
+        assert scanner._tier_for(catalog()) is scanner.standard
+
+    def test_flagged_documents_use_the_deep_tier(self, scanner):
+        assert scanner._tier_for(catalog(b'/OpenAction 6 0 R')) is scanner.deep
+
+    def test_flagged_documents_stay_on_the_standard_tier_while_deep_is_down(self, scanner):
+        for node in scanner.deep.nodes:
+            for _ in range(Config.CLAMAV_EJECT_THRESHOLD):
+                node.breaker.record_failure()
+
+        assert scanner._tier_for(catalog(b'/OpenAction 6 0 R')) is scanner.standard
+
+    def test_tiering_can_be_switched_off(self, scanner, monkeypatch):
+        monkeypatch.setattr(Config, 'SCAN_TIERING', False)
+
+        assert scanner._tier_for(catalog(b'/OpenAction 6 0 R')) is scanner.standard
@@ -0,0 +1,130 @@
+import struct
+import zlib
+
+import pytest
+
+from app.services.pdf_structure import PdfStructureError, PdfStructureReader
+from conftest import build_pdf, object_stream
+
+
+def test_info_and_page_count():
+    pdf = build_pdf({
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        2: b'<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 >>',
+        3: b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>',
+        4: b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>',
+        5: b'<< /Title (Annual \\(2024\\) Report) /Author <FEFF004A006F> /Pages 2 >>',
+    }, trailer=b'/Info 5 0 R ')
+
+    reader = PdfStructureReader(pdf)
+
+    assert reader.page_count() == 2
+    assert reader.info() == {'Title': 'Annual (2024) Report', 'Author': 'Jo'}
+
+
+def test_page_size_applies_inherited_box_rotation_and_user_unit():
+    pdf = build_pdf({
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        2: b'<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 /MediaBox [0 0 600 800] /Rotate 90 >>',
+        3: b'<< /Type /Page /Parent 2 0 R >>',
+        4: b'<< /Type /Page /Parent 2 0 R /CropBox [10 10 110 60] /Rotate 0 /UserUnit 2 >>',
+    })
+
+    reader = PdfStructureReader(pdf)
+
+    assert reader.page_size(0) == (800, 600)
+    assert reader.page_size(1) == (200, 100)
+    assert reader.page_size(2) is None
+
+
+def test_objects_in_a_compressed_xref_stream():
+    objects = object_stream({
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        2: b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        3: b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 100] >>',
+    })
+    body = b'%PDF-1.5\n'
+    stream_offset = len(body)
+    body += b'4 0 obj\n' + objects + b'\nendobj\n'
+    xref_offset = len(body)
+    # W [1 2 1]: type, offset or object stream number, generation or index
+    entries = [(0, 0, 0), (2, 4, 0), (2, 4, 1), (2, 4, 2), (1, stream_offset, 0), (1, xref_offset, 0)]
+    rows = zlib.compress(b''.join(struct.pack('>BHB', *entry) for entry in entries))
+    body += b'5 0 obj\n<< /Type /XRef /Size 6 /W [1 2 1] /Root 1 0 R /Filter /FlateDecode /Length %d >>\nstream\n' % (
+        len(rows)
+    ) + rows + b'\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n' % xref_offset
+
+    reader = PdfStructureReader(body)
+
+    assert reader.page_count() == 1
+    assert reader.get_object(3)['MediaBox'] == [0, 0, 200, 100]
+
+
+def test_hybrid_file_reads_entries_only_its_xref_stream_lists():
+    objects = {}
+    body = b'%PDF-1.5\n'
+
+    def add(num, data):
+        nonlocal body
+        objects[num] = len(body)
+        body += b'%d 0 obj\n' % num + data + b'\nendobj\n'
+
+    add(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+    add(2, b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>')
+    add(3, b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 100] >>')
+    add(5, object_stream({4: b'<< /Title (Hybrid) >>'}))
+    rows = zlib.compress(bytes([2, 0, 5, 0]))
+    add(6, b'<< /Type /XRef /Size 7 /Index [4 1] /W [1 2 1] /Filter /FlateDecode /Length %d >>\nstream\n' % len(rows)
+        + rows + b'\nendstream')
+
+    xref = len(body)
+    body += b'xref\n0 7\n0000000000 65535 f \n'
+    for num in range(1, 7):
+        body += b'%010d 00000 n \n' % objects[num] if num in objects else b'0000000000 00000 f \n'
+    body += b'trailer\n<< /Size 7 /Root 1 0 R /Info 4 0 R /XRefStm %d >>\nstartxref\n%d\n%%%%EOF\n' % (
+        objects[6], xref
+    )
+
+    assert PdfStructureReader(body).info() == {'Title': 'Hybrid'}
+
+
+def test_incremental_update_overrides_the_earlier_revision():
+    original = build_pdf({
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        2: b'<< /Type /Pages /Kids [] /Count 0 >>',
+        3: b'<< /Title (Draft) >>',
+    }, trailer=b'/Info 3 0 R ')
+    previous_xref = int(original.rsplit(b'startxref', 1)[1].split()[0])
+    info = len(original)
+    update = original + b'3 0 obj\n<< /Title (Final) >>\nendobj\n'
+    xref = len(update)
+    update += b'xref\n3 1\n%010d 00000 n \ntrailer\n<< /Size 4 /Root 1 0 R /Info 3 0 R /Prev %d >>\n' % (
+        info, previous_xref
+    ) + b'startxref\n%d\n%%%%EOF\n' % xref
+
+    assert PdfStructureReader(original).info() == {'Title': 'Draft'}
+    assert PdfStructureReader(update).info() == {'Title': 'Final'}
+
+
+def test_streams_whose_lengths_refer_to_each_other_are_rejected():
+    pdf = build_pdf({
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        2: b'<< /Type /Pages /Kids [] /Count 3 0 R >>',
+        3: b'<< /Length 4 0 R >>\nstream\nabc\nendstream',
+        4: b'<< /Length 3 0 R >>\nstream\nabc\nendstream',
+    })
+
+    with pytest.raises(PdfStructureError):
+        PdfStructureReader(pdf).page_count()
+
+
+def test_encrypted_documents_are_rejected(simple_pdf):
+    encrypted = simple_pdf.replace(b'/Root 1 0 R', b'/Root 1 0 R /Encrypt << /Filter /Standard >>')
+
+    with pytest.raises(PdfStructureError):
+        PdfStructureReader(encrypted)
+
+
+def test_missing_xref_is_an_error():
+    with pytest.raises(PdfStructureError):
+        PdfStructureReader(b'%PDF-1.4\n1 0 obj\n<< >>\nendobj\n%%EOF\n')
@@ -0,0 +1,133 @@
+import threading
+import time
+
+import pytest
+
+from app.services.stage_executor import Stage, StageExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = StageExecutor(thread_workers=4)
+    yield executor
+    executor.shutdown(wait_for_tasks=False)
+
+
+def recorder():
+    events = []
+
+    def on_stage(name, status):
+        events.append((name, status))
+    return events, on_stage
+
+
+def fail(message):
+    raise RuntimeError(message)
+
+
+def test_dependency_results_are_passed_on(executor):
+    run = executor.run([
+        Stage('scan', lambda data: data == b'pdf', args=(b'pdf',)),
+        Stage('metadata', lambda data: {'size': len(data)}, args=(b'pdf',), after=['scan']),
+        Stage('upload', lambda name, metadata: (name, metadata['size']), args=('a.pdf',), requires=['metadata']),
+    ], gate='scan', gate_check=bool)
+
+    assert not run.rejected
+    assert run.results == {'scan': True, 'metadata': {'size': 3}, 'upload': ('a.pdf', 3)}
+    assert set(run.durations) == {'scan', 'metadata', 'upload'}
+
+
+def test_independent_stages_run_concurrently(executor):
+    barrier = threading.Barrier(2, timeout=5)
+
+    run = executor.run([
+        Stage('metadata', barrier.wait),
+        Stage('render', barrier.wait),
+    ])
+
+    assert set(run.results) == {'metadata', 'render'}
+
+
+def test_failed_stage_skips_its_dependents(executor):
+    events, on_stage = recorder()
+
+    run = executor.run([
+        Stage('metadata', fail, args=('corrupt',)),
+        Stage('render', lambda: 'preview'),
+        Stage('upload', lambda metadata: metadata, requires=['metadata']),
+    ], on_stage=on_stage)
+
+    assert isinstance(run.errors['metadata'], RuntimeError)
+    assert run.results == {'render': 'preview'}
+    assert run.skipped == {'upload'}
+    assert ('upload', 'skipped') in events and ('upload', 'running') not in events
+
+
+def test_rejected_gate_cancels_the_rest_of_the_run(executor):
+    release = threading.Event()
+    started = threading.Event()
+    events, on_stage = recorder()
+
+    def scan():
+        # Finds a virus once rendering has started speculatively
+        started.wait(5)
+        return False
+
+    def speculative():
+        started.set()
+        release.wait(5)
+        return 'thrown away'
+
+    try:
+        began = time.perf_counter()
+        run = executor.run([
+            Stage('scan', scan),
+            Stage('render', speculative),
+            Stage('upload', lambda: 'stored', after=['scan']),
+        ], gate='scan', gate_check=bool, on_stage=on_stage)
+        elapsed = time.perf_counter() - began
+    finally:
+        release.set()
+
+    assert run.rejected
+    assert run.results == {'scan': False}
+    assert run.skipped == {'render', 'upload'}
+    assert ('upload', 'running') not in events
+    # The run does not wait for speculative work to finish
+    assert elapsed < 4
+
+
+def test_failing_gate_rejects_the_run(executor):
+    run = executor.run([
+        Stage('scan', fail, args=('clamd down',)),
+        Stage('upload', lambda: 'stored', after=['scan']),
+    ], gate='scan', gate_check=bool)
+
+    assert run.rejected
+    assert run.results == {}
+    assert str(run.errors['scan']) == 'clamd down'
+    assert run.skipped == {'upload'}
+
+
+def test_inline_mode_runs_stages_in_declaration_order():
+    order = []
+    executor = StageExecutor(inline=True)
+
+    run = executor.run([
+        Stage('scan', lambda: order.append('scan') or True),
+        Stage('metadata', lambda: order.append('metadata'), after=['scan']),
+        Stage('render', lambda: order.append('render'), after=['scan']),
+    ], gate='scan', gate_check=bool)
+
+    assert order == ['scan', 'metadata', 'render']
+    assert set(run.results) == {'scan', 'metadata', 'render'}
+
+
+def test_undeclared_dependencies_are_rejected(executor):
+    with pytest.raises(ValueError):
+        executor.run([Stage('upload', lambda: None, requires=['scan'])])
+
+
+def test_unknown_pool_is_rejected():
+    with pytest.raises(ValueError):
+        Stage('scan', lambda: None, pool='gpu')
@@ -0,0 +1,105 @@
+import os
+import time
+
+import pytest
+
+from app.config.config import Config
+from app.services.stage_executor import Stage, StageExecutor
+from app.services.worker_pool import IsolatedProcessPool, WorkerCrashedError, WorkerTimeoutError
+
+
+def pid():
+    return os.getpid()
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def allocate(megabytes):
+    return len(bytearray(megabytes * 1024 * 1024))
+
+
+def crash():
+    os._exit(1)
+
+
+def fail():
+    raise ValueError('corrupt PDF')
+
+
+@pytest.fixture
+def pool():
+    pool = IsolatedProcessPool('test', size=1, timeout=5, memory_limit=512 * 1024 * 1024)
+    yield pool
+    pool.shutdown()
+
+
+def test_tasks_run_in_a_reused_worker_process(pool):
+    first = pool.call(pid)
+
+    assert first != os.getpid()
+    assert pool.call(pid) == first
+
+
+def test_exceptions_are_raised_in_the_caller(pool):
+    with pytest.raises(ValueError, match='corrupt PDF'):
+        pool.call(fail)
+    assert pool.call(sleep, 0) == 0
+
+
+def test_a_task_over_its_timeout_is_killed_and_the_worker_replaced(pool):
+    worker = pool.call(pid)
+    began = time.perf_counter()
+
+    with pytest.raises(WorkerTimeoutError):
+        pool.call(sleep, 30, timeout=0.5)
+
+    assert time.perf_counter() - began < 10
+    assert pool.stats()['timeouts'] == 1
+    assert pool.call(pid) != worker
+
+
+def test_a_task_over_the_memory_cap_fails_without_killing_the_worker(pool):
+    worker = pool.call(pid)
+
+    with pytest.raises(MemoryError):
+        pool.call(allocate, 1024)
+
+    assert pool.call(pid) == worker
+
+
+def test_a_worker_that_dies_is_reported_and_replaced(pool):
+    worker = pool.call(pid)
+
+    with pytest.raises(WorkerCrashedError):
+        pool.call(crash)
+
+    assert pool.stats()['crashes'] == 1
+    assert pool.call(pid) != worker
+
+
+def test_workers_are_recycled_after_max_tasks():
+    pool = IsolatedProcessPool('test', size=1, max_tasks=2)
+    try:
+        first, second, third = pool.call(pid), pool.call(pid), pool.call(pid)
+    finally:
+        pool.shutdown()
+
+    assert first == second != third
+
+
+def test_process_stages_fail_with_the_worker_error(monkeypatch):
+    monkeypatch.setattr(Config, 'STAGE_PROCESS_TIMEOUT', 0.5)
+    executor = StageExecutor(thread_workers=2, process_workers=1)
+    try:
+        run = executor.run([
+            Stage('metadata', sleep, args=(30,), pool='process'),
+            Stage('render', sleep, args=(0,)),
+        ])
+    finally:
+        executor.shutdown(wait_for_tasks=False)
+
+    assert isinstance(run.errors['metadata'], WorkerTimeoutError)
+    assert run.results == {'render': 0}